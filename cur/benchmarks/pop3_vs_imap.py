@@ -0,0 +1,357 @@
+import argparse
+import contextlib
+import imaplib
+import io
+import os
+import poplib
+import re
+import socket
+import tempfile
+import threading
+import time
+
+from cur.server.modules.exporters.exporter import MailboxExporter, MboxWriter
+from cur.server.modules.organizers.imap_session import IMAPSession
+from cur.server.modules.organizers.organizer import MailManager
+from cur.server.modules.organizers.pop3_downloader import Pop3Downloader
+from cur.server.modules.providers.provider import MailServiceProvider
+
+
+class StandInServer:
+    """
+    A minimal threaded line-based TCP server used as a stand-in for a mail server.
+
+    Every time data arrives from a client, the server waits 'latency' seconds before handling
+    the complete lines it received. This emulates one network round trip per exchange, so
+    pipelined commands that arrive together pay the latency once.
+
+    Attributes:
+    - messages (dict): The stored messages by number, starting at 1.
+    - latency (float): The emulated round-trip time in seconds.
+    - port (int): The port the server listens on.
+
+    Methods:
+    - __init__(self, messages, latency): Starts the server on a free local port.
+    - greeting(self): Returns the greeting sent to new clients.
+    - handle_line(self, line, state): Handles a command line and returns the response.
+    """
+
+    def __init__(self, messages, latency):
+        """
+        Starts the server on a free local port.
+
+        Args:
+        - messages (list of bytes): The messages to serve.
+        - latency (float): The emulated round-trip time in seconds.
+        """
+        self.messages = {number: data for number, data in enumerate(messages, start=1)}
+        self.latency = latency
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(16)
+        self.port = self._socket.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        """
+        Accepts client connections and serves each one in its own thread.
+        """
+        while True:
+            client, _ = self._socket.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        """
+        Serves a client until it disconnects or quits.
+
+        Args:
+        - client (socket.socket): The client connection.
+        """
+        state = {}
+        buffer = b''
+        with client:
+            client.sendall(self.greeting())
+            while True:
+                chunk = client.recv(65536)
+                if not chunk:
+                    return
+                time.sleep(self.latency)
+                buffer += chunk
+                responses = []
+                while b'\r\n' in buffer:
+                    line, buffer = buffer.split(b'\r\n', 1)
+                    responses.append(self.handle_line(line.decode('ascii'), state))
+                client.sendall(b''.join(responses))
+                if state.get('closing'):
+                    return
+
+    def greeting(self):
+        """
+        Returns the greeting sent to new clients.
+        """
+        raise NotImplementedError
+
+    def handle_line(self, line, state):
+        """
+        Handles a command line and returns the response.
+
+        Args:
+        - line (str): The command line without the line terminator.
+        - state (dict): Per-connection state. Setting 'closing' closes the connection after the response.
+        """
+        raise NotImplementedError
+
+
+class StandInPOP3Server(StandInServer):
+    """
+    A stand-in POP3 server supporting CAPA, USER, PASS, UIDL, RETR, DELE and QUIT.
+
+    Attributes:
+    - pipelining (bool): Whether PIPELINING is advertised.
+    """
+
+    def __init__(self, messages, latency, pipelining=True):
+        """
+        Starts the server on a free local port.
+
+        Args:
+        - messages (list of bytes): The messages to serve.
+        - latency (float): The emulated round-trip time in seconds.
+        - pipelining (bool): Whether PIPELINING is advertised.
+        """
+        self.pipelining = pipelining
+        super().__init__(messages, latency)
+
+    def greeting(self):
+        return b'+OK stand-in POP3 ready\r\n'
+
+    def handle_line(self, line, state):
+        command, _, argument = line.partition(' ')
+        command = command.upper()
+        if command == 'CAPA':
+            capabilities = ['UIDL'] + (['PIPELINING'] if self.pipelining else [])
+            return b'+OK\r\n' + ''.join(f"{name}\r\n" for name in capabilities).encode('ascii') + b'.\r\n'
+        if command == 'UIDL':
+            listing = ''.join(f"{number} uid-{number}\r\n" for number in self.messages)
+            return b'+OK\r\n' + listing.encode('ascii') + b'.\r\n'
+        if command == 'RETR':
+            data = self.messages[int(argument)]
+            stuffed = re.sub(rb'(?m)^\.', b'..', data)
+            return f"+OK {len(data)} octets\r\n".encode('ascii') + stuffed + b'.\r\n'
+        if command == 'QUIT':
+            state['closing'] = True
+        return b'+OK\r\n'
+
+
+class StandInIMAPServer(StandInServer):
+    """
+    A stand-in IMAP server supporting the commands used by MailManager for reading emails.
+    """
+
+    def greeting(self):
+        return b'* OK [CAPABILITY IMAP4rev1] stand-in IMAP ready\r\n'
+
+    def _fetch_response(self, number):
+        """
+        Returns the untagged FETCH response for a message.
+
+        Args:
+        - number (int): The message number, equal to its UID.
+        """
+        data = self.messages[number]
+        return (f'* {number} FETCH (UID {number} INTERNALDATE "01-Jan-2024 00:00:00 +0000" '
+                f'BODY[] {{{len(data)}}}\r\n').encode('ascii') + data + b')\r\n'
+
+    def handle_line(self, line, state):
+        tag, command, argument = (line.split(' ', 2) + [''])[:3]
+        command = command.upper()
+        if command == 'CAPABILITY':
+            return f"* CAPABILITY IMAP4rev1\r\n{tag} OK done\r\n".encode('ascii')
+        if command in ('SELECT', 'EXAMINE'):
+            return f"* {len(self.messages)} EXISTS\r\n{tag} OK done\r\n".encode('ascii')
+        if command == 'STATUS':
+            return (f"* STATUS inbox (UIDVALIDITY 1 UIDNEXT {len(self.messages) + 1})\r\n"
+                    f"{tag} OK done\r\n").encode('ascii')
+        if command == 'SEARCH' or (command == 'UID' and argument.upper().startswith('SEARCH')):
+            return f"* SEARCH {' '.join(map(str, self.messages))}\r\n{tag} OK done\r\n".encode('ascii')
+        if command == 'FETCH' or (command == 'UID' and argument.upper().startswith('FETCH')):
+            message_set = argument.split(' ')[1 if command == 'UID' else 0]
+            numbers = []
+            for part in message_set.split(','):
+                first, _, last = part.partition(':')
+                numbers.extend(range(int(first), int(last or first) + 1))
+            return b''.join(self._fetch_response(number) for number in numbers) + f"{tag} OK done\r\n".encode('ascii')
+        if command == 'LOGOUT':
+            state['closing'] = True
+            return f"* BYE logging out\r\n{tag} OK done\r\n".encode('ascii')
+        return f"{tag} OK done\r\n".encode('ascii')
+
+
+class PlainIMAPSession(IMAPSession):
+    """
+    An IMAPSession without TLS, for connecting to the stand-in server.
+    """
+
+    def _create_socket(self, timeout):
+        return imaplib.IMAP4._create_socket(self, timeout)
+
+
+class BenchmarkMailManager(MailManager):
+    """
+    A MailManager that connects to the stand-in IMAP server.
+    """
+
+    def open_imap_session(self):
+        server = PlainIMAPSession(self.provider.imap_server, self.port)
+        server.login(self.user_email, self.user_password)
+        return server
+
+
+class BenchmarkPop3Downloader(Pop3Downloader):
+    """
+    A Pop3Downloader that connects to the stand-in POP3 server.
+    """
+
+    def open_session(self):
+        session = poplib.POP3(self.provider.pop3_server, self.port)
+        session.user(self.user_email)
+        session.pass_(self.user_password)
+        return session
+
+
+def make_messages(count, size):
+    """
+    Builds 'count' messages with bodies of about 'size' bytes.
+
+    Args:
+    - count (int): The number of messages.
+    - size (int): The approximate body size in bytes.
+
+    Returns:
+    - list of bytes: The messages.
+    """
+    line = b'.' + b'x' * 70 + b'\r\n'
+    body = line * max(1, size // len(line))
+    return [f"From: sender@example.com\r\nSubject: Message {number}\r\n\r\n".encode('ascii') + body
+            for number in range(1, count + 1)]
+
+
+def run_imap_per_message(manager, path, batch_size=200):
+    """
+    Fetches every message with its own FETCH command, like MailManager.read_emails, and
+    archives it the way MailboxExporter does: an mbox written in fsynced batches, with a
+    checkpoint saved after every batch.
+
+    Args:
+    - manager (BenchmarkMailManager): The mail manager.
+    - path (str): The mbox path.
+    - batch_size (int): The number of messages per batch.
+
+    Returns:
+    - int: The number of bytes fetched.
+    """
+    exporter = MailboxExporter(manager, 'inbox', path, batch_size)
+    writer = MboxWriter(path)
+    checkpoint = {'uid_validity': 1, 'last_uid': 0, 'offset': 0, 'messages': 0}
+    total = 0
+    with manager.open_imap_session() as server:
+        server.select('inbox')
+        _, messages = server.search(None, 'ALL')
+        writer.start_batch(0)
+        for number in messages[0].split():
+            _, data = server.fetch(number, '(RFC822)')
+            writer.write(int(number), data[0][1])
+            total += len(data[0][1])
+            checkpoint['last_uid'] = int(number)
+            checkpoint['messages'] += 1
+            if checkpoint['messages'] % batch_size == 0:
+                checkpoint['offset'] = writer.end_batch()
+                exporter.save_checkpoint(checkpoint)
+                writer.start_batch(checkpoint['offset'])
+        if checkpoint['messages'] % batch_size:
+            checkpoint['offset'] = writer.end_batch()
+            exporter.save_checkpoint(checkpoint)
+        else:
+            writer.abort()
+    return total
+
+
+def run_imap_chunked(manager, path, connections):
+    """
+    Exports all messages with chunked UID FETCH commands through MailboxExporter.
+
+    Args:
+    - manager (BenchmarkMailManager): The mail manager.
+    - path (str): The mbox path.
+    - connections (int): The number of parallel connections.
+
+    Returns:
+    - int: The number of bytes fetched.
+    """
+    return MailboxExporter(manager, 'inbox', path, connections=connections).export()['bytes']
+
+
+def run_pop3(downloader):
+    """
+    Downloads all messages over POP3 into the downloader's archive.
+
+    Args:
+    - downloader (BenchmarkPop3Downloader): The downloader.
+
+    Returns:
+    - int: The number of bytes downloaded.
+    """
+    return downloader.download()['bytes']
+
+
+def main():
+    """
+    Runs the benchmark and prints the time and throughput of every retrieval path.
+
+    Every path writes the same archive: an mbox file fsynced every 200 messages, with its
+    resume state (checkpoint or UIDL file) saved after every batch. Progress output of the
+    runs is suppressed so it does not count towards the timings.
+    """
+    parser = argparse.ArgumentParser(description="Compare POP3 and IMAP bulk retrieval against local stand-in servers.")
+    parser.add_argument('--messages', type=int, default=500, help="number of messages in the mailbox")
+    parser.add_argument('--size', type=int, default=4096, help="approximate message body size in bytes")
+    parser.add_argument('--latency', type=float, default=0.005, help="emulated round-trip time in seconds")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.size)
+    imap_server = StandInIMAPServer(messages, args.latency)
+    pop3_server = StandInPOP3Server(messages, args.latency, pipelining=True)
+    pop3_server_plain = StandInPOP3Server(messages, args.latency, pipelining=False)
+    provider = MailServiceProvider('127.0.0.1', 25, '127.0.0.1', '127.0.0.1')
+
+    manager = BenchmarkMailManager(provider, 'user@example.com', 'password')
+    manager.port = imap_server.port
+
+    with tempfile.TemporaryDirectory() as directory:
+        def pop3_downloader(name, server):
+            downloader = BenchmarkPop3Downloader(provider, 'user@example.com', 'password',
+                                                 os.path.join(directory, name))
+            downloader.port = server.port
+            return downloader
+
+        cases = [
+            ("IMAP, FETCH per message", lambda: run_imap_per_message(manager, os.path.join(directory, 'per.mbox'))),
+            ("IMAP, chunked UID FETCH", lambda: run_imap_chunked(manager, os.path.join(directory, 'chunked.mbox'), 1)),
+            ("IMAP, chunked UID FETCH x4", lambda: run_imap_chunked(manager, os.path.join(directory, 'x4.mbox'), 4)),
+            ("POP3, RETR per message", lambda: run_pop3(pop3_downloader('plain.mbox', pop3_server_plain))),
+            ("POP3, pipelined RETR", lambda: run_pop3(pop3_downloader('pipelined.mbox', pop3_server))),
+        ]
+
+        print(f"{args.messages} messages of ~{args.size} bytes, {args.latency * 1000:.1f} ms round trip")
+        for name, run in cases:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                total = run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<28} {elapsed:8.3f} s  {args.messages / elapsed:9.1f} msg/s  "
+                  f"{total / elapsed / 1_000_000:7.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
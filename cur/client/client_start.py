@@ -1,7 +1,11 @@
+import json
 import socket
 import os
+import time
 from colorama import init, Fore
 import pyfiglet
+from cur.common.compression import CompressedSocket, available_codecs
+from cur.common.framing import read_response
 
 class EmailClient:
     """
@@ -11,48 +15,164 @@ class EmailClient:
     - host (str): The email server's hostname or IP address.
     - port (int): The port number to connect to on the email server.
     - client (socket.socket): A socket object for communication with the email server.
+    - compression (list of str): Transport compression codecs to offer, in order of preference.
+    - buffer (bytearray): Bytes received from the email server that belong to the next response.
 
     Methods:
-    - __init__(self, host, port): Initializes the EmailClient instance with the provided host and port.
-    - connect(self): Establishes a connection to the email server.
-    - send_command(self, command): Sends a command to the email server and returns the response.
+    - __init__(self, host, port, compression=None): Initializes the EmailClient instance with the provided host and port.
+    - connect(self, attempts=3): Establishes a connection to the email server and negotiates compression.
+    - retry_after(response): Returns the delay requested by a 'BUSY retry-after <seconds>' response.
+    - send_command(self, command, attempts=3): Sends a command to the email server and returns the response.
+    - send_batch(self, commands, attempts=3): Sends several commands in one round trip and returns per-command results.
     - configure(self): Configures the email client by requesting user input for email provider, user email, and password.
     - run(self): Runs the email client's main loop to process user commands.
     - print_help(): Static method that prints the available commands and their descriptions.
     """
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, compression=None):
         """
         Initializes a new EmailClient instance.
 
         Args:
         - host (str): The hostname or IP address of the email server.
         - port (int): The port number to connect to on the email server.
+        - compression (list of str, optional): Transport compression codecs to offer, e.g. ['zstd', 'zlib'].
+          The connection stays uncompressed if omitted.
         """
         self.host = host
         self.port = port
         self.client = None
+        self.compression = compression
+        self.buffer = bytearray()
 
-    def connect(self):
+    def connect(self, attempts=3):
         """
-        Establishes a connection to the email server using a socket.
+        Establishes a connection to the email server using a socket and negotiates compression.
+
+        If the server answers 'BUSY retry-after <seconds>', the client waits and reconnects.
+        Without compression nothing is exchanged here, and a 'BUSY' answer to the first
+        command is retried by send_command.
+
+        Args:
+        - attempts (int): The number of connection attempts.
+        """
+        for attempt in range(attempts):
+            self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.client.connect((self.host, self.port))
+            self.buffer = bytearray()
+            if not self.compression:
+                return
+            response = self._exchange(f"COMPRESS {' '.join(self.compression)}")
+            if response.startswith("BUSY"):
+                self.client.close()
+                delay = self.retry_after(response)
+                if attempt + 1 < attempts:
+                    print(f"Server is busy, retrying in {delay} s...")
+                    time.sleep(delay)
+                continue
+            codec = response.split()[1] if response.startswith("COMPRESS ") else "none"
+            if codec != "none":
+                self.client = CompressedSocket(self.client, codec)
+            return
+        raise ConnectionError("Server is busy, try again later.")
+
+    @staticmethod
+    def retry_after(response):
+        """
+        Returns the delay requested by a 'BUSY retry-after <seconds>' response.
+
+        Args:
+        - response (str): The server response.
+
+        Returns:
+        - float: The delay in seconds, 1 if the response does not specify one.
+        """
+        parts = response.split()
+        try:
+            return float(parts[2])
+        except (IndexError, ValueError):
+            return 1.0
+
+    def _exchange(self, command):
+        """
+        Sends a command and receives the response, without handling 'BUSY' responses.
+
+        Responses are framed with their length, so a response longer than one read is
+        received whole.
+
+        Args:
+        - command (str): The command to send to the email server.
+
+        Returns:
+        - str: The response received from the email server.
+        """
+        self.client.sendall(command.encode('utf-8'))
+        return read_response(self.client, self.buffer)
+
+    def _reconnect_after(self, response, attempt, attempts):
+        """
+        Closes the connection after a 'BUSY retry-after <seconds>' response and, unless it was
+        the last attempt, waits the requested time and reconnects.
+
+        Args:
+        - response (str): The 'BUSY' response.
+        - attempt (int): The number of the failed attempt, starting at 0.
+        - attempts (int): The number of attempts.
         """
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.client.connect((self.host, self.port))
+        self.client.close()
+        if attempt + 1 < attempts:
+            delay = self.retry_after(response)
+            print(f"Server is busy, retrying in {delay} s...")
+            time.sleep(delay)
+            self.connect()
 
-    def send_command(self, command):
+    def send_command(self, command, attempts=3):
         """
         Sends a command to the email server and receives the response.
 
+        If the server answers 'BUSY retry-after <seconds>', the client waits, reconnects and
+        sends the command again.
+
         Args:
         - command (str): The command to send to the email server.
+        - attempts (int): The number of times the command is sent.
 
         Returns:
         - response (str): The response received from the email server.
+
+        Raises:
+        - ConnectionError: If the server was still busy after the last attempt.
         """
-        self.client.send(command.encode('utf-8'))
-        response = self.client.recv(4096).decode('utf-8')
-        return response
+        for attempt in range(attempts):
+            response = self._exchange(command)
+            if not response.startswith("BUSY"):
+                return response
+            self._reconnect_after(response, attempt, attempts)
+        raise ConnectionError("Server is busy, try again later.")
+
+    def send_batch(self, commands, attempts=3):
+        """
+        Sends several commands to the email server in one round trip.
+
+        Busy responses are retried like in send_command.
+
+        Args:
+        - commands (list of str): The commands to run, in order.
+        - attempts (int): The number of times the batch is sent.
+
+        Returns:
+        - list of dict: One result per command with 'command', 'ok' and either 'response' or 'error'.
+
+        Raises:
+        - ConnectionError: If the server closed the connection or was still busy after the last attempt.
+        """
+        request = "BATCH %d\n" % len(commands) + "".join(command + "\n" for command in commands)
+        for attempt in range(attempts):
+            response = self._exchange(request)
+            if not response.startswith("BUSY"):
+                return json.loads(response)
+            self._reconnect_after(response, attempt, attempts)
+        raise ConnectionError("Server is busy, try again later.")
 
     def configure(self):
         """
@@ -88,7 +208,11 @@ class EmailClient:
             elif command.lower() == 'help':
                 self.print_help()
                 continue
-            response = self.send_command(command)
+            try:
+                response = self.send_command(command)
+            except ConnectionError as e:
+                print(f"{Fore.YELLOW}{e}{Fore.RESET}")
+                continue
             print(f"{Fore.YELLOW}Response: {response}{Fore.RESET}")
 
         self.client.close()
@@ -98,18 +222,32 @@ class EmailClient:
         """
         Static method that prints the available commands and their descriptions.
         """
-        print(f"{Fore.CYAN}Available commands:")
+        print(f"{Fore.CYAN}Available commands (quote arguments that contain spaces, e.g. send email a@b.c \"My subject\" Body):")
         print(f"{Fore.CYAN}config - Configure email client.")
         print(f"{Fore.CYAN}send - Send an email.")
         print(f"{Fore.CYAN}classify - Classify and move emails.")
+        print(f"{Fore.CYAN}watch emails - Classify new emails as soon as they arrive.")
+        print(f"{Fore.CYAN}unwatch emails - Stop classifying new emails in the background.")
         print(f"{Fore.CYAN}save - Save a draft email.")
-        print(f"{Fore.CYAN}read - Read emails from inbox.")
+        print(f"{Fore.CYAN}read emails [offset] [limit] - Read a page of emails from inbox.")
+        print(f"{Fore.CYAN}search emails <query> - Find emails in inbox by sender or subject.")
+        print(f"{Fore.CYAN}export mailbox <folder> <path> - Export a folder to .mbox/.mbox.gz/.mbox.zst or a Maildir.")
+        print(f"{Fore.CYAN}pop3 download <path> [delete] - Download new emails over POP3 into an archive.")
+        print(f"{Fore.CYAN}batch - Run several commands, one per line, in one round trip.")
+        print(f"{Fore.CYAN}warmup status - Show how long it took to get the provider's sessions ready.")
+        print(f"{Fore.CYAN}profile start [sampling|cprofile] [interval_ms] - Start profiling the server.")
+        print(f"{Fore.CYAN}profile stop [name] - Stop profiling and show the report, optionally writing it to the server's profile directory.")
+        print(f"{Fore.CYAN}memsnap [top] [name] - Show the top allocation changes since the last snapshot.")
+        print(f"{Fore.CYAN}memsnap stop - Stop tracing allocations.")
+        print(f"{Fore.CYAN}server stats - Show handler pool occupancy, rejected requests and timeouts.")
+        print(f"{Fore.CYAN}compression stats - Show transport and IMAP compression statistics.")
+        print(f"{Fore.CYAN}imap compression on|off - Toggle IMAP COMPRESS=DEFLATE.")
         print(f"{Fore.CYAN}exit - Exit the email client.{Fore.RESET}")
 
 if __name__ == "__main__":
     HOST = 'localhost'
     PORT = 12348
-    email_client = EmailClient(HOST, PORT)
+    email_client = EmailClient(HOST, PORT, compression=available_codecs())
     email_client.connect()
     email_client.configure()
     email_client.run()
@@ -0,0 +1,334 @@
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def available_codecs():
+    """
+    Returns the names of the stream compression codecs available in this environment.
+
+    Returns:
+    - list of str: Codec names in order of preference.
+    """
+    return (['zstd'] if zstandard is not None else []) + ['zlib']
+
+
+def create_codec(name):
+    """
+    Creates a compressor and a decompressor for a stream compression codec.
+
+    Args:
+    - name (str): 'zstd', 'zlib' or 'deflate' (raw deflate without zlib header, as used by RFC 4978).
+
+    Returns:
+    - tuple: (compress, decompressor). compress(data) returns the compressed data flushed up
+      to a block boundary, so the peer can decode it immediately. decompressor is a
+      StreamDecompressor.
+    """
+    if name == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package.")
+        compressor = zstandard.ZstdCompressor().compressobj()
+        return (lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                StreamDecompressor(name))
+    if name in ('zlib', 'deflate'):
+        wbits = -zlib.MAX_WBITS if name == 'deflate' else zlib.MAX_WBITS
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, wbits)
+        return (lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH),
+                StreamDecompressor(name))
+    raise ValueError(f"Unknown compression codec '{name}'.")
+
+
+class StreamDecompressor:
+    """
+    Decompresses a stream in steps of bounded output size.
+
+    A few kilobytes of compressed input can expand to many megabytes, so input that would
+    produce more than 'max_length' bytes is kept and decompressed by later calls instead of
+    being expanded at once. zlib and deflate streams are bounded exactly; zstd input is fed
+    in ZSTD_STEP byte slices, so one call may produce at most the expansion of one slice
+    (a few hundred kilobytes) beyond 'max_length', which is kept for the next call.
+
+    Attributes:
+    - codec (str): The codec name.
+
+    Methods:
+    - __init__(self, codec): Initializes the decompressor.
+    - decompress(self, data, max_length=0): Decompresses data, producing at most 'max_length' bytes.
+    - has_pending(self): Checks whether input or output is held back for the next call.
+    """
+
+    ZSTD_STEP = 16
+
+    def __init__(self, codec):
+        """
+        Initializes the decompressor.
+
+        Args:
+        - codec (str): 'zstd', 'zlib' or 'deflate'.
+        """
+        self.codec = codec
+        self._input = b''
+        self._output = b''
+        if codec == 'zstd':
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS if codec == 'deflate' else zlib.MAX_WBITS)
+
+    def decompress(self, data, max_length=0):
+        """
+        Decompresses data together with the input held back by earlier calls.
+
+        Args:
+        - data (bytes): New compressed data, may be empty.
+        - max_length (int): The maximum number of bytes returned, 0 for no limit.
+
+        Returns:
+        - bytes: The decompressed data.
+        """
+        data = self._input + data
+        self._input = b''
+        if self.codec != 'zstd':
+            output = self._decompressor.decompress(data, max_length)
+            self._input = self._decompressor.unconsumed_tail
+            return output
+        output = self._output
+        position = 0
+        while position < len(data) and not (max_length and len(output) >= max_length):
+            output += self._decompressor.decompress(data[position:position + self.ZSTD_STEP])
+            position += self.ZSTD_STEP
+        self._input = data[position:]
+        if max_length:
+            output, self._output = output[:max_length], output[max_length:]
+        else:
+            self._output = b''
+        return output
+
+    def has_pending(self):
+        """
+        Checks whether input or output is held back for the next call.
+
+        Returns:
+        - bool: True if decompress(b'') may return more data.
+        """
+        return bool(self._input or self._output)
+
+
+class CompressionStats:
+    """
+    Thread-safe counters of compressed traffic.
+
+    Attributes:
+    - raw_out (int): Bytes passed to the compressor.
+    - wire_out (int): Compressed bytes sent.
+    - wire_in (int): Compressed bytes received.
+    - raw_in (int): Bytes produced by the decompressor.
+    - cpu_seconds (float): Thread CPU time spent compressing and decompressing.
+
+    Methods:
+    - record_out(self, raw, wire, cpu_seconds): Records compressed outgoing data.
+    - record_in(self, wire, raw, cpu_seconds): Records decompressed incoming data.
+    - ratio(self): Returns the overall compression ratio.
+    - as_dict(self): Returns the counters as a dictionary.
+    - summary(self): Returns a one-line human readable summary.
+    """
+
+    def __init__(self):
+        """
+        Initializes all counters to zero.
+        """
+        self._lock = threading.Lock()
+        self.raw_out = 0
+        self.wire_out = 0
+        self.wire_in = 0
+        self.raw_in = 0
+        self.cpu_seconds = 0.0
+
+    def record_out(self, raw, wire, cpu_seconds):
+        """
+        Records compressed outgoing data.
+
+        Args:
+        - raw (int): The number of uncompressed bytes.
+        - wire (int): The number of compressed bytes.
+        - cpu_seconds (float): The CPU time spent compressing.
+        """
+        with self._lock:
+            self.raw_out += raw
+            self.wire_out += wire
+            self.cpu_seconds += cpu_seconds
+
+    def record_in(self, wire, raw, cpu_seconds):
+        """
+        Records decompressed incoming data.
+
+        Args:
+        - wire (int): The number of compressed bytes.
+        - raw (int): The number of decompressed bytes.
+        - cpu_seconds (float): The CPU time spent decompressing.
+        """
+        with self._lock:
+            self.wire_in += wire
+            self.raw_in += raw
+            self.cpu_seconds += cpu_seconds
+
+    def ratio(self):
+        """
+        Returns the overall compression ratio (uncompressed bytes / compressed bytes).
+
+        Returns:
+        - float: The ratio, 1.0 if nothing was transferred.
+        """
+        wire = self.wire_out + self.wire_in
+        return (self.raw_out + self.raw_in) / wire if wire else 1.0
+
+    def as_dict(self):
+        """
+        Returns the counters as a dictionary.
+
+        Returns:
+        - dict: The counters and the compression ratio.
+        """
+        with self._lock:
+            return {'raw_out': self.raw_out, 'wire_out': self.wire_out, 'wire_in': self.wire_in,
+                    'raw_in': self.raw_in, 'cpu_seconds': self.cpu_seconds, 'ratio': self.ratio()}
+
+    def summary(self):
+        """
+        Returns a one-line human readable summary.
+
+        Returns:
+        - str: The summary.
+        """
+        stats = self.as_dict()
+        return (f"out {stats['raw_out']} -> {stats['wire_out']} B, in {stats['wire_in']} -> {stats['raw_in']} B, "
+                f"ratio {stats['ratio']:.2f}, cpu {stats['cpu_seconds'] * 1000:.1f} ms")
+
+
+class CompressedSocket:
+    """
+    A wrapper that compresses everything sent and decompresses everything received over a socket.
+
+    It provides the subset of the socket interface used by the client and the server.
+
+    Attributes:
+    - sock (socket.socket): The wrapped socket.
+    - codec (str): The codec name.
+    - stats (CompressionStats): The counters updated by this socket.
+
+    Methods:
+    - __init__(self, sock, codec, stats=None): Initializes the wrapper.
+    - send(self, data): Compresses and sends data, returns len(data).
+    - sendall(self, data): Compresses and sends data.
+    - recv(self, bufsize): Receives and decompresses up to 'bufsize' bytes.
+    - pending(self): Checks whether received data is waiting to be returned by recv.
+    - settimeout(self, timeout): Sets the timeout of the wrapped socket.
+    - fileno(self): Returns the file descriptor of the wrapped socket.
+    - close(self): Closes the wrapped socket.
+    """
+
+    def __init__(self, sock, codec, stats=None):
+        """
+        Initializes a new CompressedSocket.
+
+        Args:
+        - sock (socket.socket): The socket to wrap.
+        - codec (str): The codec name, see create_codec.
+        - stats (CompressionStats, optional): Counters to update. A new instance is created if omitted.
+        """
+        self.sock = sock
+        self.codec = codec
+        self.stats = stats if stats is not None else CompressionStats()
+        self._compress, self._decompressor = create_codec(codec)
+
+    def sendall(self, data):
+        """
+        Compresses and sends data.
+
+        Args:
+        - data (bytes): The data to send.
+        """
+        start = time.thread_time()
+        compressed = self._compress(data)
+        self.stats.record_out(len(data), len(compressed), time.thread_time() - start)
+        self.sock.sendall(compressed)
+
+    def send(self, data):
+        """
+        Compresses and sends data.
+
+        Args:
+        - data (bytes): The data to send.
+
+        Returns:
+        - int: The number of uncompressed bytes sent.
+        """
+        self.sendall(data)
+        return len(data)
+
+    def recv(self, bufsize):
+        """
+        Receives and decompresses up to 'bufsize' bytes.
+
+        At most 'bufsize' bytes are decompressed at a time; compressed input beyond that is
+        kept until the next call, so a small, highly compressed message cannot make the
+        connection hold a large amount of memory.
+
+        Args:
+        - bufsize (int): The maximum number of bytes to return.
+
+        Returns:
+        - bytes: The decompressed data, empty if the peer closed the connection.
+        """
+        while True:
+            if self._decompressor.has_pending():
+                compressed = b''
+            else:
+                compressed = self.sock.recv(max(bufsize, 4096))
+                if not compressed:
+                    return b''
+            start = time.thread_time()
+            data = self._decompressor.decompress(compressed, bufsize)
+            self.stats.record_in(len(compressed), len(data), time.thread_time() - start)
+            if data:
+                return data
+
+    def pending(self):
+        """
+        Checks whether received data is waiting to be returned by recv.
+
+        Such data is invisible to select(), so a caller that polls the socket must read it first.
+
+        Returns:
+        - bool: True if recv can return data without reading from the socket.
+        """
+        return self._decompressor.has_pending()
+
+    def settimeout(self, timeout):
+        """
+        Sets the timeout of the wrapped socket.
+
+        Args:
+        - timeout (float or None): The timeout in seconds.
+        """
+        self.sock.settimeout(timeout)
+
+    def fileno(self):
+        """
+        Returns the file descriptor of the wrapped socket, so the wrapper can be watched with selectors.
+
+        Returns:
+        - int: The file descriptor.
+        """
+        return self.sock.fileno()
+
+    def close(self):
+        """
+        Closes the wrapped socket.
+        """
+        self.sock.close()
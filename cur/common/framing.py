@@ -0,0 +1,77 @@
+MAX_HEADER_LENGTH = 20
+
+
+def encode_response(text):
+    """
+    Frames a response as its length in bytes, a newline and the UTF-8 encoded text.
+
+    A response can be longer than one read, and a client must not mistake the end of one
+    response for the start of the next, so every response the server sends is framed.
+
+    Args:
+    - text (str): The response.
+
+    Returns:
+    - bytes: The framed response, e.g. b'5\\nhello'.
+    """
+    payload = text.encode('utf-8')
+    return f"{len(payload)}\n".encode('ascii') + payload
+
+
+def send_response(sock, text):
+    """
+    Sends a framed response.
+
+    Args:
+    - sock (socket.socket or CompressedSocket): The socket connected to the client.
+    - text (str): The response.
+    """
+    sock.sendall(encode_response(text))
+
+
+def read_response(sock, buffer):
+    """
+    Reads one framed response.
+
+    Args:
+    - sock (socket.socket or CompressedSocket): The socket connected to the server.
+    - buffer (bytearray): Bytes received but not consumed yet. Data after the response is
+      left in it for the next call.
+
+    Returns:
+    - str: The response.
+
+    Raises:
+    - ConnectionError: If the connection closed or the length header is malformed.
+    """
+    while b'\n' not in buffer:
+        if len(buffer) > MAX_HEADER_LENGTH:
+            raise ConnectionError("Malformed response header.")
+        _receive(sock, buffer)
+    header, _, _ = buffer.partition(b'\n')
+    if not header.isdigit():
+        raise ConnectionError("Malformed response header.")
+    start = len(header) + 1
+    end = start + int(header)
+    while len(buffer) < end:
+        _receive(sock, buffer)
+    payload = bytes(buffer[start:end])
+    del buffer[:end]
+    return payload.decode('utf-8')
+
+
+def _receive(sock, buffer):
+    """
+    Appends the next chunk received from a socket to a buffer.
+
+    Args:
+    - sock (socket.socket or CompressedSocket): The socket.
+    - buffer (bytearray): The buffer.
+
+    Raises:
+    - ConnectionError: If the connection closed.
+    """
+    chunk = sock.recv(65536)
+    if not chunk:
+        raise ConnectionError("Connection closed while reading the response.")
+    buffer += chunk
@@ -0,0 +1,21 @@
+import os
+
+
+def confine_path(directory, name):
+    """
+    Resolves a file name given by a client to a path inside a directory, creating the directory.
+
+    Args:
+    - directory (str): The directory the file must stay in.
+    - name (str): The file name. Directories, '..' and absolute paths are refused.
+
+    Returns:
+    - str: The path inside 'directory'.
+
+    Raises:
+    - ValueError: If the name is not a plain file name.
+    """
+    if not name or name in ('.', '..') or os.path.basename(name) != name or (os.altsep and os.altsep in name):
+        raise ValueError(f"'{name}' is not a plain file name.")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
@@ -1,6 +1,14 @@
+import json
 import socket
 import threading
+import time
+from cur.common.compression import CompressedSocket, CompressionStats, available_codecs
+from cur.common.framing import send_response
+from cur.common.paths import confine_path
 from cur.server.modules.builders.builder import MailClientBuilder, MailProcessor
+from cur.server.modules.commands.registry import Argument, CommandParseError, CommandRegistry
+from cur.server.modules.pools.pool import ClientConnection, ConnectionPoller, HandlerPool, InFlightLimiter
+from cur.server.modules.profilers.profiler import CallProfiler, MemorySnapshots, SamplingProfiler
 from cur.server.modules.providers.provider import MailServiceProvider
 
 
@@ -15,16 +23,43 @@ class EmailServer:
     - user_email (str): The user's email address.
     - user_password (str): The user's email account password.
     - email_interpreter (MailProcessor): An instance of MailProcessor for handling email operations.
+    - commands (CommandRegistry): The server commands, falling back to the email commands of the interpreter.
+    - transport_compression (bool): Whether clients may negotiate a compressed connection.
+    - transport_compression_stats (CompressionStats): Compression counters of all client connections.
+    - warm_up (bool): Whether the provider's sessions are established in the background on startup and CONFIG.
+    - profiler (SamplingProfiler or CallProfiler): The running CPU profiler, or None.
+    - memory_snapshots (MemorySnapshots): The tracemalloc snapshots taken by 'memsnap'.
+    - profile_dir (str or None): The only directory 'profile stop' and 'memsnap' write files to,
+      or None to disable writing them.
+    - export_dir (str): The only directory 'export mailbox' and 'pop3 download' write archives to.
+    - max_workers (int): The number of threads serving requests.
+    - backlog (int): The number of requests that may wait for a free thread.
+    - max_connections (int): The number of open client connections; further connections are turned away.
+    - idle_timeout (float): Seconds a connection may stay silent between requests.
+    - read_timeout (float): Seconds the rest of a started request may take to arrive, in total.
+    - max_request_size (int): The maximum size of a request in bytes, after decompression.
+    - queue_timeout (float): Seconds a request may wait for a free thread before the client is turned away.
+    - retry_after (int): Seconds clients are told to wait when the server is overloaded.
+    - pool (HandlerPool): The request handler pool, created by start_server.
+    - poller (ConnectionPoller): Watches idle connections and submits their requests to the pool, created by start_server.
+    - in_flight (InFlightLimiter): The per-client limit of requests in progress.
 
     Methods:
-    - __init__(self, host, port, provider_name, user_email, user_password): Initializes the EmailServer instance.
+    - __init__(self, host, port, provider_name, user_email, user_password, transport_compression=True, warm_up=True, ...): Initializes the EmailServer instance.
     - _create_email_interpreter(self): Creates an email interpreter based on the provided provider and user credentials.
     - get_provider_config(provider_name): Returns the configuration for a given email service provider.
     - process_command(self, command): Processes incoming client commands and executes corresponding actions.
-    - handle_client(self, client_socket): Handles communication with a connected client.
+    - receive_request(self, client_socket): Receives a complete request from a client.
+    - negotiate_compression(self, command): Chooses a transport compression codec offered by a client.
+    - busy_response(self): Returns the response sent to clients when the server is overloaded.
+    - serve_request(self, client_socket, client=None): Serves one request of a connected client.
+    - handle_client(self, client_socket, address=None): Handles communication with a connected client in the calling thread.
     - start_server(self): Starts the email server and listens for incoming connections.
     """
-    def __init__(self, host, port, provider_name, user_email, user_password):
+    def __init__(self, host, port, provider_name, user_email, user_password, transport_compression=True,
+                 warm_up=True, max_workers=32, backlog=64, idle_timeout=300, read_timeout=10,
+                 max_in_flight=4, queue_timeout=5, retry_after=1, profile_dir="profiles", max_connections=1024,
+                 export_dir="exports", max_request_size=1 << 20):
         """
         Initializes a new EmailServer instance.
 
@@ -34,13 +69,54 @@ class EmailServer:
         - provider_name (str): The name of the email service provider.
         - user_email (str): The user's email address.
         - user_password (str): The user's email account password.
+        - transport_compression (bool): Whether clients may negotiate a compressed connection.
+        - warm_up (bool): Whether the provider's sessions are established in the background on startup and CONFIG.
+        - max_workers (int): The number of threads serving requests.
+        - backlog (int): The number of requests that may wait for a free thread.
+        - idle_timeout (float): Seconds a connection may stay silent between requests.
+        - read_timeout (float): Seconds the rest of a started request may take to arrive, in total,
+          however it is split across reads.
+        - max_in_flight (int): The number of requests a client (IP address) may have in progress.
+        - queue_timeout (float): Seconds a request may wait for a free thread before the client is turned away.
+        - retry_after (int): Seconds clients are told to wait when the server is overloaded.
+        - profile_dir (str or None): The only directory 'profile stop' and 'memsnap' write files to,
+          or None to disable writing them. Clients only choose file names inside it.
+        - max_connections (int): The number of open client connections; further connections are turned away.
+        - export_dir (str): The only directory 'export mailbox' and 'pop3 download' write archives to.
+          Clients only choose file names inside it.
+        - max_request_size (int): The maximum size of a request in bytes, after decompression.
+          Larger requests are answered with an error and the connection is closed.
         """
         self.host = host
         self.port = port
         self.provider_name = provider_name
         self.user_email = user_email
         self.user_password = user_password
+        self.warm_up = warm_up
+        self.export_dir = export_dir
         self.email_interpreter = self._create_email_interpreter()
+        if self.warm_up:
+            self.email_interpreter.email_organizer.warm_up()
+        self.transport_compression = transport_compression
+        self.transport_compression_stats = CompressionStats()
+        self.profiler = None
+        self.memory_snapshots = MemorySnapshots()
+        self.profile_dir = profile_dir
+        self.max_workers = max_workers
+        self.backlog = backlog
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.max_request_size = max_request_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.pool = None
+        self.poller = None
+        self.in_flight = InFlightLimiter(max_in_flight)
+        self._counters_lock = threading.Lock()
+        self._counters = {'idle_timeouts': 0, 'read_timeouts': 0, 'rejected_connections': 0}
+        self.commands = CommandRegistry(parent=self.email_interpreter.registry)
+        self._register_commands()
 
     def _create_email_interpreter(self):
         """
@@ -55,7 +131,7 @@ class EmailServer:
             organizer = (client_builder.set_provider(config)
                                        .set_user_email(self.user_email)
                                        .set_user_password(self.user_password))
-            return MailProcessor(organizer.build_organizer())
+            return MailProcessor(organizer.build_organizer(), self.export_dir)
         else:
             raise ValueError(f"Провайдер '{self.provider_name}' не найден.")
 
@@ -71,12 +147,39 @@ class EmailServer:
         - MailServiceProvider: The configuration for the specified provider.
         """
         providers = {
-            'gmail': MailServiceProvider('smtp.gmail.com', 587, 'imap.gmail.com', 'pop.gmail.com'),
+            'gmail': MailServiceProvider('smtp.gmail.com', 587, 'imap.gmail.com', 'pop.gmail.com', 15),
             'ukr.net': MailServiceProvider('smtp.ukr.net', 465, 'imap.ukr.net', 'pop3.ukr.net'),
             'i.ua': MailServiceProvider('smtp.i.ua', 465, 'imap.i.ua', 'pop3.i.ua')
         }
         return providers.get(provider_name.lower())
 
+    def _register_commands(self):
+        """
+        Registers the server commands. Email commands are resolved through the interpreter's registry.
+        """
+        register = self.commands.register
+        register("config", self._configure,
+                 (Argument("provider_name"), Argument("user_email"), Argument("user_password", rest=True)),
+                 "Configure email client.")
+        register("compression stats", self._compression_stats, (),
+                 "Show transport and IMAP compression statistics.")
+        register("warmup status", self._warmup_status, (),
+                 "Show how long it took to get the provider's sessions ready.")
+        register("profile start", self._profile_start,
+                 (Argument("mode", required=False, default="sampling", choices=("sampling", "cprofile")),
+                  Argument("interval_ms", float, required=False, default=5.0)),
+                 "Start the sampling profiler, or cProfile for one command at a time, in the command handler threads.")
+        register("profile stop", self._profile_stop, (Argument("name", required=False),),
+                 "Stop the profiler, return its report and optionally write it to a file in the profile directory.")
+        register("memsnap", self._memsnap,
+                 (Argument("top", int, required=False, default=10), Argument("name", required=False)),
+                 "Take a tracemalloc snapshot and show the top allocation changes since the last one.")
+        register("memsnap stop", self._memsnap_stop, (), "Stop tracing allocations.")
+        register("server stats", self._server_stats, (),
+                 "Show handler pool occupancy, rejected requests and timeouts.")
+        register("batch", self._batch, (Argument("commands", rest=True),),
+                 "Run several commands, one per line, and return per-command results as JSON.")
+
     def process_command(self, command):
         """
         Processes incoming client commands and executes corresponding actions.
@@ -87,76 +190,401 @@ class EmailServer:
         Returns:
         - str: The response to be sent back to the client.
         """
-        if command.startswith("CONFIG"):
-            try:
-                _, provider_name, user_email, user_password = command.split(" ", 3)
-                config = self.get_provider_config(provider_name)
-                if config:
-                    client_builder = MailClientBuilder()
-                    organizer = (client_builder.set_provider(config)
-                                           .set_user_email(user_email)
-                                           .set_user_password(user_password))
-                    self.email_interpreter = MailProcessor(organizer.build_organizer())
-                    return "Configuration successful."
-                else:
-                    return f"Provider '{provider_name}' not found."
-            except Exception as e:
-                return f"Error in configuration: {e}"
-
-        elif command.startswith("send email"):
-            _, recipient, subject, body = command.split(" ", 3)
-            self.email_interpreter.email_organizer.prepare_and_send_message(recipient, subject, body)
-            return "Email sent successfully."
-
-        elif command.startswith("classify emails"):
-            self.email_interpreter.email_organizer.classify_and_move_emails()
-            return "Emails classified."
-
-        elif command.startswith("read emails"):
-            self.email_interpreter.email_organizer.read_emails()
-            return "Emails read."
-
-        elif command.startswith("save draft"):
-            params = command.split(" ", 3)[1:]
-            if len(params) >= 3:
-                recipient, subject, body = params
-                self.email_interpreter.email_organizer.save_draft(recipient, subject, body)
-                return "Draft saved."
-            else:
-                return "Insufficient parameters for 'save draft'."
+        profiler = self.profiler
+        if profiler is not None:
+            return profiler.profile(self.commands.dispatch, command)
+        return self.commands.dispatch(command)
+
+    def _configure(self, provider_name, user_email, user_password):
+        """
+        Handles the 'CONFIG' command.
+        """
+        config = self.get_provider_config(provider_name)
+        if not config:
+            return f"Provider '{provider_name}' not found."
+        try:
+            client_builder = MailClientBuilder()
+            organizer = (client_builder.set_provider(config)
+                                       .set_user_email(user_email)
+                                       .set_user_password(user_password))
+            self.email_interpreter.email_organizer.stop_watching()
+            self.email_interpreter.email_organizer.close_warm_sessions()
+            self.email_interpreter = MailProcessor(organizer.build_organizer(), self.export_dir)
+            self.commands.parent = self.email_interpreter.registry
+            if self.warm_up:
+                self.email_interpreter.email_organizer.warm_up()
+            return "Configuration successful."
+        except Exception as e:
+            return f"Error in configuration: {e}"
+
+    def _compression_stats(self):
+        """
+        Handles the 'compression stats' command.
+        """
+        organizer = self.email_interpreter.email_organizer
+        return (f"Transport: {self.transport_compression_stats.summary()}\n"
+                f"IMAP ({'on' if organizer.imap_compression else 'off'}): "
+                f"{organizer.imap_compression_stats.summary()}")
+
+    def _warmup_status(self):
+        """
+        Handles the 'warmup status' command.
+        """
+        warmer = self.email_interpreter.email_organizer.warmer
+        if warmer is None:
+            return "Warm-up is disabled."
+        return warmer.report()
+
+    def _profile_start(self, mode, interval_ms):
+        """
+        Handles the 'profile start' command.
+        """
+        if self.profiler is not None:
+            return "A profiler is already running. Stop it with 'profile stop'."
+        profiler = SamplingProfiler(interval_ms / 1000) if mode == "sampling" else CallProfiler()
+        profiler.start()
+        self.profiler = profiler
+        return f"Profiler started ({mode})."
+
+    def _output_path(self, name):
+        """
+        Resolves a file name given by a client to a path inside the profile directory.
+
+        Args:
+        - name (str): The file name. Directories, '..' and absolute paths are refused.
+
+        Returns:
+        - str: The path the file is written to.
+
+        Raises:
+        - ValueError: If writing files is disabled or the name is not a plain file name.
+        """
+        if self.profile_dir is None:
+            raise ValueError("Writing profiles is disabled on this server.")
+        return confine_path(self.profile_dir, name)
+
+    def _profile_stop(self, name):
+        """
+        Handles the 'profile stop' command.
+        """
+        try:
+            path = self._output_path(name) if name else None
+        except ValueError as e:
+            return f"Error: {e}"
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return "No profiler is running."
+        profiler.stop()
+        report = profiler.report()
+        if path:
+            profiler.write(path)
+            report += f"\nProfile written to {path}."
+        return report
+
+    def _memsnap(self, top, name):
+        """
+        Handles the 'memsnap' command.
+        """
+        try:
+            path = self._output_path(name) if name else None
+        except ValueError as e:
+            return f"Error: {e}"
+        report = self.memory_snapshots.snapshot(top, path)
+        if path:
+            report += f"\nSnapshot written to {path}."
+        return report
+
+    def _memsnap_stop(self):
+        """
+        Handles the 'memsnap stop' command.
+        """
+        if self.memory_snapshots.stop():
+            return "Allocation tracing stopped."
+        return "Allocation tracing is not active."
 
+    def _server_stats(self):
+        """
+        Handles the 'server stats' command.
+        """
+        with self._counters_lock:
+            counters = dict(self._counters)
+        lines = []
+        if self.pool is not None:
+            stats = self.pool.stats()
+            lines.append(f"Workers: {stats['busy']}/{stats['workers']} busy (peak {stats['peak_busy']}), "
+                         f"queue: {stats['queued']}/{stats['backlog']}")
+            lines.append(f"Connections: {self.poller.watched()} idle, "
+                         f"{counters['rejected_connections']} rejected (over {self.max_connections})")
+            lines.append(f"Queued requests: {stats['accepted']} accepted, {stats['rejected']} rejected (queue full), "
+                         f"{stats['expired']} rejected (waited over {self.queue_timeout} s)")
         else:
-            return "Invalid command."
+            lines.append("Handler pool is not running.")
+        lines.append(f"Requests: {self.in_flight.in_flight()} in flight, {self.in_flight.rejected} rejected "
+                     f"(over {self.in_flight.limit} per client)")
+        lines.append(f"Timeouts: {counters['idle_timeouts']} idle, {counters['read_timeouts']} read")
+        return '\n'.join(lines)
 
-    def handle_client(self, client_socket):
+    def _count(self, counter):
         """
-        Handles communication with a connected client.
+        Increments a connection counter.
+
+        Args:
+        - counter (str): The counter name.
+        """
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def _batch(self, commands):
+        """
+        Handles the 'BATCH' command.
+
+        The first line may be a count of sub-commands ('BATCH 3'), which lets handle_client
+        wait until the whole batch has arrived. Nested batches are rejected.
+        """
+        lines = [line.strip() for line in commands.splitlines() if line.strip()]
+        if lines and lines[0].isdigit():
+            lines = lines[1:]
+        results = []
+        for line in lines:
+            if line.split(None, 1)[0].lower() == "batch":
+                results.append({'command': line, 'ok': False,
+                                'error': {'code': 'NESTED_BATCH', 'message': "BATCH cannot be nested."}})
+            else:
+                results.append(self.commands.execute(line))
+        return json.dumps(results, ensure_ascii=False)
+
+    def negotiate_compression(self, command):
+        """
+        Chooses a transport compression codec offered by a client.
+
+        Args:
+        - command (str): The 'COMPRESS <codec> [<codec> ...]' command, codecs in the client's order of preference.
+
+        Returns:
+        - str or None: The chosen codec, or None if the connection stays uncompressed.
+        """
+        if not self.transport_compression:
+            return None
+        supported = available_codecs()
+        for codec in command.split()[1:]:
+            if codec in supported:
+                return codec
+        return None
+
+    def receive_request(self, client_socket):
+        """
+        Receives a complete request from a client.
+
+        A request normally arrives in a single read. 'BATCH <n>' requests consist of the
+        header line and <n> sub-command lines, each terminated by '\\n', and are read until
+        all of them have arrived. Once the first read returns, the rest of the request must
+        arrive within read_timeout in total, so a client sending it a few bytes at a time
+        cannot keep the thread busy.
 
         Args:
         - client_socket (socket.socket): The socket connected to the client.
+
+        Returns:
+        - str or None: The request, or None if the client disconnected or was too slow.
+
+        Raises:
+        - CommandParseError: If the request is larger than max_request_size or is not valid UTF-8.
         """
-        while True:
-            request = client_socket.recv(1024)
-            if not request:
-                break
-            response = self.process_command(request.decode('utf-8'))
-            client_socket.send(response.encode('utf-8'))
-        client_socket.close()
+        client_socket.settimeout(self.idle_timeout)
+        try:
+            request = client_socket.recv(65536)
+        except socket.timeout:
+            self._count('idle_timeouts')
+            return None
+        if not request:
+            return None
+        header = request.split(b'\n', 1)[0].split()
+        if len(header) == 2 and header[0].upper() == b'BATCH' and header[1].isdigit():
+            expected = int(header[1])
+            deadline = time.monotonic() + self.read_timeout
+            while request.count(b'\n') < expected + 1:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count('read_timeouts')
+                    return None
+                client_socket.settimeout(remaining)
+                try:
+                    chunk = client_socket.recv(65536)
+                except socket.timeout:
+                    self._count('read_timeouts')
+                    return None
+                if not chunk:
+                    break
+                request += chunk
+                if len(request) > self.max_request_size:
+                    raise CommandParseError('REQUEST_TOO_LARGE',
+                                            f"Requests are limited to {self.max_request_size} bytes.")
+        try:
+            return request.decode('utf-8')
+        except UnicodeDecodeError:
+            raise CommandParseError('INVALID_ENCODING', "Requests must be encoded in UTF-8.")
+
+    def busy_response(self):
+        """
+        Returns the response sent to clients when the server is overloaded.
+
+        Returns:
+        - str: 'BUSY retry-after <seconds>'.
+        """
+        return f"BUSY retry-after {self.retry_after}"
+
+    def serve_request(self, client_socket, client=None):
+        """
+        Serves one request of a connected client.
+
+        Args:
+        - client_socket (socket.socket or CompressedSocket): The socket connected to the client.
+        - client (str, optional): The client key; requests in progress are limited per IP address.
+
+        Returns:
+        - socket.socket or CompressedSocket or None: The socket to use for the next request,
+          a CompressedSocket once compression was negotiated, or None if the connection is finished.
+        """
+        try:
+            command = self.receive_request(client_socket)
+        except CommandParseError as e:
+            # The rest of a rejected request cannot be told apart from the next one, so the
+            # error is the last response on this connection.
+            send_response(client_socket, f"ERROR {e.code}: {e.message}")
+            return None
+        if command is None:
+            return None
+        if command.startswith("COMPRESS") and not isinstance(client_socket, CompressedSocket):
+            codec = self.negotiate_compression(command)
+            send_response(client_socket, f"COMPRESS {codec or 'none'}")
+            if codec:
+                client_socket = CompressedSocket(client_socket, codec, self.transport_compression_stats)
+            return client_socket
+        if not self.in_flight.acquire(client):
+            send_response(client_socket, self.busy_response())
+            return client_socket
+        try:
+            response = self.process_command(command)
+        finally:
+            self.in_flight.release(client)
+        send_response(client_socket, response)
+        return client_socket
+
+    def handle_client(self, client_socket, address=None):
+        """
+        Handles communication with a connected client in the calling thread.
+
+        Args:
+        - client_socket (socket.socket): The socket connected to the client.
+        - address (tuple, optional): The client address; requests in progress are limited per IP address.
+        """
+        client = address[0] if address else None
+        try:
+            while True:
+                next_socket = self.serve_request(client_socket, client)
+                if next_socket is None:
+                    break
+                client_socket = next_socket
+        except Exception as e:
+            print(f"Помилка з'єднання з клієнтом {address}: {e}")
+        finally:
+            client_socket.close()
+
+    def _submit_request(self, connection):
+        """
+        Submits the request waiting on a connection to the handler pool. Called by the poller.
+
+        Args:
+        - connection (ClientConnection): The connection.
+        """
+        if not self.pool.submit(self._serve_request, connection, on_expired=self._shed):
+            self._shed(connection)
+
+    def _serve_request(self, queued_seconds, connection):
+        """
+        Serves a request taken from the handler pool queue and watches the connection again.
+
+        The connection is closed when the request finished it or failed.
+
+        Args:
+        - queued_seconds (float): The time the request waited for a free thread.
+        - connection (ClientConnection): The connection.
+        """
+        try:
+            next_socket = self.serve_request(connection.socket, connection.client)
+        except Exception as e:
+            print(f"Помилка з'єднання з клієнтом {connection.address}: {e}")
+            next_socket = None
+        if next_socket is None:
+            connection.close()
+            return
+        connection.socket = next_socket
+        if isinstance(connection.socket, CompressedSocket) and connection.socket.pending():
+            # Data already taken off the socket is invisible to the poller.
+            self._submit_request(connection)
+            return
+        self.poller.watch(connection)
+
+    def _shed(self, connection):
+        """
+        Turns away a connection whose request cannot be served in time.
+
+        Args:
+        - connection (ClientConnection): The connection.
+        """
+        self._reject(connection.socket)
+
+    def _close_idle(self, connection):
+        """
+        Closes a connection that stayed silent for longer than idle_timeout.
+
+        Args:
+        - connection (ClientConnection): The connection.
+        """
+        self._count('idle_timeouts')
+        connection.close()
+
+    def _reject(self, client_socket):
+        """
+        Tells a client to retry later and closes the connection.
+
+        The response is sent without waiting, so a stalled client cannot hold up the caller.
+
+        Args:
+        - client_socket (socket.socket): The socket connected to the client.
+        """
+        try:
+            client_socket.settimeout(0)
+            send_response(client_socket, self.busy_response())
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
 
     def start_server(self):
         """
         Starts the email server and listens for incoming connections.
+
+        Idle connections are watched by a single poller thread, and each request is served by
+        a pool of max_workers threads, so a thread is only occupied while a request runs. Up to
+        'backlog' requests wait for a free thread for at most queue_timeout seconds; requests
+        beyond that, and connections beyond max_connections, are answered with a retry-after
+        response and closed right away.
         """
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server.bind((self.host, self.port))
-        server.listen(5)
-        print(f"Server listening on {self.host}:{self.port}")
+        server.listen()
+        self.pool = HandlerPool(self.max_workers, self.backlog, max_wait=self.queue_timeout)
+        self.poller = ConnectionPoller(self._submit_request, self.idle_timeout, on_idle=self._close_idle)
+        print(f"Server listening on {self.host}:{self.port} ({self.max_workers} workers, backlog {self.backlog})")
 
         while True:
             client, address = server.accept()
-            client_handler = threading.Thread(target=self.handle_client, args=(client,))
-            client_handler.start()
-
+            if self.poller.watched() + self.pool.queued() + self.pool.busy() >= self.max_connections:
+                self._count('rejected_connections')
+                self._reject(client)
+                continue
+            self.poller.watch(ClientConnection(client, address))
 
 if __name__ == "__main__":
     HOST = 'localhost'
@@ -1,3 +1,5 @@
+from cur.common.paths import confine_path
+from cur.server.modules.commands.registry import Argument, CommandRegistry
 from cur.server.modules.emailClients.email_client import EmailClient
 from cur.server.modules.organizers.organizer import MailManager
 
@@ -89,20 +91,58 @@ class MailProcessor:
 
     Attributes:
     - email_organizer (MailManager): An instance of MailManager for email operations.
+    - registry (CommandRegistry): The email commands and their argument schemas.
+    - export_dir (str): The only directory 'export mailbox' and 'pop3 download' write archives to.
 
     Methods:
-    - __init__(self, email_organizer): Initializes a new MailProcessor instance.
+    - __init__(self, email_organizer, export_dir='exports'): Initializes a new MailProcessor instance.
     - interpret(self, command): Interprets a command and performs the corresponding email operation.
     """
 
-    def __init__(self, email_organizer):
+    def __init__(self, email_organizer, export_dir='exports'):
         """
         Initializes a new MailProcessor instance.
 
         Args:
         - email_organizer (MailManager): An instance of MailManager for email operations.
+        - export_dir (str): The only directory archives are written to. Clients only choose file names inside it.
         """
         self.email_organizer = email_organizer
+        self.export_dir = export_dir
+        self.registry = CommandRegistry()
+        self._register_commands()
+
+    def _register_commands(self):
+        """
+        Registers the email commands in the registry.
+        """
+        register = self.registry.register
+        register("send email", self._send_email,
+                 (Argument("recipient"), Argument("subject"), Argument("body", rest=True)),
+                 "Send an email.")
+        register("save draft", self._save_draft,
+                 (Argument("recipient"), Argument("subject"), Argument("body", rest=True)),
+                 "Save a draft email.")
+        register("read emails", self._read_emails,
+                 (Argument("offset", int, required=False, default=0), Argument("limit", int, required=False, default=5)),
+                 "Read a page of emails from inbox.")
+        register("search emails", self._search_emails, (Argument("query", rest=True),),
+                 "Find emails in inbox by sender or subject.")
+        register("classify emails", self._classify_emails,
+                 (Argument("connections", int, required=False, default=1),),
+                 "Classify and move emails.")
+        register("list folders", lambda: "List of folders...", (), "List folders.")
+        register("watch emails", self._watch_emails, (), "Classify new emails as soon as they arrive.")
+        register("unwatch emails", self._unwatch_emails, (), "Stop classifying new emails in the background.")
+        register("export mailbox", self._export_mailbox,
+                 (Argument("folder"), Argument("path"), Argument("connections", int, required=False, default=1)),
+                 "Export a folder to .mbox/.mbox.gz/.mbox.zst or a Maildir in the export directory.")
+        register("pop3 download", self._pop3_download,
+                 (Argument("path"), Argument("mode", required=False, choices=("delete",))),
+                 "Download new emails over POP3 into an archive in the export directory.")
+        register("imap compression", self._imap_compression,
+                 (Argument("state", choices=("on", "off")),),
+                 "Toggle IMAP COMPRESS=DEFLATE.")
 
     def interpret(self, command):
         """
@@ -110,16 +150,96 @@ class MailProcessor:
 
         Args:
         - command (str): The command to interpret and execute.
+
+        Returns:
+        - str: The response to the command.
+        """
+        return self.registry.dispatch(command)
+
+    def _send_email(self, recipient, subject, body):
+        """
+        Handles the 'send email' command.
+        """
+        self.email_organizer.prepare_and_send_message(recipient, subject, body)
+        return "Email sent successfully."
+
+    def _save_draft(self, recipient, subject, body):
+        """
+        Handles the 'save draft' command.
+        """
+        self.email_organizer.save_draft(recipient, subject, body)
+        return "Draft saved."
+
+    def _read_emails(self, offset, limit):
+        """
+        Handles the 'read emails' command.
+        """
+        self.email_organizer.read_emails(offset, limit)
+        return "Emails read."
+
+    def _search_emails(self, query):
+        """
+        Handles the 'search emails' command.
+        """
+        envelopes = self.email_organizer.search_emails(query)
+        if not envelopes:
+            return f"No emails match '{query}'."
+        return '\n'.join(f"{envelope.uid}: {envelope.sender} - {envelope.subject}" for envelope in envelopes)
+
+    def _classify_emails(self, connections):
+        """
+        Handles the 'classify emails' command.
+        """
+        self.email_organizer.classify_and_move_emails(connections)
+        return "Emails classified."
+
+    def _watch_emails(self):
+        """
+        Handles the 'watch emails' command.
+        """
+        if self.email_organizer.start_watching():
+            return "Watching inbox for new emails."
+        return "Inbox is already being watched."
+
+    def _unwatch_emails(self):
+        """
+        Handles the 'unwatch emails' command.
+        """
+        if self.email_organizer.stop_watching():
+            return "Stopped watching inbox."
+        return "Inbox is not being watched."
+
+    def _export_mailbox(self, folder, path, connections):
+        """
+        Handles the 'export mailbox' command.
+        """
+        try:
+            path = confine_path(self.export_dir, path)
+        except ValueError as e:
+            return f"Error: {e}"
+        stats = self.email_organizer.export_mailbox(folder, path, connections)
+        if stats is None:
+            return f"Export of '{folder}' failed."
+        return (f"Exported {stats['messages']} emails from '{folder}' "
+                f"({stats['mb_per_second']:.2f} MB/s, {stats['messages_per_second']:.1f} msg/s).")
+
+    def _pop3_download(self, path, mode):
+        """
+        Handles the 'pop3 download' command.
+        """
+        try:
+            path = confine_path(self.export_dir, path)
+        except ValueError as e:
+            return f"Error: {e}"
+        stats = self.email_organizer.download_pop3(path, mode == "delete")
+        if stats is None:
+            return "POP3 download failed."
+        return (f"Downloaded {stats['messages']} emails, skipped {stats['skipped']} "
+                f"({stats['mb_per_second']:.2f} MB/s, {stats['messages_per_second']:.1f} msg/s).")
+
+    def _imap_compression(self, state):
+        """
+        Handles the 'imap compression' command.
         """
-        if "send email" in command:
-            self.email_organizer.perform_email_operation()
-        elif "classify emails" in command:
-            self.email_organizer.classify_and_move_emails()
-        elif "save draft" in command:
-            self.email_organizer.save_draft("recipient@example.com", "Draft Subject", "Draft Body")
-        elif "list folders" in command:
-            print("List of folders...")
-        elif "read emails" in command:
-            self.email_organizer.read_emails()
-        else:
-            print("Invalid command.")
+        self.email_organizer.imap_compression = state == "on"
+        return f"IMAP compression {state}."
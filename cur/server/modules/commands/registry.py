@@ -0,0 +1,317 @@
+import re
+
+TOKEN_PATTERN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|\'([^\']*)\'|(\S+))')
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+
+class CommandParseError(ValueError):
+    """
+    An error raised when a command line cannot be parsed.
+
+    Attributes:
+    - code (str): A machine readable error code, e.g. 'UNKNOWN_COMMAND' or 'MISSING_ARGUMENT'.
+    - message (str): A human readable description.
+    """
+
+    def __init__(self, code, message):
+        """
+        Initializes a new CommandParseError.
+
+        Args:
+        - code (str): A machine readable error code.
+        - message (str): A human readable description.
+        """
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class Argument:
+    """
+    The schema of a single command argument.
+
+    Attributes:
+    - name (str): The name the value is passed to the handler under.
+    - type (callable): Converts the raw string, e.g. int.
+    - required (bool): Whether the argument must be present.
+    - default: The value used when an optional argument is missing.
+    - rest (bool): Whether the argument takes the rest of the line, including spaces.
+    - choices (tuple): The allowed values, or None for any value.
+    """
+
+    def __init__(self, name, type=str, required=True, default=None, rest=False, choices=None):
+        """
+        Initializes a new Argument.
+
+        Args:
+        - name (str): The name the value is passed to the handler under.
+        - type (callable): Converts the raw string, e.g. int.
+        - required (bool): Whether the argument must be present.
+        - default: The value used when an optional argument is missing.
+        - rest (bool): Whether the argument takes the rest of the line. Must be the last argument.
+        - choices (tuple, optional): The allowed values.
+        """
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.rest = rest
+        self.choices = choices
+
+    def convert(self, command_name, raw):
+        """
+        Converts and validates a raw value.
+
+        Args:
+        - command_name (str): The command name, for error messages.
+        - raw (str): The raw value.
+
+        Returns:
+        - The converted value.
+        """
+        try:
+            value = self.type(raw)
+        except ValueError:
+            raise CommandParseError('INVALID_ARGUMENT',
+                                    f"'{raw}' is not a valid {self.name} for '{command_name}'.")
+        if self.choices is not None and value not in self.choices:
+            raise CommandParseError('INVALID_ARGUMENT',
+                                    f"{self.name} for '{command_name}' must be one of: {', '.join(self.choices)}.")
+        return value
+
+
+class CommandSpec:
+    """
+    A registered command.
+
+    Attributes:
+    - name (str): The command name, one or more lowercase words.
+    - handler (callable): Called with the parsed arguments as keyword arguments, returns the response.
+    - arguments (tuple of Argument): The argument schema.
+    - description (str): A short description for help output.
+    """
+
+    def __init__(self, name, handler, arguments=(), description=''):
+        """
+        Initializes a new CommandSpec.
+
+        Args:
+        - name (str): The command name.
+        - handler (callable): The command handler.
+        - arguments (tuple of Argument): The argument schema.
+        - description (str): A short description for help output.
+        """
+        self.name = name
+        self.handler = handler
+        self.arguments = tuple(arguments)
+        self.description = description
+
+    def usage(self):
+        """
+        Returns the usage line of the command.
+
+        Returns:
+        - str: E.g. 'send email <recipient> <subject> <body...>'.
+        """
+        parts = [self.name]
+        for argument in self.arguments:
+            placeholder = argument.name + ('...' if argument.rest else '')
+            parts.append(f"<{placeholder}>" if argument.required else f"[{placeholder}]")
+        return ' '.join(parts)
+
+
+class CommandRegistry:
+    """
+    A table of commands with declared argument schemas.
+
+    Command names are looked up in a dictionary by their first words, so dispatch costs a
+    constant number of lookups regardless of the number of commands. Arguments are split on
+    whitespace; double or single quotes group words, e.g. send email a@b.c "Two words" Body.
+    A registry may have a parent whose commands are used when a name is not found locally.
+
+    Attributes:
+    - parent (CommandRegistry): The registry consulted for names not registered here, or None.
+
+    Methods:
+    - __init__(self, parent=None): Initializes an empty registry.
+    - register(self, name, handler, arguments=(), description=''): Registers a command.
+    - lookup(self, command_line): Finds the command a line starts with.
+    - parse(self, command_line): Parses a command line into a command and its arguments.
+    - execute(self, command_line): Runs a command line and returns a structured result.
+    - dispatch(self, command_line): Runs a command line and returns the response text.
+    - commands(self): Returns all commands, including those of the parent.
+    """
+
+    def __init__(self, parent=None):
+        """
+        Initializes an empty registry.
+
+        Args:
+        - parent (CommandRegistry, optional): The registry consulted for names not registered here.
+        """
+        self.parent = parent
+        self._commands = {}
+        self._max_words = 1
+
+    def register(self, name, handler, arguments=(), description=''):
+        """
+        Registers a command.
+
+        Args:
+        - name (str): The command name, one or more words, matched case-insensitively.
+        - handler (callable): Called with the parsed arguments as keyword arguments, returns the response.
+        - arguments (tuple of Argument): The argument schema.
+        - description (str): A short description for help output.
+
+        Returns:
+        - CommandSpec: The registered command.
+        """
+        name = ' '.join(name.lower().split())
+        spec = CommandSpec(name, handler, arguments, description)
+        self._commands[name] = spec
+        self._max_words = max(self._max_words, len(name.split()))
+        return spec
+
+    def _find(self, words):
+        """
+        Finds the command registered for the longest prefix of 'words'.
+
+        Args:
+        - words (list of str): The lowercase leading words of a command line.
+
+        Returns:
+        - tuple: (CommandSpec, number of words in its name), or (None, 0).
+        """
+        for count in range(min(self._max_words, len(words)), 0, -1):
+            spec = self._commands.get(' '.join(words[:count]))
+            if spec is not None:
+                return spec, count
+        if self.parent is not None:
+            return self.parent._find(words)
+        return None, 0
+
+    def lookup(self, command_line):
+        """
+        Finds the command a line starts with.
+
+        Args:
+        - command_line (str): The command line.
+
+        Returns:
+        - tuple: (CommandSpec, rest of the line after the command name).
+        """
+        limit = self._max_words_total()
+        words = command_line.split(None, limit)
+        spec, count = self._find([word.lower() for word in words[:limit]])
+        if spec is None:
+            name = words[0] if words else ''
+            raise CommandParseError('UNKNOWN_COMMAND', f"Invalid command '{name}'.")
+        parts = command_line.split(None, count)
+        return spec, parts[count] if len(parts) > count else ''
+
+    def _max_words_total(self):
+        """
+        Returns the number of words of the longest command name, including the parent's commands.
+        """
+        if self.parent is None:
+            return self._max_words
+        return max(self._max_words, self.parent._max_words_total())
+
+    def parse(self, command_line):
+        """
+        Parses a command line into a command and its arguments.
+
+        Args:
+        - command_line (str): The command line.
+
+        Returns:
+        - tuple: (CommandSpec, dict of argument values).
+        """
+        spec, rest = self.lookup(command_line)
+        values = {}
+        position = 0
+        for argument in spec.arguments:
+            remaining = rest[position:].strip()
+            if not remaining:
+                if argument.required:
+                    raise CommandParseError('MISSING_ARGUMENT',
+                                            f"'{spec.name}' requires {argument.name}. Usage: {spec.usage()}")
+                values[argument.name] = argument.default
+                continue
+            if argument.rest:
+                match = TOKEN_PATTERN.fullmatch(rest, position)
+                raw = self._token_value(match) if match and match.group(3) is None else remaining
+                position = len(rest)
+            else:
+                match = TOKEN_PATTERN.match(rest, position)
+                if match is None or (match.group(3) or '').startswith(('"', "'")):
+                    raise CommandParseError('SYNTAX', f"Unterminated quote in '{spec.name}' arguments.")
+                raw = self._token_value(match)
+                position = match.end()
+            values[argument.name] = argument.convert(spec.name, raw)
+        if rest[position:].strip():
+            raise CommandParseError('UNEXPECTED_ARGUMENT',
+                                    f"Too many arguments for '{spec.name}'. Usage: {spec.usage()}")
+        return spec, values
+
+    @staticmethod
+    def _token_value(match):
+        """
+        Returns the unquoted value of a token match.
+
+        Args:
+        - match (re.Match): A TOKEN_PATTERN match.
+
+        Returns:
+        - str: The token value.
+        """
+        if match.group(1) is not None:
+            return ESCAPE_PATTERN.sub(r'\1', match.group(1))
+        if match.group(2) is not None:
+            return match.group(2)
+        return match.group(3)
+
+    def execute(self, command_line):
+        """
+        Runs a command line and returns a structured result.
+
+        Args:
+        - command_line (str): The command line.
+
+        Returns:
+        - dict: {'command', 'ok': True, 'response'} on success, or
+          {'command', 'ok': False, 'error': {'code', 'message'}} on failure.
+        """
+        try:
+            spec, values = self.parse(command_line)
+            return {'command': command_line, 'ok': True, 'response': spec.handler(**values)}
+        except CommandParseError as e:
+            return {'command': command_line, 'ok': False, 'error': {'code': e.code, 'message': e.message}}
+        except Exception as e:
+            return {'command': command_line, 'ok': False, 'error': {'code': 'COMMAND_FAILED', 'message': str(e)}}
+
+    def dispatch(self, command_line):
+        """
+        Runs a command line and returns the response text.
+
+        Args:
+        - command_line (str): The command line.
+
+        Returns:
+        - str: The handler's response, or 'ERROR <code>: <message>' if the command failed.
+        """
+        result = self.execute(command_line)
+        if result['ok']:
+            return result['response']
+        return f"ERROR {result['error']['code']}: {result['error']['message']}"
+
+    def commands(self):
+        """
+        Returns all commands, including those of the parent.
+
+        Returns:
+        - list of CommandSpec: The commands sorted by name.
+        """
+        specs = {spec.name: spec for spec in self.parent.commands()} if self.parent is not None else {}
+        specs.update(self._commands)
+        return [specs[name] for name in sorted(specs)]
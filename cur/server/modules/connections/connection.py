@@ -0,0 +1,193 @@
+import socket
+import ssl
+import threading
+import time
+
+
+class AddressCache:
+    """
+    A thread-safe cache of resolved server addresses.
+
+    getaddrinfo results are kept for 'ttl' seconds, so repeated connections to the same
+    provider do not pay for DNS resolution. An entry is dropped when none of its addresses
+    accepts a connection, so a moved server is re-resolved on the next attempt.
+
+    Attributes:
+    - ttl (float): Number of seconds a resolved address is kept.
+
+    Methods:
+    - __init__(self, ttl=300): Initializes an empty cache.
+    - resolve(self, host, port): Returns the cached or freshly resolved addresses of a server.
+    - create_connection(self, address, timeout): Connects a TCP socket using the cached addresses.
+    - clear(self): Drops all cached addresses.
+    """
+
+    def __init__(self, ttl=300):
+        """
+        Initializes an empty cache.
+
+        Args:
+        - ttl (float): Number of seconds a resolved address is kept.
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def resolve(self, host, port):
+        """
+        Returns the cached or freshly resolved addresses of a server.
+
+        Args:
+        - host (str): The server host name.
+        - port (int): The server port number.
+
+        Returns:
+        - list of tuple: getaddrinfo results for TCP connections.
+        """
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), addresses)
+        return addresses
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """
+        Connects a TCP socket using the cached addresses, like socket.create_connection.
+
+        Args:
+        - address (tuple): (host, port) of the server.
+        - timeout (float, optional): The socket timeout in seconds, None to block. The global
+          default timeout is used if omitted.
+
+        Returns:
+        - socket.socket: The connected socket.
+        """
+        host, port = address
+        error = None
+        for family, socket_type, proto, _, socket_address in self.resolve(host, port):
+            sock = socket.socket(family, socket_type, proto)
+            try:
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                sock.connect(socket_address)
+                return sock
+            except OSError as e:
+                error = e
+                sock.close()
+        with self._lock:
+            self._entries.pop((host, port), None)
+        raise error if error is not None else OSError(f"No addresses found for {host}:{port}.")
+
+    def clear(self):
+        """
+        Drops all cached addresses.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    A client SSLContext that resumes TLS sessions with servers it has already connected to.
+
+    The last session of every (server name, port) pair is remembered and offered on the
+    next handshake, which saves a round trip and the certificate verification.
+
+    Methods:
+    - __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT): Initializes the context with an empty session cache.
+    - wrap_socket(self, sock, server_side=False, ..., server_hostname=None, session=None): Wraps a socket, offering a remembered session.
+    - remember(self, ssl_socket): Remembers the session of an established connection.
+    """
+
+    def __new__(cls, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        return super().__new__(cls, protocol)
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        """
+        Initializes the context with an empty session cache.
+
+        Args:
+        - protocol (int): The protocol, see ssl.SSLContext.
+        """
+        super().__init__()
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    def _session_key(self, sock, server_hostname):
+        """
+        Returns the key sessions of a connection are remembered under.
+
+        Args:
+        - sock (socket.socket): The connected socket.
+        - server_hostname (str): The server name used for SNI and certificate checks.
+        """
+        try:
+            return server_hostname, sock.getpeername()[1]
+        except OSError:
+            return None
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        """
+        Wraps a socket, offering the remembered session of the server.
+
+        Args:
+        - sock (socket.socket): The connected socket.
+        - server_hostname (str, optional): The server name used for SNI and certificate checks.
+        - session (ssl.SSLSession, optional): The session to resume, looked up if omitted.
+        - The other arguments are those of ssl.SSLContext.wrap_socket.
+
+        Returns:
+        - ssl.SSLSocket: The wrapped socket.
+        """
+        key = None if server_side else self._session_key(sock, server_hostname)
+        if session is None and key is not None:
+            with self._sessions_lock:
+                session = self._sessions.get(key)
+        ssl_socket = super().wrap_socket(sock, server_side, do_handshake_on_connect,
+                                         suppress_ragged_eofs, server_hostname, session=session)
+        self.remember(ssl_socket)
+        return ssl_socket
+
+    def remember(self, ssl_socket):
+        """
+        Remembers the session of an established connection.
+
+        With TLS 1.3 the session ticket arrives after the handshake, so this is called
+        again once the connection has exchanged data, e.g. after login.
+
+        Args:
+        - ssl_socket (ssl.SSLSocket): The connection.
+        """
+        session = getattr(ssl_socket, 'session', None)
+        if session is None or not ssl_socket.server_hostname:
+            return
+        key = self._session_key(ssl_socket, ssl_socket.server_hostname)
+        if key is not None:
+            with self._sessions_lock:
+                self._sessions[key] = session
+
+
+_tls_context = None
+_tls_context_lock = threading.Lock()
+
+address_cache = AddressCache()
+
+
+def shared_tls_context():
+    """
+    Returns the SSLContext shared by all SMTP, IMAP and POP3 connections of the server.
+
+    Returns:
+    - ResumingSSLContext: A context verifying certificates against the default CA store.
+    """
+    global _tls_context
+    with _tls_context_lock:
+        if _tls_context is None:
+            _tls_context = ResumingSSLContext()
+            _tls_context.load_default_certs()
+        return _tls_context
@@ -0,0 +1,166 @@
+import threading
+import time
+
+from cur.server.modules.connections.connection import address_cache
+
+
+class ConnectionWarmer:
+    """
+    Establishes the first sessions to the provider's servers in the background.
+
+    For every target the server address is resolved into the shared address cache, then a
+    session is opened and authenticated. The first command takes the warm session instead
+    of connecting itself. If warming is still in progress the command does not wait for a
+    warm-up that may be slow or fail, it connects on its own and the warm session is left
+    for the next command. Sessions older than 'session_ttl' are discarded, since servers
+    close idle connections.
+
+    Attributes:
+    - targets (dict): Target names (e.g. 'smtp') mapped to ((host, port), open, close) tuples.
+    - session_ttl (float): Number of seconds a warm session may wait for a command.
+    - timings (dict): Seconds spent per step, e.g. 'smtp dns' and 'smtp session'.
+    - errors (dict): Target names mapped to the error that stopped their warm-up.
+    - ready_after (float): Seconds from start until all targets were warmed, or None.
+
+    Methods:
+    - __init__(self, targets, session_ttl=60): Initializes the warmer.
+    - start(self): Starts warming all targets in background threads.
+    - take(self, name, timeout=0): Returns the warm session of a target if it is ready, or None.
+    - wait(self, timeout=None): Waits until all targets were warmed.
+    - close(self): Closes all sessions that were not taken.
+    - report(self): Returns a human readable time-to-ready report.
+    """
+
+    def __init__(self, targets, session_ttl=60):
+        """
+        Initializes the warmer.
+
+        Args:
+        - targets (dict): Target names mapped to ((host, port), open, close) tuples, where
+          open() returns an authenticated session and close(session) closes it.
+        - session_ttl (float): Number of seconds a warm session may wait for a command.
+        """
+        self.targets = targets
+        self.session_ttl = session_ttl
+        self.timings = {}
+        self.errors = {}
+        self.ready_after = None
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._ready = {name: threading.Event() for name in targets}
+        self._start_time = None
+
+    def start(self):
+        """
+        Starts warming all targets in background threads.
+
+        Returns:
+        - ConnectionWarmer: This warmer.
+        """
+        self._start_time = time.perf_counter()
+        for name in self.targets:
+            threading.Thread(target=self._warm, args=(name,), name=f"warm-{name}", daemon=True).start()
+        return self
+
+    def _warm(self, name):
+        """
+        Resolves the address of a target and opens its session.
+
+        Args:
+        - name (str): The target name.
+        """
+        (host, port), open_session, _ = self.targets[name]
+        try:
+            step_start = time.perf_counter()
+            address_cache.resolve(host, port)
+            self.timings[f"{name} dns"] = time.perf_counter() - step_start
+            step_start = time.perf_counter()
+            session = open_session()
+            self.timings[f"{name} session"] = time.perf_counter() - step_start
+            with self._lock:
+                self._sessions[name] = (session, time.monotonic())
+        except Exception as e:
+            self.errors[name] = str(e)
+        finally:
+            self._ready[name].set()
+            if all(event.is_set() for event in self._ready.values()) and self.ready_after is None:
+                self.ready_after = time.perf_counter() - self._start_time
+                print(self.report())
+
+    def take(self, name, timeout=0):
+        """
+        Returns the warm session of a target if it is ready.
+
+        Every session is handed out once.
+
+        Args:
+        - name (str): The target name.
+        - timeout (float): Maximum number of seconds to wait for warming to finish, 0 to not wait.
+
+        Returns:
+        - The authenticated session, or None if it is not ready yet, failed or is too old.
+        """
+        event = self._ready.get(name)
+        if event is None or not event.wait(timeout):
+            return None
+        with self._lock:
+            entry = self._sessions.pop(name, None)
+        if entry is None:
+            return None
+        session, opened_at = entry
+        if time.monotonic() - opened_at > self.session_ttl:
+            self._close(name, session)
+            return None
+        return session
+
+    def wait(self, timeout=None):
+        """
+        Waits until all targets were warmed.
+
+        Args:
+        - timeout (float, optional): Maximum number of seconds to wait.
+
+        Returns:
+        - bool: True if warming has finished.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event in self._ready.values():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not event.wait(remaining):
+                return False
+        return True
+
+    def _close(self, name, session):
+        """
+        Closes a session, ignoring errors.
+
+        Args:
+        - name (str): The target name.
+        - session: The session.
+        """
+        try:
+            self.targets[name][2](session)
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        Closes all sessions that were not taken.
+        """
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for name, (session, _) in sessions.items():
+            self._close(name, session)
+
+    def report(self):
+        """
+        Returns a human readable time-to-ready report.
+
+        Returns:
+        - str: The report.
+        """
+        if self.ready_after is None:
+            return "Warm-up in progress."
+        steps = ', '.join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in self.timings.items())
+        errors = ''.join(f"; {name} failed: {error}" for name, error in self.errors.items())
+        return f"Ready in {self.ready_after * 1000:.0f} ms ({steps}){errors}"
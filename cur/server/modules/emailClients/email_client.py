@@ -1,11 +1,12 @@
 import os
-import smtplib
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+from cur.server.modules.connections.warmer import ConnectionWarmer
 from cur.server.modules.decorators.decorator import track_execution_time
+from cur.server.modules.emailClients.smtp_session import SMTPSession
 from cur.server.modules.templates.template import MailTemplate
 
 
@@ -18,8 +19,14 @@ class EmailClient(MailTemplate):
     - user_password (str): The user's email account password.
     - provider (MailServiceProvider): The email service provider configuration.
     - message (MIMEMultipart): The email message to be sent.
+    - warmer (ConnectionWarmer): The warm-up of the first sessions, if started.
 
     Methods:
+    - __init__(self, provider, user_email, user_password): Initializes the email client.
+    - open_smtp_session(self): Returns a logged in SMTP session, preferring a warm one.
+    - warm_up_targets(self): Returns the sessions warmed up by warm_up.
+    - warm_up(self): Starts establishing the first sessions in the background.
+    - close_warm_sessions(self): Closes warm sessions that were not used.
     - connect_to_server(self): Connects to the SMTP server for sending emails.
     - prepare_and_send_message(self, recipient, subject, body, attachments=None): Prepares and sends an email message.
     - prepare_message(self, recipient, subject, body, attachments=None): Prepares an email message without sending it.
@@ -29,6 +36,75 @@ class EmailClient(MailTemplate):
     - send_email_with_attachments(self, recipient, subject, body, attachments=None): Sends an email with attachments.
     """
 
+    def __init__(self, provider, user_email, user_password):
+        """
+        Initializes the email client with provider and user credentials.
+
+        Args:
+        - provider: The email service provider configuration.
+        - user_email (str): The user's email address.
+        - user_password (str): The user's email account password.
+        """
+        super().__init__(provider, user_email, user_password)
+        self.warmer = None
+
+    def _connect_smtp(self):
+        """
+        Opens, secures and logs in a new SMTP session.
+
+        Returns:
+        - SMTPSession: The logged in session.
+        """
+        server = SMTPSession(self.provider.smtp_server, self.provider.smtp_port)
+        try:
+            server.secure()
+            server.login(self.user_email, self.user_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def open_smtp_session(self):
+        """
+        Returns a logged in SMTP session, taking the warm session if one is available.
+
+        Returns:
+        - SMTPSession: The session. It can be used as a context manager.
+        """
+        if self.warmer is not None:
+            server = self.warmer.take('smtp')
+            if server is not None:
+                return server
+        return self._connect_smtp()
+
+    def warm_up_targets(self):
+        """
+        Returns the sessions warmed up by warm_up.
+
+        Returns:
+        - dict: Target names mapped to ((host, port), open, close) tuples, see ConnectionWarmer.
+        """
+        return {'smtp': ((self.provider.smtp_server, self.provider.smtp_port), self._connect_smtp,
+                         lambda server: server.quit())}
+
+    def warm_up(self):
+        """
+        Starts resolving the provider's servers and establishing the first sessions in the background.
+
+        Returns:
+        - ConnectionWarmer: The started warmer.
+        """
+        self.close_warm_sessions()
+        self.warmer = ConnectionWarmer(self.warm_up_targets()).start()
+        return self.warmer
+
+    def close_warm_sessions(self):
+        """
+        Closes warm sessions that were not used.
+        """
+        if self.warmer is not None:
+            self.warmer.close()
+
     @track_execution_time
     def connect_to_server(self):
         """
@@ -37,9 +113,8 @@ class EmailClient(MailTemplate):
         try:
             print("Підключення до SMTP серверу...")
 
-            with smtplib.SMTP(self.provider.smtp_server, self.provider.smtp_port) as server:
-                server.starttls()
-                server.login(self.user_email, self.user_password)
+            with self.open_smtp_session() as server:
+                server.noop()
 
         except Exception as e:
             print(f"Помилка підключення до SMTP серверу: {e}")
@@ -95,9 +170,7 @@ class EmailClient(MailTemplate):
         print("Відправлення повідомлення...")
 
         try:
-            with smtplib.SMTP(self.provider.smtp_server, self.provider.smtp_port) as server:
-                server.starttls()
-                server.login(self.user_email, self.user_password)
+            with self.open_smtp_session() as server:
                 server.sendmail(self.user_email, [self.message['To']], self.message.as_string())
             print("Email sent successfully!")
         except Exception as e:
@@ -170,9 +243,7 @@ class EmailClient(MailTemplate):
                 msg.attach(part)
 
         try:
-            with smtplib.SMTP(self.provider.smtp_server, self.provider.smtp_port) as server:
-                server.starttls()
-                server.login(self.user_email, self.user_password)
+            with self.open_smtp_session() as server:
                 server.sendmail(self.user_email, [recipient], msg.as_string())
             print("Email with attachments sent successfully!")
         except Exception as e:
@@ -0,0 +1,44 @@
+import smtplib
+
+from cur.server.modules.connections.connection import address_cache, shared_tls_context
+
+SMTPS_PORT = 465
+
+
+class SMTPSession(smtplib.SMTP):
+    """
+    An SMTP connection that uses the shared address cache and TLS context.
+
+    Port 465 uses implicit TLS; other ports are upgraded with STARTTLS by secure().
+
+    Attributes:
+    - implicit_tls (bool): Whether TLS is negotiated right after connecting.
+
+    Methods:
+    - __init__(self, host, port): Connects to the server.
+    - secure(self): Upgrades the connection with STARTTLS unless TLS is already active.
+    """
+
+    def __init__(self, host, port):
+        """
+        Initializes a new SMTPSession and connects to the server.
+
+        Args:
+        - host (str): The SMTP server address.
+        - port (int): The SMTP server port number.
+        """
+        self.implicit_tls = port == SMTPS_PORT
+        super().__init__(host, port)
+
+    def _get_socket(self, host, port, timeout):
+        sock = address_cache.create_connection((host, port), timeout)
+        if self.implicit_tls:
+            sock = shared_tls_context().wrap_socket(sock, server_hostname=host)
+        return sock
+
+    def secure(self):
+        """
+        Upgrades the connection with STARTTLS unless TLS is already active.
+        """
+        if not self.implicit_tls:
+            self.starttls(context=shared_tls_context())
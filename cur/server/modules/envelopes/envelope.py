@@ -0,0 +1,507 @@
+import heapq
+import imaplib
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from email.header import decode_header, make_header
+
+SIZE_PATTERN = re.compile(rb'RFC822\.SIZE (\d+)')
+ENVELOPE_FETCH_ITEMS = '(INTERNALDATE RFC822.SIZE BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)])'
+
+
+def parse_header_fields(header):
+    """
+    Parses a block of header fields into a dictionary without building an email.message.Message.
+
+    Args:
+    - header (bytes): Raw header lines, e.g. the result of BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)].
+
+    Returns:
+    - dict: Lowercase field names mapped to decoded (RFC 2047) values.
+    """
+    fields = {}
+    unfolded = re.sub(rb'\r?\n[ \t]+', b' ', header or b'')
+    for line in unfolded.splitlines():
+        name, separator, value = line.partition(b':')
+        if not separator:
+            continue
+        value = value.strip().decode('utf-8', 'replace')
+        try:
+            value = str(make_header(decode_header(value)))
+        except (LookupError, ValueError):
+            pass
+        fields.setdefault(name.strip().lower().decode('ascii', 'replace'), value)
+    return fields
+
+
+class Envelope:
+    """
+    A summary of a single email.
+
+    Attributes:
+    - uid (int): The UID of the email.
+    - date (float): The internal date as a Unix timestamp.
+    - size (int): The size of the email in bytes.
+    - sender (str): The From header.
+    - subject (str): The Subject header.
+    """
+
+    __slots__ = ('uid', 'date', 'size', 'sender', 'subject')
+
+    def __init__(self, uid, date, size, sender, subject):
+        """
+        Initializes a new Envelope.
+
+        Args:
+        - uid (int): The UID of the email.
+        - date (float): The internal date as a Unix timestamp.
+        - size (int): The size of the email in bytes.
+        - sender (str): The From header.
+        - subject (str): The Subject header.
+        """
+        self.uid = uid
+        self.date = date
+        self.size = size
+        self.sender = sender
+        self.subject = subject
+
+    def __repr__(self):
+        return f"Envelope(uid={self.uid}, sender={self.sender!r}, subject={self.subject!r})"
+
+
+class StringPool:
+    """
+    A compact table of unique strings with integer ids.
+
+    Strings are stored UTF-8 encoded in one bytearray and found through an open-addressing
+    hash table kept in an array, so a string costs its encoded length plus 32 to 40 bytes
+    and no Python object is kept per string. The hash of every string is kept as well, so
+    lookups and table growth compare stored bytes only when the hashes are equal.
+
+    Case-insensitive searches decode the pool once per query instead of keeping a lowercased
+    copy, and the sort ranks of the strings are computed once until new strings are added.
+
+    Methods:
+    - intern(self, text): Returns the id of a string, adding it if needed.
+    - __getitem__(self, string_id): Returns the string with the given id.
+    - __len__(self): Returns the number of unique strings.
+    - find(self, text): Returns the ids of the strings containing 'text', ignoring case.
+    - ranks(self): Returns the case-insensitive sort rank of every string, indexed by id.
+    - nbytes(self): Returns the approximate memory used by the pool.
+    """
+
+    INITIAL_TABLE_SIZE = 1024
+
+    def __init__(self):
+        """
+        Initializes an empty pool.
+        """
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self._positions = array('Q', [0])
+        self._hashes = array('q')
+        self._table = array('i', [-1]) * self.INITIAL_TABLE_SIZE
+        self._ranks = None
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def intern(self, text):
+        """
+        Returns the id of a string, adding it to the pool if needed.
+
+        Args:
+        - text (str): The string.
+
+        Returns:
+        - int: The string id.
+        """
+        encoded = text.encode('utf-8', 'surrogatepass')
+        encoded_hash = hash(encoded)
+        table, hashes, offsets, data = self._table, self._hashes, self._offsets, self._data
+        mask = len(table) - 1
+        slot = encoded_hash & mask
+        while True:
+            string_id = table[slot]
+            if string_id == -1:
+                break
+            if hashes[string_id] == encoded_hash and data[offsets[string_id]:offsets[string_id + 1]] == encoded:
+                return string_id
+            slot = (slot + 1) & mask
+        string_id = len(hashes)
+        data += encoded
+        offsets.append(len(data))
+        self._positions.append(self._positions[-1] + len(text))
+        hashes.append(encoded_hash)
+        table[slot] = string_id
+        if len(hashes) * 2 > len(table):
+            self._grow()
+        return string_id
+
+    def _grow(self):
+        """
+        Doubles the hash table and re-inserts all strings by their stored hashes.
+        """
+        table = array('i', [-1]) * (len(self._table) * 2)
+        mask = len(table) - 1
+        for string_id, encoded_hash in enumerate(self._hashes):
+            slot = encoded_hash & mask
+            while table[slot] != -1:
+                slot = (slot + 1) & mask
+            table[slot] = string_id
+        self._table = table
+
+    def __getitem__(self, string_id):
+        """
+        Returns the string with the given id.
+
+        Args:
+        - string_id (int): The string id.
+
+        Returns:
+        - str: The string.
+        """
+        return self._data[self._offsets[string_id]:self._offsets[string_id + 1]].decode('utf-8', 'surrogatepass')
+
+    def find(self, text):
+        """
+        Returns the ids of the strings containing 'text', ignoring case.
+
+        The pool is decoded into one temporary string and searched with a case-insensitive
+        regular expression; character positions are mapped back to string ids, and matches
+        that span two adjacent strings are skipped.
+
+        Args:
+        - text (str): The text to look for.
+
+        Returns:
+        - set of int: The matching string ids.
+        """
+        if not text:
+            return set(range(len(self)))
+        decoded = self._data.decode('utf-8', 'surrogatepass')
+        pattern = re.compile(re.escape(text), re.IGNORECASE)
+        positions = self._positions
+        found = set()
+        match = pattern.search(decoded)
+        while match:
+            string_id = bisect_right(positions, match.start()) - 1
+            end = positions[string_id + 1]
+            if match.end() <= end:
+                found.add(string_id)
+                match = pattern.search(decoded, end)
+            else:
+                match = pattern.search(decoded, match.start() + 1)
+        return found
+
+    def ranks(self):
+        """
+        Returns the case-insensitive sort rank of every string, indexed by id.
+
+        Returns:
+        - array: The ranks, recomputed only after new strings were added.
+        """
+        if self._ranks is None or len(self._ranks) != len(self):
+            decoded = self._data.decode('utf-8', 'surrogatepass')
+            positions = self._positions
+            keys = [decoded[positions[string_id]:positions[string_id + 1]].lower() for string_id in range(len(self))]
+            ranks = array('I', [0]) * len(keys)
+            for rank, string_id in enumerate(sorted(range(len(keys)), key=keys.__getitem__)):
+                ranks[string_id] = rank
+            self._ranks = ranks
+        return self._ranks
+
+    def nbytes(self):
+        """
+        Returns the approximate memory used by the pool in bytes.
+
+        Returns:
+        - int: The size of the string data, offsets, hashes, hash table and cached ranks.
+        """
+        arrays = (self._offsets, self._positions, self._hashes, self._table, self._ranks or array('I'))
+        return len(self._data) + sum(values.itemsize * len(values) for values in arrays)
+
+
+class EnvelopeStore:
+    """
+    A column-oriented store of email envelopes for large mailboxes.
+
+    UIDs, dates and sizes are kept in typed arrays; senders and subjects are interned in a
+    StringPool and stored as ids, so an envelope costs about 24 bytes plus its unique strings.
+    Queries return arrays of row indices that can be combined, sorted and paged.
+
+    All methods hold 'lock', so readers never see a store that is half updated. Callers that
+    combine several calls (e.g. filter, then page) or synchronize the store hold it too.
+
+    Attributes:
+    - uid_validity (int): The UIDVALIDITY of the folder the envelopes belong to, or None.
+    - uids (array): UIDs, in ascending order when filled from an ordered fetch.
+    - dates (array): Internal dates as Unix timestamps.
+    - sizes (array): Sizes in bytes.
+    - sender_ids (array): Ids of the From headers in 'strings'.
+    - subject_ids (array): Ids of the Subject headers in 'strings'.
+    - strings (StringPool): The interned senders and subjects.
+    - lock (threading.RLock): Guards all columns.
+
+    Methods:
+    - clear(self, uid_validity=None): Drops all envelopes.
+    - append(self, uid, date, size, sender, subject): Adds an envelope.
+    - add_fetch_record(self, uid, meta, header): Adds an envelope from a fetched record.
+    - __len__(self): Returns the number of envelopes.
+    - __getitem__(self, index): Returns the envelope at a row index.
+    - index_of(self, uid): Returns the row index of a UID.
+    - retain(self, uids): Drops envelopes whose UIDs are not in 'uids'.
+    - filter(self, ...): Returns the row indices matching all given conditions.
+    - sort(self, indices=None, key='date', reverse=False): Returns row indices sorted by a column.
+    - page(self, offset=0, limit=20, key='uid', reverse=False, indices=None): Returns a page of envelopes.
+    - nbytes(self): Returns the approximate memory used by the store.
+    """
+
+    COLUMNS = ('uids', 'dates', 'sizes', 'sender_ids', 'subject_ids')
+
+    def __init__(self):
+        """
+        Initializes an empty store.
+        """
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self, uid_validity=None):
+        """
+        Drops all envelopes, e.g. after the UIDVALIDITY of the folder changed.
+
+        Args:
+        - uid_validity (int, optional): The new UIDVALIDITY.
+        """
+        with self.lock:
+            self.uid_validity = uid_validity
+            self.uids = array('I')
+            self.dates = array('d')
+            self.sizes = array('I')
+            self.sender_ids = array('I')
+            self.subject_ids = array('I')
+            self.strings = StringPool()
+
+    def __len__(self):
+        return len(self.uids)
+
+    def append(self, uid, date, size, sender, subject):
+        """
+        Adds an envelope.
+
+        Args:
+        - uid (int): The UID of the email.
+        - date (float): The internal date as a Unix timestamp.
+        - size (int): The size of the email in bytes.
+        - sender (str): The From header.
+        - subject (str): The Subject header.
+        """
+        with self.lock:
+            self.uids.append(uid)
+            self.dates.append(date)
+            self.sizes.append(size)
+            self.sender_ids.append(self.strings.intern(sender))
+            self.subject_ids.append(self.strings.intern(subject))
+
+    def add_fetch_record(self, uid, meta, header):
+        """
+        Adds an envelope from a record fetched with ENVELOPE_FETCH_ITEMS.
+
+        Args:
+        - uid (int): The UID of the email.
+        - meta (bytes): The non-literal part of the FETCH response.
+        - header (bytes): The From and Subject header fields.
+        """
+        date = imaplib.Internaldate2tuple(meta)
+        size = SIZE_PATTERN.search(meta)
+        fields = parse_header_fields(header)
+        self.append(uid, time.mktime(date) if date else 0.0, int(size.group(1)) if size else 0,
+                    fields.get('from', ''), fields.get('subject', ''))
+
+    def __getitem__(self, index):
+        """
+        Returns the envelope at a row index.
+
+        Args:
+        - index (int): The row index.
+
+        Returns:
+        - Envelope: The envelope.
+        """
+        with self.lock:
+            return Envelope(self.uids[index], self.dates[index], self.sizes[index],
+                            self.strings[self.sender_ids[index]], self.strings[self.subject_ids[index]])
+
+    def index_of(self, uid):
+        """
+        Returns the row index of a UID. The store must be in UID order.
+
+        Args:
+        - uid (int): The UID.
+
+        Returns:
+        - int or None: The row index, or None if the UID is not stored.
+        """
+        with self.lock:
+            index = bisect_left(self.uids, uid)
+            if index < len(self.uids) and self.uids[index] == uid:
+                return index
+            return None
+
+    def retain(self, uids):
+        """
+        Drops envelopes whose UIDs are not in 'uids', e.g. after emails were moved or deleted.
+
+        Args:
+        - uids (iterable of int): The UIDs currently in the folder.
+        """
+        with self.lock:
+            present = set(uids)
+            keep = [index for index, uid in enumerate(self.uids) if uid in present]
+            if len(keep) == len(self.uids):
+                return
+            for column in self.COLUMNS:
+                values = getattr(self, column)
+                setattr(self, column, array(values.typecode, [values[index] for index in keep]))
+
+    def _matching_strings(self, text):
+        """
+        Returns the ids of the interned strings that contain 'text', ignoring case.
+
+        Args:
+        - text (str): The text to look for.
+
+        Returns:
+        - set of int: The matching string ids.
+        """
+        return self.strings.find(text)
+
+    @staticmethod
+    def _select(rows, column, predicate):
+        """
+        Returns the rows whose value in 'column' satisfies 'predicate'.
+
+        Args:
+        - rows (list of int or None): The candidate rows, None for all rows.
+        - column (array): The column.
+        - predicate (callable): Called with a column value.
+
+        Returns:
+        - list of int: The matching rows.
+        """
+        if rows is None:
+            return [index for index, value in enumerate(column) if predicate(value)]
+        return [index for index in rows if predicate(column[index])]
+
+    def filter(self, sender=None, subject=None, text=None, since=None, until=None,
+               min_size=None, max_size=None, indices=None):
+        """
+        Returns the row indices matching all given conditions.
+
+        Substring conditions are evaluated once per unique string, not once per email.
+
+        Args:
+        - sender (str, optional): Text the From header must contain, ignoring case.
+        - subject (str, optional): Text the Subject header must contain, ignoring case.
+        - text (str, optional): Text the From or Subject header must contain, ignoring case.
+        - since (float, optional): The earliest internal date as a Unix timestamp.
+        - until (float, optional): The latest internal date as a Unix timestamp.
+        - min_size (int, optional): The minimum size in bytes.
+        - max_size (int, optional): The maximum size in bytes.
+        - indices (iterable of int, optional): Row indices to filter instead of all rows.
+
+        Returns:
+        - array: The matching row indices.
+        """
+        with self.lock:
+            rows = list(indices) if indices is not None else None
+            if sender is not None:
+                rows = self._select(rows, self.sender_ids, self._matching_strings(sender).__contains__)
+            if subject is not None:
+                rows = self._select(rows, self.subject_ids, self._matching_strings(subject).__contains__)
+            if text is not None:
+                text_ids = self._matching_strings(text)
+                senders, subjects = self.sender_ids, self.subject_ids
+                rows = [index for index in (rows if rows is not None else range(len(self.uids)))
+                        if senders[index] in text_ids or subjects[index] in text_ids]
+            if since is not None:
+                rows = self._select(rows, self.dates, lambda value: value >= since)
+            if until is not None:
+                rows = self._select(rows, self.dates, lambda value: value <= until)
+            if min_size is not None:
+                rows = self._select(rows, self.sizes, lambda value: value >= min_size)
+            if max_size is not None:
+                rows = self._select(rows, self.sizes, lambda value: value <= max_size)
+            return array('I', rows if rows is not None else range(len(self.uids)))
+
+    def sort(self, indices=None, key='date', reverse=False):
+        """
+        Returns row indices sorted by a column.
+
+        Args:
+        - indices (iterable of int, optional): Row indices to sort instead of all rows.
+        - key (str): 'uid', 'date', 'size', 'sender' or 'subject'.
+        - reverse (bool): Whether to sort in descending order.
+
+        Returns:
+        - array: The sorted row indices.
+        """
+        with self.lock:
+            if indices is None:
+                indices = range(len(self.uids))
+            return array('I', sorted(indices, key=self._sort_column(key).__getitem__, reverse=reverse))
+
+    def _sort_column(self, key):
+        """
+        Returns the values rows are sorted by.
+
+        Args:
+        - key (str): 'uid', 'date', 'size', 'sender' or 'subject'.
+
+        Returns:
+        - sequence: The sort value of every row.
+        """
+        if key in ('sender', 'subject'):
+            # The unique strings are ranked once, rows are sorted by the rank of their string.
+            ranks = self.strings.ranks()
+            ids = self.sender_ids if key == 'sender' else self.subject_ids
+            return array('I', map(ranks.__getitem__, ids))
+        return {'uid': self.uids, 'date': self.dates, 'size': self.sizes}[key]
+
+    def page(self, offset=0, limit=20, key='uid', reverse=False, indices=None):
+        """
+        Returns a page of envelopes.
+
+        Args:
+        - offset (int): The number of envelopes to skip.
+        - limit (int): The maximum number of envelopes to return.
+        - key (str): The sort column, see sort.
+        - reverse (bool): Whether to sort in descending order.
+        - indices (iterable of int, optional): Row indices to page through instead of all rows.
+
+        Returns:
+        - list of Envelope: The envelopes on the page.
+        """
+        with self.lock:
+            if key == 'uid' and indices is None:
+                count = len(self.uids)
+                rows = range(count - 1 - offset, max(count - 1 - offset - limit, -1), -1) if reverse \
+                    else range(offset, min(offset + limit, count))
+            else:
+                select = heapq.nlargest if reverse else heapq.nsmallest
+                rows = indices if indices is not None else range(len(self.uids))
+                rows = select(offset + limit, rows, key=self._sort_column(key).__getitem__)[offset:]
+            return [self[index] for index in rows]
+
+    def nbytes(self):
+        """
+        Returns the approximate memory used by the store in bytes.
+
+        Returns:
+        - int: The size of the columns and the string pool.
+        """
+        with self.lock:
+            columns = sum(getattr(self, column).itemsize * len(getattr(self, column)) for column in self.COLUMNS)
+            return columns + self.strings.nbytes()
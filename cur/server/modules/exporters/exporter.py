@@ -0,0 +1,412 @@
+import gzip
+import imaplib
+import json
+import os
+import re
+import socket
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from cur.server.modules.organizers.sharded_fetch import ShardedFetcher
+
+STATUS_PATTERN = re.compile(rb'(UIDVALIDITY|UIDNEXT) (\d+)')
+FROM_LINE_PATTERN = re.compile(rb'^(>*From )', re.MULTILINE)
+
+
+def check_archive(path, state_path, offset=0):
+    """
+    Checks that an archive can be written without destroying data that is already there.
+
+    An archive is only started where no file or non-empty directory exists yet, and only
+    resumed if it still holds everything its state file records.
+
+    Args:
+    - path (str): The path of the mbox file or Maildir directory.
+    - state_path (str): The path of the checkpoint or state file kept next to the archive.
+    - offset (int): The archive size recorded in the state file, 0 for a new archive.
+
+    Raises:
+    - FileExistsError: If the archive exists but has no state file.
+    - ValueError: If the archive is shorter than the recorded offset.
+    """
+    if not os.path.exists(state_path):
+        if os.path.isdir(path) and os.listdir(path) or os.path.isfile(path) and os.path.getsize(path):
+            raise FileExistsError(f"{path} already exists and has no {os.path.basename(state_path)}, "
+                                  f"refusing to overwrite it.")
+        return
+    size = os.path.getsize(path) if os.path.isfile(path) else 0
+    if size < offset:
+        raise ValueError(f"{path} is shorter than recorded in {os.path.basename(state_path)}, "
+                         f"remove both to start over.")
+
+
+class MboxWriter:
+    """
+    Writes messages to an mbox file (mboxrd escaping), optionally compressed with gzip or zstd.
+
+    Every batch is written as a separate gzip member or zstd frame. Concatenated members
+    and frames form a valid compressed file, so an interrupted export can be resumed by
+    truncating the file to the end of the last completed batch and appending new batches.
+
+    Methods:
+    - __init__(self, path, compression=None): Initializes the writer.
+    - start_batch(self, offset): Truncates the file to 'offset' and opens a new batch.
+    - write(self, uid, data, internal_date=None): Writes a message to the current batch.
+    - end_batch(self): Closes the current batch and returns the file size.
+    - abort(self): Discards the current batch and closes the file.
+    """
+
+    def __init__(self, path, compression=None):
+        """
+        Initializes a new MboxWriter instance.
+
+        Args:
+        - path (str): The path of the mbox file.
+        - compression (str, optional): 'gzip', 'zstd' or None for an uncompressed file.
+        """
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package.")
+        self.path = path
+        self.compression = compression
+        self._raw = None
+        self._stream = None
+        self._offset = 0
+
+    def start_batch(self, offset):
+        """
+        Truncates the file to 'offset' and opens a new batch.
+
+        Args:
+        - offset (int): The size of the file after the last completed batch.
+        """
+        self._raw = open(self.path, 'r+b' if os.path.exists(self.path) else 'wb')
+        self._offset = offset
+        self._raw.truncate(offset)
+        self._raw.seek(offset)
+        if self.compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        elif self.compression == 'zstd':
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, uid, data, internal_date=None):
+        """
+        Writes a message to the current batch.
+
+        Args:
+        - uid (int): The UID of the message.
+        - data (bytes): The raw message.
+        - internal_date (time.struct_time, optional): The date used in the 'From ' separator line.
+        """
+        date = time.asctime(internal_date or time.gmtime())
+        self._stream.write(f"From MAILER-DAEMON {date}\n".encode('ascii'))
+        data = FROM_LINE_PATTERN.sub(rb'>\1', data.replace(b'\r\n', b'\n'))
+        self._stream.write(data)
+        self._stream.write(b'\n' if data.endswith(b'\n') else b'\n\n')
+
+    def end_batch(self):
+        """
+        Closes the current batch and returns the file size.
+
+        Returns:
+        - int: The size of the file after this batch.
+        """
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        offset = self._raw.tell()
+        self._raw.close()
+        self._raw = self._stream = None
+        return offset
+
+    def abort(self):
+        """
+        Discards the current batch and closes the file.
+        """
+        if self._raw is not None:
+            self._raw.truncate(self._offset)
+            self._raw.close()
+            self._raw = self._stream = None
+
+
+class MaildirWriter:
+    """
+    Writes messages to a Maildir directory.
+
+    File names are derived from UIDVALIDITY and UID, so writing a message again after a
+    resumed export replaces the earlier copy instead of duplicating it.
+
+    Methods:
+    - __init__(self, path, uid_validity): Initializes the writer and creates the Maildir directories.
+    - start_batch(self, offset): Opens a new batch.
+    - write(self, uid, data, internal_date=None): Writes a message to the Maildir.
+    - end_batch(self): Closes the current batch.
+    - abort(self): Discards the current batch.
+    """
+
+    def __init__(self, path, uid_validity):
+        """
+        Initializes a new MaildirWriter instance and creates the Maildir directories.
+
+        Args:
+        - path (str): The path of the Maildir directory.
+        - uid_validity (int): The UIDVALIDITY of the exported folder.
+        """
+        self.path = path
+        self.uid_validity = uid_validity
+        self.host = socket.gethostname().replace('/', r'\057').replace(':', r'\072')
+        for subdir in ('tmp', 'new', 'cur'):
+            os.makedirs(os.path.join(path, subdir), exist_ok=True)
+
+    def start_batch(self, offset):
+        """
+        Opens a new batch. Maildir messages are independent files, so there is nothing to prepare.
+
+        Args:
+        - offset (int): Ignored.
+        """
+
+    def write(self, uid, data, internal_date=None):
+        """
+        Writes a message to the Maildir.
+
+        Args:
+        - uid (int): The UID of the message.
+        - data (bytes): The raw message.
+        - internal_date (time.struct_time, optional): Used as the modification time of the file.
+        """
+        name = f"{self.uid_validity}.{uid}.{self.host}"
+        tmp_path = os.path.join(self.path, 'tmp', name)
+        with open(tmp_path, 'wb') as message_file:
+            message_file.write(data.replace(b'\r\n', b'\n'))
+        if internal_date:
+            timestamp = time.mktime(internal_date)
+            os.utime(tmp_path, (timestamp, timestamp))
+        os.replace(tmp_path, os.path.join(self.path, 'new', name))
+
+    def end_batch(self):
+        """
+        Closes the current batch.
+
+        Returns:
+        - int: Always 0, Maildir exports do not track a file offset.
+        """
+        return 0
+
+    def abort(self):
+        """
+        Discards the current batch. Messages already written are kept, as rewriting them is harmless.
+        """
+
+
+class MailboxExporter:
+    """
+    Exports a mailbox folder to a compressed mbox file or a Maildir, streaming messages in UID batches.
+
+    The exporter records the last exported UID in a checkpoint file next to the output
+    after every batch, so an interrupted export resumes where it stopped.
+
+    Attributes:
+    - manager (MailManager): The mail manager used to connect to the IMAP server.
+    - folder (str): The name of the exported folder.
+    - path (str): The path of the output file or Maildir directory.
+    - format (str): 'mbox' or 'maildir'.
+    - compression (str): 'gzip', 'zstd' or None.
+    - batch_size (int): The number of messages fetched and written per batch.
+    - connections (int): The number of parallel IMAP connections used for fetching.
+    - checkpoint_path (str): The path of the checkpoint file.
+    - overwrite (bool): Whether an existing output without a checkpoint is replaced instead of refused.
+
+    Methods:
+    - __init__(self, manager, folder, path, batch_size=200, connections=1, overwrite=False): Initializes the exporter.
+    - detect_format(path): Returns the output format and compression for a path.
+    - load_checkpoint(self): Loads the checkpoint of a previous export.
+    - save_checkpoint(self, checkpoint): Atomically saves the checkpoint.
+    - export(self): Exports the folder and returns the export statistics.
+    """
+
+    CHECKPOINT_SUFFIX = '.checkpoint'
+
+    def __init__(self, manager, folder, path, batch_size=200, connections=1, overwrite=False):
+        """
+        Initializes a new MailboxExporter instance.
+
+        Args:
+        - manager (MailManager): The mail manager used to connect to the IMAP server.
+        - folder (str): The name of the folder to export.
+        - path (str): The output path. '.mbox', '.mbox.gz' and '.mbox.zst' paths produce mbox files,
+          any other path a Maildir directory.
+        - batch_size (int): The number of messages fetched and written per batch.
+        - connections (int): The number of parallel IMAP connections used for fetching.
+        - overwrite (bool): Whether an existing output without a checkpoint is replaced instead of refused.
+        """
+        self.manager = manager
+        self.folder = folder
+        self.path = path
+        self.format, self.compression = self.detect_format(path)
+        self.batch_size = batch_size
+        self.connections = connections
+        self.checkpoint_path = path.rstrip(os.sep) + self.CHECKPOINT_SUFFIX
+        self.overwrite = overwrite
+
+    @staticmethod
+    def detect_format(path):
+        """
+        Returns the output format and compression for a path.
+
+        Args:
+        - path (str): The output path.
+
+        Returns:
+        - tuple: (format, compression), e.g. ('mbox', 'gzip') or ('maildir', None).
+        """
+        if path.endswith('.gz'):
+            return 'mbox', 'gzip'
+        if path.endswith('.zst'):
+            return 'mbox', 'zstd'
+        if path.endswith('.mbox'):
+            return 'mbox', None
+        return 'maildir', None
+
+    def load_checkpoint(self):
+        """
+        Loads the checkpoint of a previous export.
+
+        Returns:
+        - dict or None: The checkpoint, or None if the export starts from scratch.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def save_checkpoint(self, checkpoint):
+        """
+        Atomically saves the checkpoint.
+
+        Args:
+        - checkpoint (dict): The checkpoint to save.
+        """
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _folder_status(self):
+        """
+        Returns the UIDVALIDITY and UIDNEXT of the exported folder.
+
+        Returns:
+        - tuple: (uid_validity, uid_next).
+        """
+        with self.manager.open_imap_session() as server:
+            typ, data = server.status(self.folder, '(UIDVALIDITY UIDNEXT)')
+            if typ != 'OK':
+                raise RuntimeError(f"STATUS failed for '{self.folder}': {data}")
+        status = {key.decode('ascii'): int(value) for key, value in STATUS_PATTERN.findall(data[0])}
+        return status['UIDVALIDITY'], status['UIDNEXT']
+
+    def export(self):
+        """
+        Exports the folder and returns the export statistics.
+
+        Returns:
+        - dict: The number of messages and bytes exported in this run, the elapsed time,
+          and the throughput in messages/s and MB/s.
+
+        Raises:
+        - FileExistsError: If the output exists without a checkpoint and overwrite is off.
+        - ValueError: If the output is shorter than recorded in the checkpoint.
+        """
+        checkpoint = self.load_checkpoint()
+        if checkpoint or not self.overwrite:
+            check_archive(self.path, self.checkpoint_path, checkpoint['offset'] if checkpoint else 0)
+        uid_validity, uid_next = self._folder_status()
+        if checkpoint and checkpoint['uid_validity'] != uid_validity:
+            raise RuntimeError(f"UIDVALIDITY of '{self.folder}' changed, remove {self.checkpoint_path} "
+                               f"and the partial export to start over.")
+        if not checkpoint:
+            checkpoint = {'uid_validity': uid_validity, 'last_uid': 0, 'offset': 0, 'messages': 0}
+        if checkpoint['last_uid']:
+            print(f"Відновлення експорту '{self.folder}' після UID {checkpoint['last_uid']}...")
+
+        if self.format == 'mbox':
+            writer = MboxWriter(self.path, self.compression)
+        else:
+            writer = MaildirWriter(self.path, uid_validity)
+
+        stats = {'messages': 0, 'bytes': 0}
+        start_time = time.time()
+        uids = []
+        if checkpoint['last_uid'] + 1 < uid_next:
+            uids = self._pending_uids(checkpoint['last_uid'])
+        records = self.manager.fetch_parallel(self.folder, '(INTERNALDATE BODY.PEEK[])', self.connections,
+                                              ordered=True, chunk_size=self.batch_size, uids=uids)
+
+        batch_count = 0
+        writer.start_batch(checkpoint['offset'])
+        try:
+            for uid, meta, data in records:
+                writer.write(uid, data or b'', imaplib.Internaldate2tuple(meta))
+                checkpoint['last_uid'] = uid
+                stats['messages'] += 1
+                stats['bytes'] += len(data or b'')
+                batch_count += 1
+                if batch_count == self.batch_size:
+                    self._complete_batch(writer, checkpoint, batch_count, stats, start_time)
+                    batch_count = 0
+                    writer.start_batch(checkpoint['offset'])
+            self._complete_batch(writer, checkpoint, batch_count, stats, start_time)
+        except BaseException:
+            # The unfinished batch is discarded on resume, the checkpoint still points before it.
+            writer.abort()
+            raise
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        stats['seconds'] = elapsed
+        stats['messages_per_second'] = stats['messages'] / elapsed
+        stats['mb_per_second'] = stats['bytes'] / elapsed / 1_000_000
+        print(f"Експорт '{self.folder}' завершено: {stats['messages']} листів, "
+              f"{stats['mb_per_second']:.2f} MB/s, {stats['messages_per_second']:.1f} листів/с")
+        return stats
+
+    def _pending_uids(self, last_uid):
+        """
+        Returns the UIDs that have not been exported yet.
+
+        Args:
+        - last_uid (int): The last exported UID.
+
+        Returns:
+        - list of int: The sorted UIDs above 'last_uid'.
+        """
+        uids = ShardedFetcher(self.manager, self.folder).search_uids(f'UID {last_uid + 1}:*')
+        # "n:*" always matches the last message, even if its UID is below n.
+        return [uid for uid in uids if uid > last_uid]
+
+    def _complete_batch(self, writer, checkpoint, batch_count, stats, start_time):
+        """
+        Closes the current batch, saves the checkpoint and reports the throughput.
+
+        Args:
+        - writer (MboxWriter or MaildirWriter): The output writer.
+        - checkpoint (dict): The checkpoint to update.
+        - batch_count (int): The number of messages written in this batch.
+        - stats (dict): The statistics of this run.
+        - start_time (float): The time the export started.
+        """
+        if not batch_count:
+            writer.abort()
+            return
+        checkpoint['offset'] = writer.end_batch()
+        checkpoint['messages'] += batch_count
+        self.save_checkpoint(checkpoint)
+        elapsed = max(time.time() - start_time, 1e-9)
+        print(f"Експортовано {checkpoint['messages']} листів (UID {checkpoint['last_uid']}), "
+              f"{stats['bytes'] / elapsed / 1_000_000:.2f} MB/s, {stats['messages'] / elapsed:.1f} листів/с")
@@ -0,0 +1,277 @@
+import imaplib
+import select
+import time
+
+from cur.common.compression import CompressionStats, create_codec
+from cur.server.modules.connections.connection import address_cache, shared_tls_context
+
+CRLF = b'\r\n'
+
+
+class IMAPSession(imaplib.IMAP4_SSL):
+    """
+    An IMAP4 over SSL connection with its own read buffer, IDLE (RFC 2177) and
+    COMPRESS=DEFLATE (RFC 4978) support.
+
+    Connections use the shared address cache and, unless another ssl_context is given, the
+    shared TLS context, so repeated sessions skip DNS resolution and resume the TLS session.
+
+    imaplib reads through a buffered socket file, which cannot be polled with a timeout.
+    This class keeps the received bytes in its own buffer so that a caller can wait for
+    unsolicited server responses without blocking forever, and so that the stream can be
+    decompressed after COMPRESS DEFLATE is negotiated.
+
+    Attributes:
+    - compression_stats (CompressionStats): Counters updated while compression is active, or None.
+
+    Methods:
+    - login(self, user, password): Logs in, remembers the TLS session and refreshes the capabilities.
+    - refresh_capabilities(self): Replaces the capabilities announced before login with the ones valid after it.
+    - send(self, data): Sends data to the server, compressing it if compression is active.
+    - read(self, size): Reads 'size' bytes from the server.
+    - readline(self): Reads a line from the server.
+    - wait_for_data(self, timeout): Waits until a complete line is available.
+    - supports(self, capability): Checks whether the server advertises a capability.
+    - enable_compression(self, stats=None): Negotiates COMPRESS=DEFLATE if the server supports it.
+    - idle_start(self): Sends the IDLE command and waits for the continuation response.
+    - idle_wait(self, timeout): Waits for unsolicited responses while idling.
+    - idle_done(self): Terminates the IDLE command.
+    - pop_exists(self): Returns and clears the latest EXISTS count reported by the server.
+    """
+
+    def __init__(self, host='', port=imaplib.IMAP4_SSL_PORT, **kwargs):
+        """
+        Initializes a new IMAPSession and connects to the server.
+
+        Args:
+        - host (str): The IMAP server address.
+        - port (int): The IMAP server port number.
+        - **kwargs: Keyword arguments passed to imaplib.IMAP4_SSL.
+        """
+        kwargs.setdefault('ssl_context', shared_tls_context())
+        self._read_buffer = bytearray()
+        self._idle_tag = None
+        self._compress = None
+        self._decompressor = None
+        self.compression_stats = None
+        super().__init__(host, port, **kwargs)
+
+    def _create_socket(self, timeout):
+        sock = address_cache.create_connection((self.host, self.port), timeout)
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+
+    def login(self, user, password):
+        """
+        Logs in, remembers the TLS session for the next connection and refreshes the capabilities.
+
+        Args:
+        - user (str): The user name.
+        - password (str): The password.
+
+        Returns:
+        - tuple: The response of the LOGIN command.
+        """
+        response = super().login(user, password)
+        remember = getattr(self.ssl_context, 'remember', None)
+        if remember is not None:
+            remember(self.sock)
+        self.refresh_capabilities()
+        return response
+
+    def refresh_capabilities(self):
+        """
+        Replaces the capabilities announced before login with the ones valid after it.
+
+        Servers often advertise IDLE, UIDPLUS or COMPRESS only to authenticated clients. The
+        list is taken from the CAPABILITY response code of the LOGIN response if the server
+        sent one, otherwise it is requested with the CAPABILITY command.
+        """
+        capabilities = self.untagged_responses.pop('CAPABILITY', None)
+        if not capabilities:
+            typ, capabilities = self.capability()
+            if typ != 'OK':
+                return
+        if capabilities and capabilities[-1]:
+            self.capabilities = tuple(capabilities[-1].decode('ascii').upper().split())
+
+    def _fill_buffer(self, timeout=None):
+        """
+        Receives more data from the socket into the read buffer.
+
+        Args:
+        - timeout (float, optional): Maximum number of seconds to wait, None to block.
+
+        Returns:
+        - bool: True if data was received, False if the timeout expired.
+        """
+        pending = getattr(self.sock, 'pending', None)
+        if timeout is not None and not (pending and pending()):
+            ready, _, _ = select.select([self.sock], [], [], timeout)
+            if not ready:
+                return False
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise self.abort('socket error: EOF')
+        if self._decompressor is not None:
+            start = time.thread_time()
+            compressed, chunk = chunk, self._decompressor.decompress(chunk)
+            self.compression_stats.record_in(len(compressed), len(chunk), time.thread_time() - start)
+        self._read_buffer += chunk
+        return True
+
+    def send(self, data):
+        """
+        Sends data to the server, compressing it if compression is active.
+
+        Args:
+        - data (bytes): The data to send.
+        """
+        if self._compress is not None:
+            start = time.thread_time()
+            raw, data = data, self._compress(data)
+            self.compression_stats.record_out(len(raw), len(data), time.thread_time() - start)
+        self.sock.sendall(data)
+
+    def read(self, size):
+        """
+        Reads 'size' bytes from the server.
+
+        Args:
+        - size (int): The number of bytes to read.
+
+        Returns:
+        - bytes: The data read.
+        """
+        while len(self._read_buffer) < size:
+            self._fill_buffer()
+        data = bytes(self._read_buffer[:size])
+        del self._read_buffer[:size]
+        return data
+
+    def readline(self):
+        """
+        Reads a line from the server.
+
+        Returns:
+        - bytes: The line read, including the line terminator.
+        """
+        while True:
+            end = self._read_buffer.find(b'\n')
+            if end != -1:
+                break
+            if len(self._read_buffer) > imaplib._MAXLINE:
+                raise self.error("got more than %d bytes" % imaplib._MAXLINE)
+            self._fill_buffer()
+        return self.read(end + 1)
+
+    def wait_for_data(self, timeout):
+        """
+        Waits until a complete line is available in the read buffer.
+
+        Args:
+        - timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+        - bool: True if a line can be read without blocking.
+        """
+        if b'\n' in self._read_buffer:
+            return True
+        while self._fill_buffer(timeout):
+            if b'\n' in self._read_buffer:
+                return True
+        return False
+
+    def supports(self, capability):
+        """
+        Checks whether the server advertises a capability.
+
+        Args:
+        - capability (str): The capability name, e.g. 'IDLE'.
+
+        Returns:
+        - bool: True if the capability is advertised.
+        """
+        return capability.upper() in self.capabilities
+
+    def enable_compression(self, stats=None):
+        """
+        Negotiates COMPRESS=DEFLATE if the server supports it.
+
+        Args:
+        - stats (CompressionStats, optional): Counters to update, shared between sessions.
+
+        Returns:
+        - bool: True if compression is active.
+        """
+        if self._compress is not None:
+            return True
+        if not self.supports('COMPRESS=DEFLATE'):
+            return False
+        tag = self._new_tag()
+        self.tagged_commands[tag] = None
+        self.send(tag + b' COMPRESS DEFLATE' + CRLF)
+        typ, _ = self._get_tagged_response(tag)
+        if typ != 'OK':
+            return False
+        self._compress, self._decompressor = create_codec('deflate')
+        self.compression_stats = stats if stats is not None else CompressionStats()
+        if self._read_buffer:
+            # Data read together with the tagged response is already compressed.
+            compressed, self._read_buffer = bytes(self._read_buffer), bytearray()
+            start = time.thread_time()
+            self._read_buffer += self._decompressor.decompress(compressed)
+            self.compression_stats.record_in(len(compressed), len(self._read_buffer), time.thread_time() - start)
+        return True
+
+    def idle_start(self):
+        """
+        Sends the IDLE command and waits for the continuation response.
+        """
+        tag = self._new_tag()
+        self.tagged_commands[tag] = None
+        self.send(tag + b' IDLE' + CRLF)
+        while self._get_response() is not None:
+            result = self.tagged_commands[tag]
+            if result is not None:
+                del self.tagged_commands[tag]
+                raise self.error(f"IDLE command error: {result[0]} {result[1]}")
+        self._idle_tag = tag
+
+    def idle_wait(self, timeout):
+        """
+        Waits for unsolicited responses while idling and stores them as untagged responses.
+
+        Args:
+        - timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+        - bool: True if at least one response was received.
+        """
+        if not self.wait_for_data(timeout):
+            return False
+        while b'\n' in self._read_buffer:
+            self._get_response()
+        return True
+
+    def idle_done(self):
+        """
+        Terminates the IDLE command.
+
+        Returns:
+        - tuple: The tagged response of the IDLE command.
+        """
+        tag, self._idle_tag = self._idle_tag, None
+        self.send(b'DONE' + CRLF)
+        return self._get_tagged_response(tag)
+
+    def pop_exists(self):
+        """
+        Returns and clears the latest EXISTS count reported by the server.
+
+        Returns:
+        - int or None: The number of messages in the mailbox, or None if not reported.
+        """
+        exists = self.untagged_responses.pop('EXISTS', None)
+        if not exists:
+            return None
+        return int(exists[-1])
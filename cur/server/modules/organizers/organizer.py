@@ -1,7 +1,17 @@
 import email
 import imaplib
+import threading
+from cur.common.compression import CompressionStats
 from cur.server.modules.decorators.decorator import track_execution_time
 from cur.server.modules.emailClients.email_client import EmailClient
+from cur.server.modules.envelopes.envelope import ENVELOPE_FETCH_ITEMS, EnvelopeStore, parse_header_fields
+from cur.server.modules.exporters.exporter import MailboxExporter
+from cur.server.modules.organizers.imap_session import IMAPSession
+from cur.server.modules.organizers.pop3_downloader import Pop3Downloader
+from cur.server.modules.organizers.sharded_fetch import ShardedFetcher, format_uid_sets
+from cur.server.modules.organizers.watcher import MailboxWatcher
+
+SUBJECT_FETCH_ITEMS = '(BODY.PEEK[HEADER.FIELDS (SUBJECT)])'
 
 
 class MailManager(EmailClient):
@@ -10,12 +20,96 @@ class MailManager(EmailClient):
 
     Inherits from EmailClient.
 
+    Attributes:
+    - CLASSIFICATION_RULES (tuple): Pairs of subject keyword and target folder, checked in order.
+    - watcher (MailboxWatcher): The background watcher of the inbox, if started.
+    - envelope_stores (dict): Folder names mapped to their EnvelopeStore, filled on demand; each store carries its own lock.
+    - imap_compression (bool): Whether IMAP sessions negotiate COMPRESS=DEFLATE when available.
+    - imap_compression_stats (CompressionStats): Compression counters of all IMAP sessions.
+
     Methods:
+    - __init__(self, provider, user_email, user_password): Initializes the mail manager.
+    - open_imap_session(self): Returns a logged in IMAP session, preferring a warm one.
+    - warm_up_targets(self): Returns the sessions warmed up by warm_up: SMTP and IMAP.
     - connect_to_server(self): Connects to the IMAP server for reading emails.
-    - read_emails(self): Reads and displays emails from the inbox.
-    - classify_and_move_emails(self): Classifies and moves emails to specific folders.
+    - load_envelopes(self, folder='inbox', connections=1, progress=None): Synchronizes and returns the envelope store of a folder.
+    - read_emails(self, offset=0, limit=5): Reads and displays a page of emails from the inbox.
+    - search_emails(self, query, folder='inbox', limit=20): Searches envelopes by sender or subject.
+    - classify_subject(subject): Returns the folder an email with the given subject belongs to.
+    - classify_and_move_emails(self, connections=1): Classifies and moves emails to specific folders.
+    - classify_uids(self, server, uids): Classifies and moves the emails with the given UIDs.
+    - move_classified(self, server, records): Moves fetched emails to the folders chosen by their subjects.
+    - fetch_parallel(self, folder='inbox', items='(BODY.PEEK[])', connections=4, ordered=False, progress=None, chunk_size=500, uids=None): Fetches messages over several IMAP connections in parallel.
+    - export_mailbox(self, folder, path, connections=1): Exports a folder to an mbox file or a Maildir.
+    - download_pop3(self, path, delete=False): Downloads new emails over POP3 into an archive.
+    - start_watching(self, folder='inbox', idle_refresh=25 * 60, poll_interval=30): Starts classifying new emails as they arrive.
+    - stop_watching(self): Stops the background watcher.
     - create_folder_if_not_exists(self, server, folder_name): Creates a folder on the server if it doesn't exist.
     """
+
+    CLASSIFICATION_RULES = (
+        ('important', 'Important'),
+        ('work', 'Work'),
+    )
+
+    def __init__(self, provider, user_email, user_password):
+        """
+        Initializes the mail manager with provider and user credentials.
+
+        Args:
+        - provider: The email service provider configuration.
+        - user_email (str): The user's email address.
+        - user_password (str): The user's email account password.
+        """
+        super().__init__(provider, user_email, user_password)
+        self.watcher = None
+        self.envelope_stores = {}
+        self._envelope_stores_lock = threading.Lock()
+        self.imap_compression = True
+        self.imap_compression_stats = CompressionStats()
+
+    def _connect_imap(self):
+        """
+        Opens and logs in a new IMAP session, negotiating compression if enabled.
+
+        Returns:
+        - IMAPSession: The logged in IMAP connection.
+        """
+        server = IMAPSession(self.provider.imap_server)
+        try:
+            server.login(self.user_email, self.user_password)
+            if self.imap_compression:
+                server.enable_compression(self.imap_compression_stats)
+        except Exception:
+            server.shutdown()
+            raise
+        return server
+
+    def open_imap_session(self):
+        """
+        Returns a logged in IMAP session, taking the warm session if one is available.
+
+        Returns:
+        - IMAPSession: The logged in IMAP connection. It can be used as a context manager.
+        """
+        if self.warmer is not None:
+            server = self.warmer.take('imap')
+            if server is not None:
+                return server
+        return self._connect_imap()
+
+    def warm_up_targets(self):
+        """
+        Returns the sessions warmed up by warm_up: SMTP and IMAP.
+
+        Returns:
+        - dict: Target names mapped to ((host, port), open, close) tuples, see ConnectionWarmer.
+        """
+        targets = super().warm_up_targets()
+        targets['imap'] = ((self.provider.imap_server, imaplib.IMAP4_SSL_PORT), self._connect_imap,
+                           lambda server: server.logout())
+        return targets
+
     @track_execution_time
     def connect_to_server(self):
         """
@@ -24,35 +118,80 @@ class MailManager(EmailClient):
         try:
             print("Підключення до IMAP серверу...")
 
-            with imaplib.IMAP4_SSL(self.provider.imap_server) as server:
-                server.login(self.user_email, self.user_password)
+            with self.open_imap_session() as server:
                 server.select('inbox')
         except Exception as e:
             print(f"Помилка підключення до IMAP серверу: {e}")
 
-    def read_emails(self):
+    def load_envelopes(self, folder='inbox', connections=1, progress=None):
         """
-        Reads and displays emails from the inbox.
+        Synchronizes the envelope store of a folder with the server and returns it.
+
+        Only emails with UIDs above the last stored one are fetched; envelopes of emails that
+        are no longer in the folder are dropped. The store is cleared if UIDVALIDITY changed.
+
+        Args:
+        - folder (str): The name of the folder.
+        - connections (int): The number of IMAP connections used to fetch new envelopes.
+        - progress (callable, optional): Called with (shard, fetched, total), see fetch_parallel.
+
+        Returns:
+        - EnvelopeStore: The envelopes of the folder in UID order.
+        """
+        with self._envelope_stores_lock:
+            store = self.envelope_stores.setdefault(folder, EnvelopeStore())
+
+        # Holding the store lock over the whole synchronization keeps concurrent callers
+        # from fetching the same new UIDs twice.
+        with store.lock:
+            with self.open_imap_session() as server:
+                server.select(folder, readonly=True)
+                _, data = server.response('UIDVALIDITY')
+                uid_validity = int(data[0]) if data and data[0] else None
+                typ, data = server.uid('search', None, 'ALL')
+                if typ != 'OK':
+                    raise imaplib.IMAP4.error(f"UID SEARCH failed in '{folder}'.")
+            uids = sorted(int(uid) for uid in b' '.join(data).split())
+
+            if store.uid_validity != uid_validity:
+                store.clear(uid_validity)
+            store.retain(uids)
+            last_uid = store.uids[-1] if len(store) else 0
+            new_uids = [uid for uid in uids if uid > last_uid]
+            if new_uids:
+                for record in self.fetch_parallel(folder, ENVELOPE_FETCH_ITEMS, connections, ordered=True,
+                                                  progress=progress, uids=new_uids):
+                    store.add_fetch_record(*record)
+        return store
+
+    def read_emails(self, offset=0, limit=5):
+        """
+        Reads and displays a page of emails from the inbox.
+
+        The page is chosen from the envelope store, so only the displayed emails are downloaded.
+
+        Args:
+        - offset (int): The number of emails to skip.
+        - limit (int): The maximum number of emails to display.
         """
         print("Підключення до IMAP серверу...")
 
         try:
+            page = self.load_envelopes('inbox').page(offset, limit)
+            if not page:
+                print("Не удалось найти сообщения.")
+                return
 
-            with imaplib.IMAP4_SSL(self.provider.imap_server) as server:
-                server.login(self.user_email, self.user_password)
-                server.select('inbox')
+            with self.open_imap_session() as server:
+                server.select('inbox', readonly=True)
 
-                typ, messages = server.search(None, 'ALL')
+                typ, data = server.uid('fetch', ','.join(str(envelope.uid) for envelope in page), '(RFC822)')
                 if typ != 'OK':
                     print("Не удалось найти сообщения.")
                     return
 
-                for num in messages[0].split()[:5]:
-                    typ, data = server.fetch(num, '(RFC822)')
-                    if typ != 'OK':
-                        continue
-
-                    msg = email.message_from_bytes(data[0][1])
+                for _, _, literal in ShardedFetcher.parse_fetch_response(data):
+                    msg = email.message_from_bytes(literal or b'')
                     print(f"Письмо от: {msg['from']}")
                     print(f"Тема: {msg['subject']}")
                     print("Содержание:")
@@ -66,43 +205,244 @@ class MailManager(EmailClient):
         except Exception as e:
             print(f"Ошибка при чтении писем: {e}")
 
+    def search_emails(self, query, folder='inbox', limit=20):
+        """
+        Searches the envelope store for emails whose sender or subject contains 'query'.
+
+        Args:
+        - query (str): The text to look for, ignoring case.
+        - folder (str): The name of the folder to search.
+        - limit (int): The maximum number of results.
 
-    def classify_and_move_emails(self):
+        Returns:
+        - list of Envelope: The newest matching envelopes first.
+        """
+        store = self.load_envelopes(folder)
+        with store.lock:
+            return store.page(0, limit, key='date', reverse=True, indices=store.filter(text=query))
+
+    def classify_and_move_emails(self, connections=1):
         """
         Classifies and moves emails to specific folders.
+
+        Subjects are taken from the envelope store, so only the headers of new emails are
+        fetched and every distinct subject is classified once.
+
+        Args:
+        - connections (int): The number of IMAP connections used to fetch new envelopes.
         """
         print("Класифікація та переміщення листів...")
+
+        def report(shard, fetched, total):
+            print(f"Шард {shard}: отримано {fetched} з {total} заголовків")
+
         try:
-            with imaplib.IMAP4_SSL(self.provider.imap_server) as server:
-                server.login(self.user_email, self.user_password)
-                server.select('inbox')
-                typ, messages = server.search(None, 'ALL')
+            store = self.load_envelopes('inbox', connections, report if connections > 1 else None)
 
-                if typ != 'OK':
-                    print("No messages to classify.")
-                    return
+            folders, moves = {}, {}
+            with store.lock:
+                for uid, subject_id in zip(store.uids, store.subject_ids):
+                    if subject_id not in folders:
+                        folders[subject_id] = self.classify_subject(store.strings[subject_id])
+                    if folders[subject_id]:
+                        moves.setdefault(folders[subject_id], []).append(uid)
+
+            if moves:
+                with self.open_imap_session() as server:
+                    server.select('inbox')
+                    self._move_uids(server, moves)
+        except Exception as e:
+            print(f"Ошибка при классификации и перемещении писем: {e}")
+
+    @classmethod
+    def classify_subject(cls, subject):
+        """
+        Returns the folder an email with the given subject belongs to.
+
+        Args:
+        - subject (str): The subject of the email, may be None.
 
-                for num in messages[0].split():
-                    typ, data = server.fetch(num, '(RFC822)')
-                    if typ != 'OK':
-                        continue
+        Returns:
+        - str or None: The name of the target folder, or None if the email stays in place.
+        """
+        subject = (subject or '').lower()
+        for keyword, folder in cls.CLASSIFICATION_RULES:
+            if keyword in subject:
+                return folder
+        return None
+
+    def classify_uids(self, server, uids):
+        """
+        Classifies and moves the emails with the given UIDs.
+
+        Only the Subject header is fetched, so the emails are not marked as read.
 
-                    msg = email.message_from_bytes(data[0][1])
-                    subject = msg['subject'].lower()
+        Args:
+        - server: The IMAP server connection with the source folder selected.
+        - uids (list of bytes): The UIDs of the emails to classify.
+        """
+        print(f"Класифікація {len(uids)} нових листів...")
+        typ, data = server.uid('fetch', b','.join(uids), SUBJECT_FETCH_ITEMS)
+        if typ != 'OK':
+            return
+        self.move_classified(server, ShardedFetcher.parse_fetch_response(data))
 
+    def move_classified(self, server, records):
+        """
+        Moves fetched emails to the folders chosen by their subjects.
 
-                    if 'important' in subject:
-                        self.create_folder_if_not_exists(server, 'Important')
-                        server.copy(num.decode('utf-8'), 'Important')
-                        server.store(num, '+FLAGS', '\\Deleted')
-                    elif 'work' in subject:
-                        self.create_folder_if_not_exists(server, 'Work')
-                        server.copy(num.decode('utf-8'), 'Work')
-                        server.store(num, '+FLAGS', '\\Deleted')
+        Emails going to the same folder are copied and flagged together, in UID sets of up to 500.
 
+        Args:
+        - server: The IMAP server connection with the source folder selected.
+        - records (iterable of tuple): (uid, meta, header) records with the Subject header as data.
+        """
+        moves = {}
+        for uid, _, header in records:
+            folder = self.classify_subject(parse_header_fields(header).get('subject'))
+            if folder:
+                moves.setdefault(folder, []).append(str(uid))
+        self._move_uids(server, moves)
+
+    def _move_uids(self, server, moves):
+        """
+        Copies emails to their target folders and expunges them from the selected folder.
+
+        An email is flagged \\Deleted only after its COPY succeeded. If the server answers
+        COPY with TRYCREATE, the folder is created and the COPY retried once. With UIDPLUS
+        only the moved UIDs are expunged, otherwise the whole folder is.
+
+        Args:
+        - server: The IMAP server connection with the source folder selected.
+        - moves (dict): Target folder names mapped to lists of UIDs. Each folder's UIDs are
+          sent as compact sets of at most 500 UIDs, see format_uid_sets.
+        """
+        moved = []
+        for folder, uids in moves.items():
+            if not self.create_folder_if_not_exists(server, folder):
+                continue
+            for uid_set in format_uid_sets(uids):
+                typ, data = server.uid('copy', uid_set, folder)
+                if typ != 'OK' and self._response_has_code(data, b'TRYCREATE') \
+                        and server.create(folder)[0] == 'OK':
+                    typ, data = server.uid('copy', uid_set, folder)
+                if typ != 'OK':
+                    print(f"Не вдалося скопіювати листи до '{folder}': {data}")
+                    continue
+                typ, data = server.uid('store', uid_set, '+FLAGS', '\\Deleted')
+                if typ != 'OK':
+                    print(f"Не вдалося позначити листи для видалення: {data}")
+                    continue
+                moved.append(uid_set)
+
+        if moved:
+            if 'UIDPLUS' in server.capabilities:
+                for uid_set in moved:
+                    server.uid('expunge', uid_set)
+            else:
                 server.expunge()
+
+    @staticmethod
+    def _response_has_code(data, code):
+        """
+        Checks whether a tagged response carries a response code, e.g. [TRYCREATE].
+
+        Args:
+        - data (list): The data returned by imaplib for the command.
+        - code (bytes): The response code.
+
+        Returns:
+        - bool: True if the code is present.
+        """
+        return any(isinstance(item, bytes) and b'[' + code in item.upper() for item in data or ())
+
+    def fetch_parallel(self, folder='inbox', items='(BODY.PEEK[])', connections=4, ordered=False,
+                       progress=None, chunk_size=500, uids=None):
+        """
+        Fetches messages over several IMAP connections in parallel.
+
+        Args:
+        - folder (str): The name of the folder to fetch from.
+        - items (str): The FETCH data items.
+        - connections (int): The number of parallel connections, capped by the provider.
+        - ordered (bool): Whether messages are yielded in UID order.
+        - progress (callable, optional): Called with (shard, fetched, total) after every chunk.
+        - chunk_size (int): The number of UIDs fetched with a single UID FETCH command.
+        - uids (list of int, optional): The UIDs to fetch. All messages in the folder are fetched if omitted.
+
+        Returns:
+        - generator: Yields (uid, meta, literal) records, see ShardedFetcher.fetch.
+        """
+        fetcher = ShardedFetcher(self, folder, connections, chunk_size, ordered, progress)
+        return fetcher.fetch(items, uids)
+
+    def export_mailbox(self, folder, path, connections=1):
+        """
+        Exports a folder to a compressed mbox file or a Maildir, resuming an interrupted export.
+
+        Args:
+        - folder (str): The name of the folder to export.
+        - path (str): The output path, see MailboxExporter.
+        - connections (int): The number of parallel IMAP connections used for fetching.
+
+        Returns:
+        - dict or None: The export statistics, or None if the export failed.
+        """
+        print(f"Експорт папки '{folder}' у {path}...")
+        try:
+            return MailboxExporter(self, folder, path, connections=connections).export()
         except Exception as e:
-            print(f"Ошибка при классификации и перемещении писем: {e}")
+            print(f"Помилка експорту папки '{folder}': {e}")
+            return None
+
+    def download_pop3(self, path, delete=False):
+        """
+        Downloads new emails over POP3 into an mbox archive or a Maildir.
+
+        Args:
+        - path (str): The archive path, see MailboxExporter.
+        - delete (bool): Whether downloaded emails are deleted from the server.
+
+        Returns:
+        - dict or None: The download statistics, or None if the download failed.
+        """
+        print(f"Завантаження листів через POP3 у {path}...")
+        try:
+            return Pop3Downloader(self.provider, self.user_email, self.user_password, path, delete).download()
+        except Exception as e:
+            print(f"Помилка завантаження через POP3: {e}")
+            return None
+
+    def start_watching(self, folder='inbox', idle_refresh=25 * 60, poll_interval=30):
+        """
+        Starts classifying new emails as they arrive, using IMAP IDLE or NOOP polling.
+
+        Args:
+        - folder (str): The name of the folder to watch.
+        - idle_refresh (float): Number of seconds after which IDLE is re-issued.
+        - poll_interval (float): Number of seconds between NOOP polls when IDLE is unsupported.
+
+        Returns:
+        - bool: True if a new watcher was started, False if one is already running.
+        """
+        if self.watcher is not None and self.watcher.is_alive():
+            return False
+        self.watcher = MailboxWatcher(self, folder, idle_refresh, poll_interval)
+        self.watcher.start()
+        return True
+
+    def stop_watching(self):
+        """
+        Stops the background watcher.
+
+        Returns:
+        - bool: True if a running watcher was stopped.
+        """
+        if self.watcher is None:
+            return False
+        self.watcher.stop()
+        self.watcher = None
+        return True
 
     def create_folder_if_not_exists(self, server, folder_name):
         """
@@ -111,5 +451,16 @@ class MailManager(EmailClient):
         Args:
         - server: The IMAP server connection.
         - folder_name (str): The name of the folder to create.
+
+        Returns:
+        - bool: True if the folder exists or was created.
         """
-        print(f"Створення папки '{folder_name}', якщо вона не існує...")
\ No newline at end of file
+        print(f"Створення папки '{folder_name}', якщо вона не існує...")
+        typ, data = server.list('""', folder_name)
+        if typ == 'OK' and any(data):
+            return True
+        typ, data = server.create(folder_name)
+        if typ != 'OK':
+            print(f"Не вдалося створити папку '{folder_name}': {data}")
+            return False
+        return True
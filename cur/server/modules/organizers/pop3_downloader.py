@@ -0,0 +1,239 @@
+import os
+import poplib
+import time
+from collections import deque
+
+from cur.server.modules.connections.connection import shared_tls_context
+from cur.server.modules.exporters.exporter import MailboxExporter, MaildirWriter, MboxWriter, check_archive
+
+
+class Pop3Downloader:
+    """
+    Drains a POP3 mailbox into a local mbox archive or Maildir.
+
+    Messages whose UIDL is already recorded in the state file are skipped. When the server
+    advertises PIPELINING (RFC 2449), RETR and DELE commands are sent in groups of 'window'
+    without waiting for each response. Messages are deleted from the server only after the
+    batch containing them has been written and recorded in the state file.
+
+    The state file ('<path>.uidl') is append-only: after every batch it receives the UIDLs of
+    the batch followed by a '# offset <n>' line with the archive size after the batch.
+    An archive that exists without a state file, e.g. one written by 'export mailbox', is
+    never appended to or truncated.
+
+    Attributes:
+    - provider (MailServiceProvider): The email service provider configuration.
+    - user_email (str): The user's email address.
+    - user_password (str): The user's email account password.
+    - path (str): The archive path, see MailboxExporter.detect_format.
+    - delete (bool): Whether downloaded messages are deleted from the server.
+    - batch_size (int): The number of messages written between state file updates.
+    - window (int): The maximum number of pipelined commands in flight.
+    - state_path (str): The path of the state file.
+
+    Methods:
+    - __init__(self, provider, user_email, user_password, path, delete=False, batch_size=200, window=32): Initializes the downloader.
+    - open_session(self): Opens and authenticates a POP3 session.
+    - load_state(self): Loads the downloaded UIDLs and the archive offset.
+    - download(self): Downloads new messages and returns the download statistics.
+    """
+
+    STATE_SUFFIX = '.uidl'
+
+    def __init__(self, provider, user_email, user_password, path, delete=False, batch_size=200, window=32):
+        """
+        Initializes a new Pop3Downloader instance.
+
+        Args:
+        - provider (MailServiceProvider): The email service provider configuration.
+        - user_email (str): The user's email address.
+        - user_password (str): The user's email account password.
+        - path (str): The archive path, see MailboxExporter.detect_format.
+        - delete (bool): Whether downloaded messages are deleted from the server.
+        - batch_size (int): The number of messages written between state file updates.
+        - window (int): The maximum number of pipelined commands in flight.
+        """
+        self.provider = provider
+        self.user_email = user_email
+        self.user_password = user_password
+        self.path = path
+        self.delete = delete
+        self.batch_size = batch_size
+        self.window = window
+        self.state_path = path.rstrip(os.sep) + self.STATE_SUFFIX
+
+    def open_session(self):
+        """
+        Opens and authenticates a POP3 session.
+
+        Returns:
+        - poplib.POP3_SSL: The authenticated session.
+        """
+        session = poplib.POP3_SSL(self.provider.pop3_server, context=shared_tls_context())
+        try:
+            session.user(self.user_email)
+            session.pass_(self.user_password)
+        except Exception:
+            session.close()
+            raise
+        return session
+
+    def load_state(self):
+        """
+        Loads the downloaded UIDLs and the archive offset.
+
+        Returns:
+        - tuple: (set of downloaded UIDLs, archive size after the last recorded batch).
+        """
+        seen, offset = set(), 0
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='ascii') as state_file:
+                for line in state_file:
+                    line = line.rstrip('\n')
+                    if line.startswith('# offset '):
+                        offset = int(line[len('# offset '):])
+                    elif line:
+                        seen.add(line)
+        return seen, offset
+
+    def _record_batch(self, uidls, offset):
+        """
+        Appends the UIDLs of a written batch and the new archive offset to the state file.
+
+        Args:
+        - uidls (list of str): The UIDLs of the batch.
+        - offset (int): The archive size after the batch.
+        """
+        with open(self.state_path, 'a', encoding='ascii') as state_file:
+            state_file.write(''.join(f"{uidl}\n" for uidl in uidls) + f"# offset {offset}\n")
+            state_file.flush()
+            os.fsync(state_file.fileno())
+
+    @staticmethod
+    def _supports_pipelining(session):
+        """
+        Checks whether the server advertises PIPELINING.
+
+        Args:
+        - session (poplib.POP3): The authenticated session.
+
+        Returns:
+        - bool: True if commands may be pipelined.
+        """
+        try:
+            return 'PIPELINING' in session.capa()
+        except poplib.error_proto:
+            return False
+
+    def _pipeline(self, session, command, items, window, read_response):
+        """
+        Sends 'command' for every item, keeping up to 'window' commands in flight.
+
+        Args:
+        - session (poplib.POP3): The authenticated session.
+        - command (str): The command name, e.g. 'RETR'.
+        - items (iterable of tuple): Items whose first element is the message number.
+        - window (int): The maximum number of commands in flight.
+        - read_response (callable): Reads the response of one command.
+
+        Yields:
+        - tuple: (item, response) in the order the commands were sent.
+        """
+        items = iter(items)
+        in_flight = deque()
+        while True:
+            commands = []
+            while len(in_flight) + len(commands) < window:
+                item = next(items, None)
+                if item is None:
+                    break
+                commands.append(f"{command} {item[0]}\r\n".encode('ascii'))
+                in_flight.append(item)
+            if commands:
+                session.sock.sendall(b''.join(commands))
+            if not in_flight:
+                return
+            item = in_flight.popleft()
+            yield item, read_response()
+
+    def download(self):
+        """
+        Downloads new messages and returns the download statistics.
+
+        Returns:
+        - dict: The number of downloaded, skipped and deleted messages, the number of bytes,
+          the elapsed time, the throughput in messages/s and MB/s, and whether pipelining was used.
+
+        Raises:
+        - FileExistsError: If the archive exists without a state file.
+        - ValueError: If the archive is shorter than recorded in the state file.
+        """
+        seen, offset = self.load_state()
+        check_archive(self.path, self.state_path, offset)
+        file_format, compression = MailboxExporter.detect_format(self.path)
+        if file_format == 'mbox':
+            writer = MboxWriter(self.path, compression)
+        else:
+            writer = MaildirWriter(self.path, 'pop3')
+
+        stats = {'messages': 0, 'skipped': 0, 'deleted': 0, 'bytes': 0}
+        start_time = time.time()
+        session = self.open_session()
+        try:
+            pipelining = self._supports_pipelining(session)
+            window = self.window if pipelining else 1
+            stats['pipelining'] = pipelining
+
+            _, listing, _ = session.uidl()
+            messages, to_delete = [], []
+            for entry in listing:
+                number, uidl = entry.decode('ascii').split(' ', 1)
+                if uidl in seen:
+                    stats['skipped'] += 1
+                    to_delete.append((number, uidl))
+                else:
+                    messages.append((number, uidl))
+            if not self.delete:
+                to_delete = []
+
+            batch = []
+            writer.start_batch(offset)
+            try:
+                for (number, uidl), (_, lines, _) in self._pipeline(session, 'RETR', messages, window,
+                                                                     session._getlongresp):
+                    data = b'\r\n'.join(lines) + b'\r\n'
+                    writer.write(uidl.encode('ascii').hex(), data)
+                    batch.append((number, uidl))
+                    stats['messages'] += 1
+                    stats['bytes'] += len(data)
+                    if len(batch) == self.batch_size:
+                        offset = writer.end_batch()
+                        self._record_batch([uidl for _, uidl in batch], offset)
+                        to_delete.extend(batch if self.delete else [])
+                        batch = []
+                        writer.start_batch(offset)
+                if batch:
+                    offset = writer.end_batch()
+                    self._record_batch([uidl for _, uidl in batch], offset)
+                    to_delete.extend(batch if self.delete else [])
+                else:
+                    writer.abort()
+            except BaseException:
+                writer.abort()
+                raise
+
+            for _ in self._pipeline(session, 'DELE', to_delete, window, session._getresp):
+                stats['deleted'] += 1
+            session.quit()
+        except BaseException:
+            session.close()
+            raise
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        stats['seconds'] = elapsed
+        stats['messages_per_second'] = stats['messages'] / elapsed
+        stats['mb_per_second'] = stats['bytes'] / elapsed / 1_000_000
+        print(f"POP3: завантажено {stats['messages']} листів, пропущено {stats['skipped']}, "
+              f"{stats['mb_per_second']:.2f} MB/s, {stats['messages_per_second']:.1f} листів/с"
+              f"{' (PIPELINING)' if pipelining else ''}")
+        return stats
@@ -0,0 +1,228 @@
+import queue
+import re
+import threading
+
+UID_PATTERN = re.compile(rb'UID (\d+)')
+FETCH_START_PATTERN = re.compile(rb'\d+ \(')
+
+
+def format_uid_sets(uids, chunk_size=500):
+    """
+    Splits UIDs into compact IMAP sequence sets, e.g. '1:5,8,10:12'.
+
+    Runs of consecutive UIDs become ranges, and every set holds at most 'chunk_size' UIDs,
+    so command lines stay short even for very large mailboxes.
+
+    Args:
+    - uids (iterable of int or str): The UIDs.
+    - chunk_size (int): The maximum number of UIDs per set.
+
+    Yields:
+    - str: The sequence sets, in ascending UID order.
+    """
+    uids = sorted(int(uid) for uid in uids)
+    for start in range(0, len(uids), chunk_size):
+        chunk = uids[start:start + chunk_size]
+        parts = []
+        first = previous = chunk[0]
+        for uid in chunk[1:] + [None]:
+            if uid is not None and uid == previous + 1:
+                previous = uid
+                continue
+            parts.append(str(first) if first == previous else f"{first}:{previous}")
+            if uid is not None:
+                first = previous = uid
+        yield ','.join(parts)
+
+
+class ShardedFetcher:
+    """
+    A fetch engine that splits a mailbox into UID chunks and fetches them in parallel.
+
+    Every worker thread (shard) holds its own authenticated IMAP connection. Chunks are
+    dealt to the shards round-robin, so every shard knows how many messages it has to
+    fetch. Fetched messages are streamed to the consumer as soon as a chunk completes,
+    either in UID order or in the order chunks finish. Every shard has at most 4 chunks
+    in flight or waiting to be consumed, so memory stays bounded.
+
+    Attributes:
+    - manager (MailManager): The mail manager used to open IMAP connections.
+    - folder (str): The name of the folder to fetch from.
+    - connections (int): The number of parallel connections, capped by the provider.
+    - chunk_size (int): The number of UIDs fetched with a single UID FETCH command.
+    - ordered (bool): Whether messages are yielded in UID order.
+    - progress (callable): Called with (shard, fetched, shard_total) after every chunk.
+    - shard_counts (dict): The number of messages fetched by every shard (connection).
+
+    Methods:
+    - __init__(self, manager, folder='inbox', connections=4, chunk_size=500, ordered=False, progress=None): Initializes the fetcher.
+    - search_uids(self, criteria='ALL'): Returns the UIDs of the messages matching the search criteria.
+    - fetch(self, items='(BODY.PEEK[])', uids=None): Fetches messages and yields them as they arrive.
+    - parse_fetch_response(data): Splits a UID FETCH response into per-message records.
+    """
+
+    def __init__(self, manager, folder='inbox', connections=4, chunk_size=500, ordered=False, progress=None):
+        """
+        Initializes a new ShardedFetcher instance.
+
+        Args:
+        - manager (MailManager): The mail manager used to open IMAP connections.
+        - folder (str): The name of the folder to fetch from.
+        - connections (int): The requested number of parallel connections.
+        - chunk_size (int): The number of UIDs fetched with a single UID FETCH command.
+        - ordered (bool): Whether messages are yielded in UID order.
+        - progress (callable, optional): Called with (shard, fetched, shard_total) after every chunk,
+          where shard_total is the number of messages assigned to the shard.
+        """
+        self.manager = manager
+        self.folder = folder
+        self.connections = max(1, min(connections, manager.provider.max_connections))
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+        self.progress = progress
+        self.window = 4
+        self.shard_counts = {}
+
+    def search_uids(self, criteria='ALL'):
+        """
+        Returns the UIDs of the messages matching the search criteria.
+
+        Args:
+        - criteria (str): The IMAP search criteria.
+
+        Returns:
+        - list of int: The sorted UIDs.
+        """
+        with self.manager.open_imap_session() as server:
+            server.select(self.folder, readonly=True)
+            typ, data = server.uid('search', None, criteria)
+            if typ != 'OK':
+                raise RuntimeError(f"UID SEARCH failed: {data}")
+            return sorted(int(uid) for uid in data[0].split())
+
+    def fetch(self, items='(BODY.PEEK[])', uids=None):
+        """
+        Fetches messages and yields them as they arrive.
+
+        Args:
+        - items (str): The FETCH data items, e.g. '(BODY.PEEK[])'. UID is always included by the server.
+        - uids (list of int, optional): The UIDs to fetch. All messages in the folder are fetched if omitted.
+
+        Yields:
+        - tuple: (uid, meta, literal), where meta holds the non-literal part of the response
+          and literal is the first literal (message data) or None.
+        """
+        if uids is None:
+            uids = self.search_uids()
+        chunks = [uids[i:i + self.chunk_size] for i in range(0, len(uids), self.chunk_size)]
+        if not chunks:
+            return
+
+        shards = min(self.connections, len(chunks))
+        assignments = [[(index, chunks[index]) for index in range(shard, len(chunks), shards)]
+                       for shard in range(shards)]
+        results = queue.Queue()
+        slots = [threading.Semaphore(self.window) for _ in range(shards)]
+        stop = threading.Event()
+        self.shard_counts = {shard: 0 for shard in range(shards)}
+
+        workers = [
+            threading.Thread(target=self._worker, args=(shard, items, assignments[shard], results, slots[shard], stop),
+                             name=f"ShardedFetcher-{shard}", daemon=True)
+            for shard in range(shards)
+        ]
+        for worker in workers:
+            worker.start()
+
+        pending = {}
+        next_index = 0
+        try:
+            while next_index < len(chunks):
+                index, records = results.get()
+                if isinstance(records, Exception):
+                    raise records
+                if not self.ordered:
+                    next_index += 1
+                    slots[index % shards].release()
+                    yield from records
+                    continue
+                pending[index] = records
+                while next_index in pending:
+                    records = pending.pop(next_index)
+                    slots[next_index % shards].release()
+                    next_index += 1
+                    yield from records
+        finally:
+            stop.set()
+            for slot in slots:
+                slot.release()
+
+    def _worker(self, shard, items, chunks, results, slots, stop):
+        """
+        Fetches the chunks assigned to a shard over one connection.
+
+        Args:
+        - shard (int): The number of this worker.
+        - items (str): The FETCH data items.
+        - chunks (list of tuple): The (index, chunk) pairs assigned to this shard, in index order.
+        - results (queue.Queue): The queue that receives (index, records) results.
+        - slots (threading.Semaphore): Limits the number of chunks of this shard in flight.
+        - stop (threading.Event): Set when the consumer stops reading.
+        """
+        shard_total = sum(len(chunk) for _, chunk in chunks)
+        try:
+            with self.manager.open_imap_session() as server:
+                server.select(self.folder, readonly=True)
+                for index, chunk in chunks:
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    records = []
+                    for uid_set in format_uid_sets(chunk, self.chunk_size):
+                        typ, data = server.uid('fetch', uid_set, items)
+                        if typ != 'OK':
+                            raise RuntimeError(f"UID FETCH failed: {data}")
+                        records.extend(self.parse_fetch_response(data))
+                    self.shard_counts[shard] += len(records)
+                    results.put((index, records))
+                    if self.progress:
+                        self.progress(shard, self.shard_counts[shard], shard_total)
+        except Exception as e:
+            results.put((None, e))
+
+    @staticmethod
+    def parse_fetch_response(data):
+        """
+        Splits a UID FETCH response into per-message records.
+
+        Args:
+        - data (list): The data returned by imaplib for a UID FETCH command.
+
+        Returns:
+        - list of tuple: (uid, meta, literal) for every message in the response.
+        """
+        records = []
+        meta, literal = None, None
+        for item in data:
+            if isinstance(item, tuple):
+                if meta is not None:
+                    records.append((meta, literal))
+                meta, literal = item[0], item[1]
+            elif item is None:
+                continue
+            elif meta is not None and not FETCH_START_PATTERN.match(item):
+                # Trailer of the previous message, e.g. b' RFC822.SIZE 42)'.
+                meta += item
+            else:
+                if meta is not None:
+                    records.append((meta, literal))
+                meta, literal = item, None
+        if meta is not None:
+            records.append((meta, literal))
+
+        parsed = []
+        for meta, literal in records:
+            match = UID_PATTERN.search(meta)
+            if match:
+                parsed.append((int(match.group(1)), meta, literal))
+        return parsed
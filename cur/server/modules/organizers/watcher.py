@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+
+UIDNEXT_PATTERN = re.compile(rb'UIDNEXT (\d+)')
+
+
+class MailboxWatcher(threading.Thread):
+    """
+    A background thread that watches a mailbox and classifies newly arrived emails.
+
+    The watcher keeps one IMAP connection open. If the server supports IDLE, it waits for
+    EXISTS notifications and re-issues IDLE before the server drops the connection.
+    Otherwise it polls the mailbox with NOOP at a fixed interval.
+
+    Attributes:
+    - manager (MailManager): The mail manager used to connect and classify emails.
+    - folder (str): The name of the watched folder.
+    - idle_refresh (float): Number of seconds after which IDLE is re-issued.
+    - poll_interval (float): Number of seconds between NOOP polls when IDLE is unsupported.
+    - last_uid (int): The highest UID that has already been processed.
+
+    Methods:
+    - __init__(self, manager, folder='inbox', idle_refresh=25 * 60, poll_interval=30): Initializes the watcher.
+    - run(self): Runs the watch loop until stopped, reconnecting after errors.
+    - stop(self): Stops the watcher.
+    - watch(self, server): Watches the mailbox over an established connection.
+    - process_new_messages(self, server): Classifies emails that arrived since the last check.
+    """
+
+    RECONNECT_DELAY = 10
+    STOP_CHECK_INTERVAL = 1.0
+
+    def __init__(self, manager, folder='inbox', idle_refresh=25 * 60, poll_interval=30):
+        """
+        Initializes a new MailboxWatcher instance.
+
+        Args:
+        - manager (MailManager): The mail manager used to connect and classify emails.
+        - folder (str): The name of the folder to watch.
+        - idle_refresh (float): Number of seconds after which IDLE is re-issued (RFC 2177 allows 29 minutes).
+        - poll_interval (float): Number of seconds between NOOP polls when IDLE is unsupported.
+        """
+        super().__init__(name=f"MailboxWatcher-{manager.user_email}", daemon=True)
+        self.manager = manager
+        self.folder = folder
+        self.idle_refresh = idle_refresh
+        self.poll_interval = poll_interval
+        self.last_uid = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        Runs the watch loop until stopped, reconnecting after errors.
+        """
+        while not self._stop_event.is_set():
+            try:
+                with self.manager.open_imap_session() as server:
+                    self.watch(server)
+            except Exception as e:
+                print(f"Помилка спостереження за скринькою: {e}")
+                self._stop_event.wait(self.RECONNECT_DELAY)
+
+    def stop(self):
+        """
+        Stops the watcher.
+        """
+        self._stop_event.set()
+
+    def watch(self, server):
+        """
+        Watches the mailbox over an established connection.
+
+        Args:
+        - server (IMAPSession): The logged in IMAP connection.
+        """
+        if self.last_uid is None:
+            typ, data = server.status(self.folder, '(UIDNEXT)')
+            match = UIDNEXT_PATTERN.search(data[0]) if typ == 'OK' else None
+            self.last_uid = int(match.group(1)) - 1 if match else 0
+        server.select(self.folder)
+        # Emails that arrived while the connection was down are picked up here.
+        self.process_new_messages(server)
+
+        use_idle = server.supports('IDLE')
+        print(f"Спостереження за '{self.folder}' ({'IDLE' if use_idle else 'NOOP'})...")
+        while not self._stop_event.is_set():
+            if use_idle:
+                self._idle_once(server)
+            else:
+                self._stop_event.wait(self.poll_interval)
+                server.noop()
+            if server.pop_exists() is not None:
+                self.process_new_messages(server)
+
+    def _idle_once(self, server):
+        """
+        Idles until new emails arrive, the refresh interval expires or the watcher is stopped.
+
+        Args:
+        - server (IMAPSession): The logged in IMAP connection.
+        """
+        server.idle_start()
+        deadline = time.monotonic() + self.idle_refresh
+        try:
+            while not self._stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if server.idle_wait(min(remaining, self.STOP_CHECK_INTERVAL)):
+                    if 'EXISTS' in server.untagged_responses:
+                        break
+        finally:
+            server.idle_done()
+
+    def process_new_messages(self, server):
+        """
+        Classifies emails that arrived since the last check.
+
+        Args:
+        - server (IMAPSession): The IMAP connection with the watched folder selected.
+        """
+        typ, data = server.uid('search', None, f'UID {self.last_uid + 1}:*')
+        if typ != 'OK':
+            return
+        # "n:*" always matches the last message, even if its UID is below n.
+        uids = [uid for uid in data[0].split() if int(uid) > self.last_uid]
+        if not uids:
+            return
+        self.manager.classify_uids(server, uids)
+        self.last_uid = max(int(uid) for uid in uids)
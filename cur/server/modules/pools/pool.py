@@ -0,0 +1,381 @@
+import collections
+import selectors
+import socket
+import threading
+import time
+
+
+class HandlerPool:
+    """
+    A fixed set of worker threads serving tasks from a bounded queue.
+
+    submit() never blocks: when all workers are busy and the queue is full the task is
+    rejected, so the caller can shed load immediately instead of piling up threads. If
+    'max_wait' is set, a timer thread also removes tasks that waited longer than that for a
+    worker and hands them to their 'on_expired' callback, so queued work is turned away
+    on time even while every worker is occupied by a long task.
+
+    Attributes:
+    - workers (int): The number of worker threads.
+    - backlog (int): The maximum number of queued tasks.
+    - max_wait (float or None): Seconds a task may wait for a worker, None for no limit.
+    - accepted (int): The number of tasks queued so far.
+    - rejected (int): The number of tasks rejected because the queue was full.
+    - expired (int): The number of tasks removed because they waited longer than max_wait.
+    - peak_busy (int): The highest number of simultaneously busy workers.
+
+    Methods:
+    - __init__(self, workers=32, backlog=64, max_wait=None, name='handler'): Starts the worker threads.
+    - submit(self, task, *args, on_expired=None): Queues a task, returns False if the queue is full.
+    - busy(self): Returns the number of busy workers.
+    - queued(self): Returns the number of queued tasks.
+    - stats(self): Returns the pool counters as a dictionary.
+    """
+
+    def __init__(self, workers=32, backlog=64, max_wait=None, name='handler'):
+        """
+        Starts the worker threads.
+
+        Args:
+        - workers (int): The number of worker threads.
+        - backlog (int): The maximum number of queued tasks.
+        - max_wait (float or None): Seconds a task may wait for a worker, None for no limit.
+        - name (str): The prefix of the worker thread names.
+        """
+        self.workers = workers
+        self.backlog = backlog
+        self.max_wait = max_wait
+        self.accepted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.peak_busy = 0
+        self._busy = 0
+        self._tasks = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        for number in range(workers):
+            threading.Thread(target=self._work, name=f"{name}-{number}", daemon=True).start()
+        if max_wait is not None:
+            threading.Thread(target=self._expire, name=f"{name}-expiry", daemon=True).start()
+
+    def submit(self, task, *args, on_expired=None):
+        """
+        Queues a task without blocking.
+
+        The task is called as task(queued_seconds, *args), where queued_seconds is the time
+        it waited for a worker.
+
+        Args:
+        - task (callable): The task.
+        - *args: Its arguments.
+        - on_expired (callable, optional): Called as on_expired(*args) by the timer thread if
+          the task waited longer than max_wait and will not run.
+
+        Returns:
+        - bool: True if the task was queued, False if all workers are busy and the queue is full.
+        """
+        with self._lock:
+            # Tasks about to be taken by idle workers do not count against the backlog.
+            if len(self._tasks) >= self.backlog + self.workers - self._busy:
+                self.rejected += 1
+                return False
+            self._tasks.append((time.monotonic(), task, args, on_expired))
+            self.accepted += 1
+            self._ready.notify()
+        return True
+
+    def _work(self):
+        """
+        Runs queued tasks forever.
+        """
+        while True:
+            with self._lock:
+                while not self._tasks:
+                    self._ready.wait()
+                queued_at, task, args, _ = self._tasks.popleft()
+                self._busy += 1
+                self.peak_busy = max(self.peak_busy, self._busy)
+            try:
+                task(time.monotonic() - queued_at, *args)
+            except Exception as e:
+                print(f"Помилка обробника: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def _expire(self):
+        """
+        Removes tasks that waited longer than max_wait, oldest first, and reports them to
+        their on_expired callbacks.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                expired = []
+                while self._tasks and now - self._tasks[0][0] > self.max_wait:
+                    expired.append(self._tasks.popleft())
+                self.expired += len(expired)
+                oldest = now - self._tasks[0][0] if self._tasks else 0.0
+            for _, _, args, on_expired in expired:
+                if on_expired is None:
+                    continue
+                try:
+                    on_expired(*args)
+                except Exception as e:
+                    print(f"Помилка обробника: {e}")
+            # A task queued right after this check expires at most max_wait / 4 late.
+            time.sleep(max(min(self.max_wait - oldest, self.max_wait / 4), 0.01))
+
+    def busy(self):
+        """
+        Returns the number of busy workers.
+        """
+        return self._busy
+
+    def queued(self):
+        """
+        Returns the number of queued tasks.
+        """
+        return len(self._tasks)
+
+    def stats(self):
+        """
+        Returns the pool counters as a dictionary.
+
+        Returns:
+        - dict: Worker and queue sizes, current and peak occupancy, accepted, rejected and expired tasks.
+        """
+        with self._lock:
+            return {'workers': self.workers, 'busy': self._busy, 'peak_busy': self.peak_busy,
+                    'backlog': self.backlog, 'queued': len(self._tasks),
+                    'accepted': self.accepted, 'rejected': self.rejected, 'expired': self.expired}
+
+
+class InFlightLimiter:
+    """
+    Limits the number of requests each client has in progress at the same time.
+
+    Attributes:
+    - limit (int): The maximum number of requests in progress per client.
+    - rejected (int): The number of requests rejected because a client was at its limit.
+
+    Methods:
+    - __init__(self, limit=4): Initializes the limiter.
+    - acquire(self, client): Starts a request of a client, returns False if it is at its limit.
+    - release(self, client): Finishes a request of a client.
+    - in_flight(self): Returns the total number of requests in progress.
+    """
+
+    def __init__(self, limit=4):
+        """
+        Initializes the limiter.
+
+        Args:
+        - limit (int): The maximum number of requests in progress per client.
+        """
+        self.limit = limit
+        self.rejected = 0
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        """
+        Starts a request of a client.
+
+        Args:
+        - client: The client key, e.g. its IP address.
+
+        Returns:
+        - bool: True if the request may run, False if the client is at its limit.
+        """
+        with self._lock:
+            count = self._counts.get(client, 0)
+            if count >= self.limit:
+                self.rejected += 1
+                return False
+            self._counts[client] = count + 1
+            return True
+
+    def release(self, client):
+        """
+        Finishes a request of a client.
+
+        Args:
+        - client: The client key passed to acquire.
+        """
+        with self._lock:
+            count = self._counts.get(client, 0) - 1
+            if count > 0:
+                self._counts[client] = count
+            else:
+                self._counts.pop(client, None)
+
+    def in_flight(self):
+        """
+        Returns the total number of requests in progress.
+        """
+        with self._lock:
+            return sum(self._counts.values())
+
+
+class ClientConnection:
+    """
+    A client connection served by the handler pool one request at a time.
+
+    Attributes:
+    - socket (socket.socket or CompressedSocket): The socket connected to the client.
+    - address (tuple): The client address.
+    - client (str or None): The client key used for per-client limits, its IP address.
+    - last_active (float): The time.monotonic() value of the last activity on the connection.
+
+    Methods:
+    - __init__(self, client_socket, address=None): Initializes the connection.
+    - close(self): Closes the socket.
+    """
+
+    def __init__(self, client_socket, address=None):
+        """
+        Initializes the connection.
+
+        Args:
+        - client_socket (socket.socket): The socket connected to the client.
+        - address (tuple, optional): The client address.
+        """
+        self.socket = client_socket
+        self.address = address
+        self.client = address[0] if address else None
+        self.last_active = time.monotonic()
+
+    def close(self):
+        """
+        Closes the socket.
+        """
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class ConnectionPoller:
+    """
+    Watches idle client connections in a single thread and hands over those with a request waiting.
+
+    A watched connection is removed from the poller as soon as it becomes readable and passed
+    to 'on_readable', which is expected to serve one request and call watch() again. Handler
+    threads are therefore only occupied while a request is being served, not while clients
+    are silent. Connections silent for longer than 'idle_timeout' are passed to 'on_idle'.
+
+    Attributes:
+    - on_readable (callable): Called as on_readable(connection) in the poller thread.
+    - idle_timeout (float): Seconds a watched connection may stay silent.
+    - on_idle (callable): Called as on_idle(connection) for connections that stayed silent too long.
+
+    Methods:
+    - __init__(self, on_readable, idle_timeout=300, on_idle=None, name='poller'): Starts the poller thread.
+    - watch(self, connection): Starts watching a connection; safe to call from any thread.
+    - watched(self): Returns the number of watched connections.
+    """
+
+    def __init__(self, on_readable, idle_timeout=300, on_idle=None, name='poller'):
+        """
+        Starts the poller thread.
+
+        Args:
+        - on_readable (callable): Called as on_readable(connection) when a request is waiting.
+        - idle_timeout (float): Seconds a watched connection may stay silent.
+        - on_idle (callable, optional): Called as on_idle(connection) for silent connections.
+          They are closed if omitted.
+        - name (str): The poller thread name.
+        """
+        self.on_readable = on_readable
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle or ClientConnection.close
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._pending = []
+        self._count = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def watch(self, connection):
+        """
+        Starts watching a connection. Safe to call from any thread.
+
+        Args:
+        - connection (ClientConnection): The connection.
+        """
+        connection.last_active = time.monotonic()
+        with self._lock:
+            self._pending.append(connection)
+            self._count += 1
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def watched(self):
+        """
+        Returns the number of watched connections.
+        """
+        return self._count
+
+    def _forget(self, connection):
+        """
+        Stops watching a connection.
+
+        Args:
+        - connection (ClientConnection): The connection.
+        """
+        self._selector.unregister(connection.socket)
+        with self._lock:
+            self._count -= 1
+
+    def _run(self):
+        """
+        Waits for requests on the watched connections and closes silent ones, forever.
+        """
+        while True:
+            for key, _ in self._selector.select(timeout=min(self.idle_timeout, 1.0)):
+                if key.data is None:
+                    try:
+                        while self._wakeup_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._forget(key.data)
+                self._call(self.on_readable, key.data)
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for connection in pending:
+                try:
+                    self._selector.register(connection.socket, selectors.EVENT_READ, connection)
+                except (OSError, ValueError):
+                    with self._lock:
+                        self._count -= 1
+                    connection.close()
+
+            now = time.monotonic()
+            for key in list(self._selector.get_map().values()):
+                if key.data is not None and now - key.data.last_active > self.idle_timeout:
+                    self._forget(key.data)
+                    self._call(self.on_idle, key.data)
+
+    @staticmethod
+    def _call(callback, connection):
+        """
+        Calls a connection callback, closing the connection if it fails.
+
+        Args:
+        - callback (callable): The callback.
+        - connection (ClientConnection): The connection.
+        """
+        try:
+            callback(connection)
+        except Exception as e:
+            print(f"Помилка обробника: {e}")
+            connection.close()
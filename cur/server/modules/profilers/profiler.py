@@ -0,0 +1,339 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    A statistical CPU profiler that samples the stacks of threads executing commands.
+
+    profile() records the ID of the calling thread while the command runs, and a background
+    thread records the Python stack of each of those threads every 'interval' seconds. Idle
+    handler threads waiting for work are not sampled, so they do not dilute the report.
+    Commands blocked in socket calls are sampled too, so the report shows where requests
+    wait as well as where they compute.
+
+    Attributes:
+    - interval (float): Number of seconds between samples.
+    - max_depth (int): The maximum number of frames recorded per stack.
+    - samples (int): The number of samples taken per thread so far.
+
+    Methods:
+    - __init__(self, interval=0.005, max_depth=64): Initializes the profiler.
+    - start(self): Starts sampling.
+    - stop(self): Stops sampling.
+    - profile(self, func, *args, **kwargs): Calls a function with the current thread marked for sampling.
+    - report(self, top=20): Returns the functions seen most often.
+    - write(self, path): Writes the stacks in collapsed (flame graph) format.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        """
+        Initializes the profiler.
+
+        Args:
+        - interval (float): Number of seconds between samples.
+        - max_depth (int): The maximum number of frames recorded per stack.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self._elapsed = 0.0
+        self._active = Counter()
+        self._active_lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts sampling in a background thread.
+        """
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._elapsed = time.perf_counter() - self._started_at
+
+    def _run(self):
+        """
+        Samples the stacks of the threads executing commands until stopped.
+        """
+        while not self._stop_event.wait(self.interval):
+            with self._active_lock:
+                active = set(self._active)
+            if not active:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in active:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def profile(self, func, *args, **kwargs):
+        """
+        Calls a function, sampling the current thread while it runs.
+
+        Args:
+        - func (callable): The function to call.
+        - *args, **kwargs: Its arguments.
+
+        Returns:
+        - The result of the function.
+        """
+        thread_id = threading.get_ident()
+        with self._active_lock:
+            self._active[thread_id] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._active_lock:
+                self._active[thread_id] -= 1
+                if not self._active[thread_id]:
+                    del self._active[thread_id]
+
+    def report(self, top=20):
+        """
+        Returns the functions seen most often.
+
+        Args:
+        - top (int): The number of functions listed.
+
+        Returns:
+        - str: Functions ordered by own samples, with their share of all thread samples
+          and their inclusive samples. Intervals with no command running are not counted.
+        """
+        own, inclusive = Counter(), Counter()
+        for stack, count in self._stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                inclusive[function] += count
+        total = sum(self._stacks.values()) or 1
+        lines = [f"Sampling profile: {self.samples} samples every {self.interval * 1000:.1f} ms "
+                 f"over {self._elapsed:.1f} s, {total} thread samples",
+                 f"{'own %':>7} {'total %':>8}  function"]
+        for function, count in own.most_common(top):
+            lines.append(f"{count * 100 / total:7.1f} {inclusive[function] * 100 / total:8.1f}  {function}")
+        return '\n'.join(lines)
+
+    def write(self, path):
+        """
+        Writes the stacks in collapsed format, one 'frame;frame;... count' line per stack,
+        as read by flamegraph.pl and speedscope.
+
+        Args:
+        - path (str): The output file path.
+        """
+        with open(path, 'w', encoding='utf-8') as output:
+            for stack, count in self._stacks.most_common():
+                output.write(f"{';'.join(stack)} {count}\n")
+
+
+class CallProfiler:
+    """
+    A deterministic profiler that runs one command at a time under cProfile.
+
+    Only one cProfile may be active in the process: since Python 3.12 cProfile is built on
+    sys.monitoring, and enabling a second one raises ValueError. Commands that start while
+    another command is being profiled, or while another profiling tool is active, run
+    unprofiled and are counted as skipped.
+
+    Attributes:
+    - commands (int): The number of commands profiled.
+    - skipped (int): The number of commands that ran unprofiled.
+
+    Methods:
+    - __init__(self): Initializes the profiler.
+    - start(self): Starts profiling commands.
+    - stop(self): Stops profiling commands.
+    - profile(self, func, *args, **kwargs): Calls a function under the profile if no other command is profiled.
+    - report(self, top=20): Returns the functions with the highest cumulative time.
+    - write(self, path): Writes the statistics in pstats format.
+    """
+
+    def __init__(self):
+        """
+        Initializes the profiler.
+        """
+        self.commands = 0
+        self.skipped = 0
+        self._profile = cProfile.Profile()
+        self._running = threading.Lock()
+        self._active = False
+
+    def start(self):
+        """
+        Starts profiling commands.
+        """
+        self._active = True
+
+    def stop(self):
+        """
+        Stops profiling commands. A command that is running finishes under the profile.
+        """
+        self._active = False
+
+    def profile(self, func, *args, **kwargs):
+        """
+        Calls a function under the cProfile.Profile, unless another command is being profiled.
+
+        Args:
+        - func (callable): The function to call.
+        - *args, **kwargs: Its arguments.
+
+        Returns:
+        - The result of the function.
+        """
+        if not self._active:
+            return func(*args, **kwargs)
+        if not self._running.acquire(blocking=False):
+            self.skipped += 1
+            return func(*args, **kwargs)
+        try:
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Another profiling tool is active.
+                self.skipped += 1
+                return func(*args, **kwargs)
+            self.commands += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._profile.disable()
+        finally:
+            self._running.release()
+
+    def _stats(self):
+        """
+        Returns the collected statistics.
+
+        Returns:
+        - pstats.Stats or None: The statistics, or None if nothing was profiled.
+        """
+        # Not locked: 'profile stop' itself may be running under the profile.
+        self._profile.create_stats()
+        if not self._profile.stats:
+            return None
+        return pstats.Stats(self._profile, stream=io.StringIO())
+
+    def report(self, top=20):
+        """
+        Returns the functions with the highest cumulative time.
+
+        Args:
+        - top (int): The number of functions listed.
+
+        Returns:
+        - str: The pstats listing.
+        """
+        stats = self._stats()
+        if stats is None:
+            return "cProfile: no commands were profiled."
+        stats.stream = io.StringIO()
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        return (f"cProfile over {self.commands} command(s), {self.skipped} ran unprofiled:\n"
+                f"{stats.stream.getvalue().strip()}")
+
+    def write(self, path):
+        """
+        Writes the statistics in pstats format, readable with pstats or snakeviz.
+
+        Args:
+        - path (str): The output file path.
+        """
+        stats = self._stats()
+        if stats is not None:
+            stats.dump_stats(path)
+
+
+class MemorySnapshots:
+    """
+    Takes tracemalloc snapshots and reports what was allocated between them.
+
+    The first snapshot starts tracemalloc, which slows allocations down until stop() is called.
+
+    Attributes:
+    - frames (int): The number of frames stored per traced allocation.
+
+    Methods:
+    - __init__(self, frames=1): Initializes the snapshot series.
+    - snapshot(self, top=10, path=None): Takes a snapshot and returns the top allocation differences.
+    - stop(self): Stops tracing allocations.
+    """
+
+    IGNORED = (tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+               tracemalloc.Filter(False, "<unknown>"))
+
+    def __init__(self, frames=1):
+        """
+        Initializes the snapshot series.
+
+        Args:
+        - frames (int): The number of frames stored per traced allocation.
+        """
+        self.frames = frames
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, top=10, path=None):
+        """
+        Takes a snapshot and returns the allocations that changed most since the previous one.
+
+        Args:
+        - top (int): The number of source lines listed.
+        - path (str, optional): A file the snapshot is dumped to, readable with tracemalloc.Snapshot.load.
+
+        Returns:
+        - str: The traced memory and the top differences by source line.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._previous = None
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.IGNORED)
+            if path:
+                snapshot.dump(path)
+            previous, self._previous = self._previous, snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"tracemalloc: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB"]
+        if previous is None:
+            lines.append("Baseline snapshot taken. Run memsnap again to see the differences.")
+        else:
+            lines.extend(str(stat) for stat in snapshot.compare_to(previous, 'lineno')[:top])
+        return '\n'.join(lines)
+
+    def stop(self):
+        """
+        Stops tracing allocations and drops the last snapshot.
+
+        Returns:
+        - bool: True if tracing was active.
+        """
+        with self._lock:
+            self._previous = None
+            if not tracemalloc.is_tracing():
+                return False
+            tracemalloc.stop()
+            return True
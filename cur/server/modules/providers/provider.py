@@ -10,14 +10,15 @@ class MailServiceProvider:
     - smtp_port (int): The SMTP server port number.
     - imap_server (str): The IMAP server address for receiving emails.
     - pop3_server (str): The POP3 server address for receiving emails.
+    - max_connections (int): The maximum number of simultaneous IMAP connections allowed per account.
 
     Methods:
-    - __new__(cls, smtp_server, smtp_port, imap_server, pop3_server): Creates a new instance or returns an existing one.
-    - __init__(self, smtp_server, smtp_port, imap_server, pop3_server): Initializes the provider with server configurations.
+    - __new__(cls, smtp_server, smtp_port, imap_server, pop3_server, max_connections=5): Creates a new instance or returns an existing one.
+    - __init__(self, smtp_server, smtp_port, imap_server, pop3_server, max_connections=5): Initializes the provider with server configurations.
     """
 
     _instances = {}
-    def __new__(cls, smtp_server, smtp_port, imap_server, pop3_server):
+    def __new__(cls, smtp_server, smtp_port, imap_server, pop3_server, max_connections=5):
         """
         Creates a new instance or returns an existing one based on server configurations.
 
@@ -26,6 +27,7 @@ class MailServiceProvider:
         - smtp_port (int): The SMTP server port number.
         - imap_server (str): The IMAP server address for receiving emails.
         - pop3_server (str): The POP3 server address for receiving emails.
+        - max_connections (int): The maximum number of simultaneous IMAP connections allowed per account.
 
         Returns:
         - instance: An instance of MailServiceProvider.
@@ -34,14 +36,14 @@ class MailServiceProvider:
         If an instance with the same server configurations exists, it is returned.
         Otherwise, a new instance is created and stored for future use.
         """
-        key = (smtp_server, smtp_port, imap_server, pop3_server)
+        key = (smtp_server, smtp_port, imap_server, pop3_server, max_connections)
         if key not in cls._instances:
             instance = super(MailServiceProvider, cls).__new__(cls)
             cls._instances[key] = instance
             return instance
         return cls._instances[key]
 
-    def __init__(self, smtp_server, smtp_port, imap_server, pop3_server):
+    def __init__(self, smtp_server, smtp_port, imap_server, pop3_server, max_connections=5):
         """
         Initializes the provider with server configurations.
 
@@ -50,6 +52,7 @@ class MailServiceProvider:
         - smtp_port (int): The SMTP server port number.
         - imap_server (str): The IMAP server address for receiving emails.
         - pop3_server (str): The POP3 server address for receiving emails.
+        - max_connections (int): The maximum number of simultaneous IMAP connections allowed per account.
 
         Note:
         This method is called when a new instance is created, but it only initializes
@@ -60,4 +63,5 @@ class MailServiceProvider:
             self.smtp_port = smtp_port
             self.imap_server = imap_server
             self.pop3_server = pop3_server
+            self.max_connections = max_connections
             self._initialized = True
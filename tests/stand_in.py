@@ -0,0 +1,229 @@
+import threading
+
+from cur.benchmarks.pop3_vs_imap import BenchmarkMailManager, StandInIMAPServer
+from cur.common.compression import CompressedSocket
+from cur.server.modules.providers.provider import MailServiceProvider
+
+
+class SwitchableSocket:
+    """
+    A client socket of a stand-in server that can switch to COMPRESS=DEFLATE mid-connection.
+
+    Attributes:
+    - sock (socket.socket or CompressedSocket): The socket used for reading and writing.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sock.close()
+
+    def recv(self, bufsize):
+        return self.sock.recv(bufsize)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def start_compression(self):
+        """
+        Compresses everything sent and received from now on.
+        """
+        self.sock = CompressedSocket(self.sock, 'deflate')
+
+
+class StandInFolderServer(StandInIMAPServer):
+    """
+    A stand-in IMAP server that also supports LOGIN, LIST, CREATE, UID COPY, UID STORE,
+    UID EXPUNGE, EXPUNGE, NOOP, IDLE and COMPRESS DEFLATE.
+
+    Like many real servers it announces UIDPLUS, IDLE and COMPRESS=DEFLATE only after login.
+
+    Attributes:
+    - folders (dict): Folder names mapped to the UIDs copied into them.
+    - listed (set): Names LIST reports as existing even though COPY answers TRYCREATE.
+    - deleted (set): The UIDs flagged \\Deleted in the inbox.
+    - create_fails (bool): Whether CREATE is refused.
+    - copy_fails (bool): Whether COPY is refused.
+    - uidplus (bool): Whether UIDPLUS is advertised after login.
+    - idle (bool): Whether IDLE is advertised after login.
+    - compress (bool): Whether COMPRESS=DEFLATE is advertised after login.
+    - login_code (bool): Whether the LOGIN response carries the new capabilities as a response code.
+    - selected (threading.Event): Set once a client selected a folder.
+    - idling (threading.Event): Set while a client is idling.
+    """
+
+    def __init__(self, messages, folders=(), listed=(), create_fails=False, copy_fails=False, uidplus=False,
+                 idle=False, compress=False, login_code=False):
+        """
+        Starts the server on a free local port.
+
+        Args:
+        - messages (list of bytes): The messages in the inbox, UIDs 1 to len(messages).
+        - folders (iterable of str): The folders that exist besides the inbox.
+        - listed (iterable of str): Names LIST reports as existing even though COPY answers TRYCREATE.
+        - create_fails (bool): Whether CREATE is refused.
+        - copy_fails (bool): Whether COPY is refused.
+        - uidplus (bool): Whether UIDPLUS is advertised after login.
+        - idle (bool): Whether IDLE is advertised after login.
+        - compress (bool): Whether COMPRESS=DEFLATE is advertised after login.
+        - login_code (bool): Whether the LOGIN response carries the new capabilities as a response code.
+        """
+        self.folders = {name: [] for name in folders}
+        self.listed = set(listed)
+        self.deleted = set()
+        self.create_fails = create_fails
+        self.copy_fails = copy_fails
+        self.uidplus = uidplus
+        self.idle = idle
+        self.compress = compress
+        self.login_code = login_code
+        self.selected = threading.Event()
+        self.idling = threading.Event()
+        self._idlers = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        super().__init__(messages, latency=0)
+
+    def _serve(self, client):
+        client = self._local.client = SwitchableSocket(client)
+        try:
+            super()._serve(client)
+        finally:
+            with self._lock:
+                self._idlers.pop(client, None)
+
+    def capabilities(self, state):
+        """
+        Returns the capabilities advertised to a connection.
+
+        Args:
+        - state (dict): The per-connection state.
+
+        Returns:
+        - str: The space separated capabilities.
+        """
+        capabilities = ['IMAP4rev1']
+        if state.get('authenticated'):
+            capabilities += (['UIDPLUS'] if self.uidplus else []) + (['IDLE'] if self.idle else [])
+            capabilities += ['COMPRESS=DEFLATE'] if self.compress else []
+        return ' '.join(capabilities)
+
+    def deliver(self, message):
+        """
+        Adds a message to the inbox and notifies idling clients.
+
+        Args:
+        - message (bytes): The message.
+
+        Returns:
+        - int: The UID of the new message.
+        """
+        with self._lock:
+            uid = max(self.messages, default=0) + 1
+            self.messages[uid] = message
+            for client in self._idlers:
+                client.sendall(f"* {len(self.messages)} EXISTS\r\n".encode('ascii'))
+        return uid
+
+    @staticmethod
+    def _uid_set(text):
+        """
+        Expands a sequence set such as '1:3,7'.
+
+        Args:
+        - text (str): The sequence set.
+
+        Returns:
+        - list of int: The UIDs.
+        """
+        uids = []
+        for part in text.split(','):
+            first, _, last = part.partition(':')
+            uids.extend(range(int(first), int(last or first) + 1))
+        return uids
+
+    def handle_line(self, line, state):
+        if line.upper() == 'DONE' and 'idle_tag' in state:
+            with self._lock:
+                self._idlers.pop(self._local.client, None)
+                self.idling.clear()
+            return f"{state.pop('idle_tag')} OK idle done\r\n".encode('ascii')
+        tag, command, argument = (line.split(' ', 2) + [''])[:3]
+        command = command.upper()
+        if command == 'UID':
+            command, _, argument = argument.partition(' ')
+            command = 'UID ' + command.upper()
+        if command == 'CAPABILITY':
+            return f"* CAPABILITY {self.capabilities(state)}\r\n{tag} OK done\r\n".encode('ascii')
+        if command == 'LOGIN':
+            state['authenticated'] = True
+            code = f"[CAPABILITY {self.capabilities(state)}] " if self.login_code else ''
+            return f"{tag} OK {code}logged in\r\n".encode('ascii')
+        if command in ('SELECT', 'NOOP'):
+            exists, state['exists'] = state.get('exists'), len(self.messages)
+            if command == 'SELECT':
+                self.selected.set()
+            if command == 'NOOP' and exists == len(self.messages):
+                return f"{tag} OK done\r\n".encode('ascii')
+            return f"* {len(self.messages)} EXISTS\r\n{tag} OK done\r\n".encode('ascii')
+        if command == 'COMPRESS' and self.compress and argument.upper() == 'DEFLATE':
+            self._local.client.sendall(f"{tag} OK compressing\r\n".encode('ascii'))
+            self._local.client.start_compression()
+            return b''
+        if command == 'IDLE':
+            state['idle_tag'] = tag
+            with self._lock:
+                self._local.client.sendall(b'+ idling\r\n')
+                self._idlers[self._local.client] = state
+                self.idling.set()
+            return b''
+        if command == 'LIST':
+            name = argument.split(' ', 1)[1].strip('"')
+            if name in self.folders or name in self.listed:
+                return f'* LIST () "/" {name}\r\n{tag} OK done\r\n'.encode('ascii')
+            return f"{tag} OK done\r\n".encode('ascii')
+        if command == 'CREATE':
+            if self.create_fails:
+                return f"{tag} NO create refused\r\n".encode('ascii')
+            self.folders.setdefault(argument.strip('"'), [])
+            return f"{tag} OK done\r\n".encode('ascii')
+        if command == 'UID COPY':
+            uid_set, folder = argument.split(' ', 1)
+            folder = folder.strip('"')
+            if folder not in self.folders:
+                return f"{tag} NO [TRYCREATE] no such folder\r\n".encode('ascii')
+            if self.copy_fails:
+                return f"{tag} NO copy refused\r\n".encode('ascii')
+            self.folders[folder].extend(uid for uid in self._uid_set(uid_set) if uid in self.messages)
+            return f"{tag} OK done\r\n".encode('ascii')
+        if command == 'UID STORE':
+            self.deleted.update(uid for uid in self._uid_set(argument.split(' ', 1)[0]) if uid in self.messages)
+            return f"{tag} OK done\r\n".encode('ascii')
+        if command in ('EXPUNGE', 'UID EXPUNGE'):
+            expunged = self.deleted & set(self._uid_set(argument)) if command == 'UID EXPUNGE' else set(self.deleted)
+            for uid in expunged:
+                del self.messages[uid]
+            self.deleted -= expunged
+            return f"{tag} OK done\r\n".encode('ascii')
+        return super().handle_line(line, state)
+
+
+def make_manager(server, manager_class=BenchmarkMailManager):
+    """
+    Returns a MailManager connected to a stand-in IMAP server.
+
+    Args:
+    - server (StandInIMAPServer): The started stand-in server.
+    - manager_class (type): The BenchmarkMailManager subclass to create.
+
+    Returns:
+    - BenchmarkMailManager: The mail manager.
+    """
+    provider = MailServiceProvider('127.0.0.1', 25, '127.0.0.1', '127.0.0.1')
+    manager = manager_class(provider, 'user@example.com', 'password')
+    manager.port = server.port
+    return manager
@@ -0,0 +1,118 @@
+import json
+import socket
+import threading
+import time
+import unittest
+
+from cur.common.framing import read_response
+from cur.server.core.server_start import EmailServer
+from cur.server.modules.commands.registry import CommandParseError
+from cur.server.modules.pools.pool import ClientConnection
+
+try:
+    from cur.client.client_start import EmailClient
+except ImportError:
+    EmailClient = None
+
+
+class BatchFramingTest(unittest.TestCase):
+    """
+    Tests that 'BATCH <n>' requests are read until all <n> sub-command lines have arrived.
+    """
+
+    def setUp(self):
+        self.server = EmailServer('127.0.0.1', 0, 'gmail', 'user@example.com', 'password',
+                                  warm_up=False, read_timeout=0.5)
+        self.server_socket, self.client_socket = socket.socketpair()
+        self.client_socket.settimeout(5)
+
+    def tearDown(self):
+        self.client_socket.close()
+        self.server_socket.close()
+
+    def receive(self, *chunks):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.server.receive_request(self.server_socket)))
+        thread.start()
+        for chunk in chunks:
+            self.client_socket.sendall(chunk)
+            time.sleep(0.05)
+        thread.join()
+        return result[0]
+
+    def test_single_command(self):
+        self.assertEqual(self.receive(b"server stats"), "server stats")
+
+    def test_batch_in_one_read(self):
+        request = b"BATCH 2\nserver stats\nwarmup status\n"
+        self.assertEqual(self.receive(request), request.decode())
+
+    def test_batch_split_across_reads(self):
+        request = self.receive(b"BATCH 3\nserver st", b"ats\nwarmup status\n", b"batch\n")
+        self.assertEqual(request, "BATCH 3\nserver stats\nwarmup status\nbatch\n")
+
+    def test_last_line_must_be_terminated(self):
+        # Without the final newline the server cannot know the last command is complete.
+        self.assertIsNone(self.receive(b"BATCH 2\nserver stats\nwarmup sta"))
+        self.assertEqual(self.server._counters['read_timeouts'], 1)
+
+    def test_slow_batch_is_cut_off_at_the_deadline(self):
+        # Every byte arrives well within read_timeout, but the request as a whole does not.
+        def drip():
+            try:
+                self.client_socket.sendall(b"BATCH 2\n")
+                for _ in range(30):
+                    time.sleep(0.1)
+                    self.client_socket.sendall(b"x")
+            except OSError:
+                pass
+        threading.Thread(target=drip, daemon=True).start()
+        started = time.monotonic()
+        self.assertIsNone(self.server.receive_request(self.server_socket))
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(self.server._counters['read_timeouts'], 1)
+
+    def test_invalid_encoding(self):
+        self.client_socket.sendall(b"server \xff\xfe")
+        with self.assertRaises(CommandParseError) as raised:
+            self.server.receive_request(self.server_socket)
+        self.assertEqual(raised.exception.code, 'INVALID_ENCODING')
+
+    def test_invalid_encoding_is_answered_and_closed(self):
+        self.client_socket.sendall(b"\xff\xfe")
+        self.server._serve_request(0, ClientConnection(self.server_socket, ('127.0.0.1', 1)))
+        buffer = bytearray()
+        self.assertTrue(read_response(self.client_socket, buffer).startswith("ERROR INVALID_ENCODING"))
+        self.assertEqual(self.client_socket.recv(64), b"")
+
+    def test_batch_results(self):
+        results = json.loads(self.server.process_command("BATCH 3\nserver stats\nbatch 1\nno such command\n"))
+        self.assertEqual([result['ok'] for result in results], [True, False, False])
+        self.assertEqual(results[1]['error']['code'], 'NESTED_BATCH')
+        self.assertEqual(results[2]['error']['code'], 'UNKNOWN_COMMAND')
+
+    def test_batch_over_connection(self):
+        thread = threading.Thread(target=self.server.handle_client, args=(self.server_socket, ('127.0.0.1', 1)))
+        thread.start()
+        self.client_socket.sendall(b"BATCH 2\nserver st")
+        time.sleep(0.05)
+        self.client_socket.sendall(b"ats\nserver stats\n")
+        results = json.loads(read_response(self.client_socket, bytearray()))
+        self.client_socket.shutdown(socket.SHUT_WR)
+        thread.join()
+        self.assertEqual([result['command'] for result in results], ["server stats", "server stats"])
+
+    @unittest.skipIf(EmailClient is None, "the client dependencies are not installed")
+    def test_client_terminates_every_command(self):
+        client = EmailClient('127.0.0.1', 0)
+        client.client = self.client_socket
+        thread = threading.Thread(target=self.server.handle_client, args=(self.server_socket, ('127.0.0.1', 1)))
+        thread.start()
+        results = client.send_batch(["server stats", "warmup status"])
+        self.client_socket.shutdown(socket.SHUT_WR)
+        thread.join()
+        self.assertEqual([result['command'] for result in results], ["server stats", "warmup status"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+from cur.server.modules.commands.registry import Argument, CommandParseError, CommandRegistry
+
+
+class CommandRegistryParseTest(unittest.TestCase):
+    """
+    Tests for CommandRegistry.parse: command lookup, quoting and parse errors.
+    """
+
+    def setUp(self):
+        self.registry = CommandRegistry()
+        self.registry.register("send email", lambda **values: values,
+                               (Argument("recipient"), Argument("subject"), Argument("body", rest=True)))
+        self.registry.register("read emails", lambda **values: values,
+                               (Argument("limit", int, required=False, default=5),))
+        self.registry.register("read", lambda **values: values, (Argument("uid", int),))
+        self.registry.register("sort", lambda **values: values,
+                               (Argument("key", choices=("date", "size")),))
+
+    def parse(self, command_line):
+        spec, values = self.registry.parse(command_line)
+        return spec.name, values
+
+    def assertParseError(self, command_line, code):
+        with self.assertRaises(CommandParseError) as context:
+            self.registry.parse(command_line)
+        self.assertEqual(context.exception.code, code)
+
+    def test_plain_words(self):
+        self.assertEqual(self.parse("send email a@b.c Hello Some body text"),
+                         ("send email", {'recipient': 'a@b.c', 'subject': 'Hello', 'body': 'Some body text'}))
+
+    def test_longest_command_name_wins(self):
+        self.assertEqual(self.parse("read emails 10"), ("read emails", {'limit': 10}))
+        self.assertEqual(self.parse("read 42"), ("read", {'uid': 42}))
+
+    def test_command_name_is_case_insensitive(self):
+        self.assertEqual(self.parse("SEND Email a@b.c Hi there")[0], "send email")
+
+    def test_double_quotes_group_words(self):
+        _, values = self.parse('send email a@b.c "Two words" Body')
+        self.assertEqual(values['subject'], 'Two words')
+        self.assertEqual(values['body'], 'Body')
+
+    def test_escaped_quote_inside_double_quotes(self):
+        _, values = self.parse(r'send email a@b.c "Say \"hi\"" Body')
+        self.assertEqual(values['subject'], 'Say "hi"')
+
+    def test_single_quotes_group_words(self):
+        _, values = self.parse("send email a@b.c 'Two words' Body")
+        self.assertEqual(values['subject'], 'Two words')
+
+    def test_rest_argument_keeps_spaces_and_quotes(self):
+        _, values = self.parse('send email a@b.c Hi  "quoted" and   spaced')
+        self.assertEqual(values['body'], '"quoted" and   spaced')
+
+    def test_rest_argument_single_quoted_token_is_unquoted(self):
+        _, values = self.parse('send email a@b.c Hi "Only this"')
+        self.assertEqual(values['body'], 'Only this')
+
+    def test_optional_argument_default(self):
+        self.assertEqual(self.parse("read emails"), ("read emails", {'limit': 5}))
+
+    def test_unknown_command(self):
+        self.assertParseError("frobnicate now", 'UNKNOWN_COMMAND')
+        self.assertParseError("", 'UNKNOWN_COMMAND')
+
+    def test_missing_argument(self):
+        self.assertParseError("send email a@b.c", 'MISSING_ARGUMENT')
+
+    def test_unexpected_argument(self):
+        self.assertParseError("read 1 2", 'UNEXPECTED_ARGUMENT')
+
+    def test_unterminated_quote(self):
+        self.assertParseError('send email a@b.c "Unterminated subject', 'SYNTAX')
+
+    def test_invalid_type(self):
+        self.assertParseError("read abc", 'INVALID_ARGUMENT')
+
+    def test_invalid_choice(self):
+        self.assertParseError("sort sender", 'INVALID_ARGUMENT')
+        self.assertEqual(self.parse("sort size"), ("sort", {'key': 'size'}))
+
+    def test_parent_registry_is_consulted(self):
+        child = CommandRegistry(parent=self.registry)
+        child.register("server stats", lambda: "stats")
+        self.assertEqual(child.parse("read emails 3")[0].name, "read emails")
+        self.assertEqual(child.dispatch("server stats"), "stats")
+
+    def test_dispatch_reports_errors(self):
+        self.assertEqual(self.registry.dispatch("read abc"),
+                         "ERROR INVALID_ARGUMENT: 'abc' is not a valid uid for 'read'.")
+        self.registry.register("fail", lambda: 1 / 0)
+        result = self.registry.execute("fail")
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['error']['code'], 'COMMAND_FAILED')
+
+
+if __name__ == "__main__":
+    unittest.main()
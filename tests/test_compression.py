@@ -0,0 +1,174 @@
+import socket
+import threading
+import unittest
+import zlib
+
+from cur.benchmarks.pop3_vs_imap import PlainIMAPSession, make_messages
+from cur.common.compression import CompressedSocket, CompressionStats, StreamDecompressor, create_codec
+from cur.common.framing import read_response
+from cur.server.core.server_start import EmailServer
+from cur.server.modules.pools.pool import ClientConnection, ConnectionPoller, HandlerPool
+from tests.stand_in import StandInFolderServer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def zlib_stream(data, wbits=zlib.MAX_WBITS):
+    """
+    Compresses data the way CompressedSocket does, flushed to a block boundary.
+    """
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class StreamDecompressorTest(unittest.TestCase):
+    """
+    Tests that StreamDecompressor never expands more than 'max_length' bytes at a time.
+    """
+
+    def drain(self, decompressor, data, max_length):
+        chunks = [decompressor.decompress(data, max_length)]
+        while decompressor.has_pending():
+            chunks.append(decompressor.decompress(b'', max_length))
+        return chunks
+
+    def check_codec(self, codec, slack=0):
+        compress, decompressor = create_codec(codec)
+        payload = b'0123456789' * 100_000
+        chunks = self.drain(decompressor, compress(payload), 65536)
+        self.assertEqual(b''.join(chunks), payload)
+        self.assertLessEqual(max(map(len, chunks)), 65536 + slack)
+        self.assertFalse(decompressor.has_pending())
+
+    def test_zlib_and_deflate_are_bounded(self):
+        self.check_codec('zlib')
+        self.check_codec('deflate')
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_is_bounded(self):
+        self.check_codec('zstd')
+
+    def test_unbounded_decompression(self):
+        decompressor = StreamDecompressor('zlib')
+        self.assertEqual(decompressor.decompress(zlib_stream(b'x' * 200_000)), b'x' * 200_000)
+        self.assertFalse(decompressor.has_pending())
+
+
+class CompressedSocketTest(unittest.TestCase):
+    """
+    Tests that CompressedSocket round-trips data and keeps decompressed output bounded.
+    """
+
+    def setUp(self):
+        self.left, self.right = socket.socketpair()
+        self.addCleanup(self.left.close)
+        self.addCleanup(self.right.close)
+        self.right.settimeout(5)
+
+    def test_round_trip(self):
+        sender, receiver = CompressedSocket(self.left, 'zlib'), CompressedSocket(self.right, 'zlib')
+        sender.sendall(b'hello ' * 1000)
+        received = b''
+        while len(received) < 6000:
+            received += receiver.recv(4096)
+        self.assertEqual(received, b'hello ' * 1000)
+        self.assertFalse(receiver.pending())
+        self.assertGreater(receiver.stats.raw_in, receiver.stats.wire_in)
+
+    def test_compression_bomb_is_read_in_bounded_steps(self):
+        # About 60 KB on the wire, 60 MB once decompressed.
+        bomb = zlib_stream(b'\0' * 60_000_000)
+        self.assertLess(len(bomb), 100_000)
+        receiver = CompressedSocket(self.right, 'zlib')
+        threading.Thread(target=self.left.sendall, args=(bomb,), daemon=True).start()
+
+        data = receiver.recv(65536)
+        self.assertEqual(data, b'\0' * 65536)
+        self.assertTrue(receiver.pending())
+        self.assertLessEqual(receiver.stats.raw_in, 65536)
+
+
+class CompressedRequestTest(unittest.TestCase):
+    """
+    Tests the server's handling of compressed requests: the size limit and data left in the decompressor.
+    """
+
+    def setUp(self):
+        self.server = EmailServer('127.0.0.1', 0, 'gmail', 'user@example.com', 'password',
+                                  warm_up=False, read_timeout=1, max_request_size=1 << 18)
+        self.server_socket, self.client_socket = socket.socketpair()
+        self.addCleanup(self.client_socket.close)
+        self.addCleanup(self.server_socket.close)
+        self.client_socket.settimeout(5)
+        self.client = CompressedSocket(self.client_socket, 'zlib')
+        self.buffer = bytearray()
+
+    def receive(self):
+        return read_response(self.client, self.buffer)
+
+    def test_oversized_batch_is_refused(self):
+        server_socket = CompressedSocket(self.server_socket, 'zlib')
+        request = b"BATCH 1000000\n" + b"server stats\n" * 1_000_000
+        threading.Thread(target=self.client_socket.sendall, args=(zlib_stream(request),), daemon=True).start()
+        self.assertIsNone(self.server.serve_request(server_socket))
+        self.assertTrue(self.receive().startswith("ERROR REQUEST_TOO_LARGE"))
+
+    def test_data_left_in_decompressor_is_served(self):
+        self.server.pool = HandlerPool(2, 4)
+        self.server.poller = ConnectionPoller(self.server._submit_request, idle_timeout=5)
+        self.server.poller.watch(ClientConnection(self.server_socket, ('127.0.0.1', 1)))
+
+        self.client_socket.sendall(b"COMPRESS zlib")
+        self.assertEqual(read_response(self.client_socket, self.buffer), "COMPRESS zlib")
+        # One read returns 64 KB; the rest stays in the decompressor, where the poller cannot see it.
+        self.client_socket.sendall(zlib_stream(b"server stats" + b" " * 70_000))
+        self.assertIn("Timeouts: 0 idle", self.receive())
+        self.assertIn("UNKNOWN_COMMAND", self.receive())
+
+
+class IMAPCompressionTest(unittest.TestCase):
+    """
+    Tests COMPRESS=DEFLATE (RFC 4978) negotiation of IMAPSession.
+    """
+
+    def session(self, server):
+        session = PlainIMAPSession('127.0.0.1', server.port)
+        self.addCleanup(session.logout)
+        session.login('user@example.com', 'password')
+        return session
+
+    def test_compressed_fetch(self):
+        messages = make_messages(3, 4000)
+        server = StandInFolderServer(messages, compress=True, idle=True)
+        session = self.session(server)
+        stats = CompressionStats()
+        self.assertTrue(session.enable_compression(stats))
+        self.assertTrue(session.enable_compression(stats))
+
+        session.select('inbox')
+        typ, data = session.uid('fetch', '1:3', '(BODY.PEEK[])')
+        self.assertEqual(typ, 'OK')
+        self.assertEqual([item[1] for item in data if isinstance(item, tuple)], messages)
+        self.assertGreater(stats.raw_in, 3 * 4000)
+        self.assertLess(stats.wire_in, stats.raw_in / 4)
+        self.assertGreater(stats.wire_out, 0)
+
+        # Unsolicited responses arrive compressed too.
+        session.idle_start()
+        server.deliver(messages[0])
+        self.assertTrue(session.idle_wait(5))
+        session.idle_done()
+        self.assertEqual(session.pop_exists(), 4)
+
+    def test_not_negotiated_without_capability(self):
+        session = self.session(StandInFolderServer(make_messages(1, 100)))
+        self.assertFalse(session.enable_compression())
+        self.assertIsNone(session.compression_stats)
+        self.assertEqual(session.select('inbox')[0], 'OK')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import threading
+import unittest
+
+from cur.server.modules.envelopes.envelope import EnvelopeStore, StringPool, parse_header_fields
+
+
+class EnvelopeStoreTest(unittest.TestCase):
+    """
+    Tests for EnvelopeStore queries: retain, filter, sort and page.
+    """
+
+    def setUp(self):
+        self.store = EnvelopeStore()
+        rows = [(1, 500.0, 10, 'alice@example.com', 'Invoice March'),
+                (2, 100.0, 30, 'Bob <bob@example.com>', 'lunch?'),
+                (3, 400.0, 20, 'alice@example.com', 'Meeting notes'),
+                (5, 300.0, 50, 'carol@example.com', 'invoice April'),
+                (8, 200.0, 40, 'bob@example.com', 'Meeting moved')]
+        for row in rows:
+            self.store.append(*row)
+
+    def uids(self, envelopes):
+        return [envelope.uid for envelope in envelopes]
+
+    def test_strings_are_interned(self):
+        self.assertEqual(self.store.sender_ids[0], self.store.sender_ids[2])
+        self.assertEqual(len(self.store.strings), 9)
+
+    def test_retain_drops_missing_uids(self):
+        self.store.retain([1, 3, 8, 99])
+        self.assertEqual(list(self.store.uids), [1, 3, 8])
+        self.assertEqual(list(self.store.sizes), [10, 20, 40])
+        self.assertEqual(self.store[1].subject, 'Meeting notes')
+        self.assertEqual(self.store.index_of(8), 2)
+        self.assertIsNone(self.store.index_of(5))
+
+    def test_retain_all_and_none(self):
+        self.store.retain([1, 2, 3, 5, 8])
+        self.assertEqual(len(self.store), 5)
+        self.store.retain([])
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.page(), [])
+
+    def test_page_by_uid(self):
+        self.assertEqual(self.uids(self.store.page(0, 2)), [1, 2])
+        self.assertEqual(self.uids(self.store.page(3, 2)), [5, 8])
+        self.assertEqual(self.uids(self.store.page(4, 10)), [8])
+        self.assertEqual(self.uids(self.store.page(1, 2, reverse=True)), [5, 3])
+        self.assertEqual(self.store.page(10, 2), [])
+
+    def test_page_by_other_columns(self):
+        self.assertEqual(self.uids(self.store.page(0, 3, key='date', reverse=True)), [1, 3, 5])
+        self.assertEqual(self.uids(self.store.page(1, 2, key='size')), [3, 2])
+        self.assertEqual(self.uids(self.store.page(0, 5, key='subject')), [5, 1, 2, 8, 3])
+
+    def test_page_of_filtered_rows(self):
+        rows = self.store.filter(text='invoice')
+        self.assertEqual(self.uids(self.store.page(0, 10, key='date', reverse=True, indices=rows)), [1, 5])
+        self.assertEqual(self.uids(self.store.page(1, 10, key='date', indices=rows)), [1])
+
+    def test_filter(self):
+        self.assertEqual(list(self.store.filter(sender='ALICE')), [0, 2])
+        self.assertEqual(list(self.store.filter(subject='meeting', max_size=20)), [2])
+        self.assertEqual(list(self.store.filter(text='bob', since=150.0)), [4])
+        self.assertEqual(list(self.store.filter(min_size=30, until=300.0)), [1, 3, 4])
+        self.assertEqual(list(self.store.filter(text='nothing')), [])
+
+    def test_sort(self):
+        self.assertEqual(list(self.store.sort(key='sender')), [0, 2, 1, 4, 3])
+        self.assertEqual(list(self.store.sort(self.store.filter(sender='bob'), key='size', reverse=True)), [4, 1])
+
+    def test_clear(self):
+        self.store.clear(uid_validity=7)
+        self.assertEqual((len(self.store), self.store.uid_validity, len(self.store.strings)), (0, 7, 0))
+
+    def test_concurrent_appends(self):
+        store = EnvelopeStore()
+
+        def append(start):
+            for uid in range(start, start + 1000):
+                store.append(uid, 0.0, 0, f"sender {uid % 7}", "subject")
+
+        threads = [threading.Thread(target=append, args=(start,)) for start in range(0, 4000, 1000)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(store.uids), list(range(4000)))
+        self.assertEqual(len(store.strings), 8)
+        self.assertTrue(all(store[index].sender == f"sender {store.uids[index] % 7}" for index in range(4000)))
+
+
+class StringPoolTest(unittest.TestCase):
+    """
+    Tests for StringPool.
+    """
+
+    def test_intern(self):
+        pool = StringPool()
+        self.assertEqual([pool.intern(text) for text in ('A', 'b', 'A', '', 'Їжак')], [0, 1, 0, 2, 3])
+        self.assertEqual([pool[string_id] for string_id in range(len(pool))], ['A', 'b', '', 'Їжак'])
+
+    def test_table_grows(self):
+        pool = StringPool()
+        texts = [f"string {number}" for number in range(5 * StringPool.INITIAL_TABLE_SIZE)]
+        self.assertEqual([pool.intern(text) for text in texts], list(range(len(texts))))
+        self.assertEqual([pool.intern(text) for text in reversed(texts)], list(reversed(range(len(texts)))))
+        self.assertEqual(pool[1234], "string 1234")
+
+    def test_find_ignores_case(self):
+        pool = StringPool()
+        for text in ('Hello', 'WORLD', 'Привіт, Світе', 'low', ''):
+            pool.intern(text)
+        self.assertEqual(pool.find('hello'), {0})
+        self.assertEqual(pool.find('O'), {0, 1, 3})
+        self.assertEqual(pool.find('світе'), {2})
+        self.assertEqual(pool.find('a.c'), set())
+        self.assertEqual(pool.find(''), {0, 1, 2, 3, 4})
+
+    def test_find_skips_matches_across_strings(self):
+        pool = StringPool()
+        for text in ('abc', 'def', 'cdx', 'xcd'):
+            pool.intern(text)
+        # 'abc' + 'def' contains 'cd', but neither string does on its own.
+        self.assertEqual(pool.find('cd'), {2, 3})
+
+    def test_ranks_follow_new_strings(self):
+        pool = StringPool()
+        for text in ('b', 'C', 'a'):
+            pool.intern(text)
+        self.assertEqual(list(pool.ranks()), [1, 2, 0])
+        pool.intern('B0')
+        self.assertEqual(list(pool.ranks()), [1, 3, 0, 2])
+
+
+class ParseHeaderFieldsTest(unittest.TestCase):
+    """
+    Tests for parse_header_fields.
+    """
+
+    def test_folded_and_encoded_fields(self):
+        header = b'From: =?utf-8?b?0IbQstCw0L0=?= <ivan@example.com>\r\nSubject: Long\r\n subject\r\n\r\n'
+        self.assertEqual(parse_header_fields(header),
+                         {'from': 'Іван <ivan@example.com>', 'subject': 'Long subject'})
+
+    def test_empty_header(self):
+        self.assertEqual(parse_header_fields(None), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
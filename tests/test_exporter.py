@@ -0,0 +1,161 @@
+import contextlib
+import gzip
+import io
+import json
+import mailbox
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cur.benchmarks.pop3_vs_imap import StandInIMAPServer, make_messages
+from cur.server.modules.builders.builder import MailProcessor
+from cur.server.modules.exporters.exporter import MailboxExporter, MboxWriter
+from tests.stand_in import make_manager
+
+
+class MailboxExporterResumeTest(unittest.TestCase):
+    """
+    Tests that an interrupted export resumes after the last completed batch.
+    """
+
+    def setUp(self):
+        self.manager = make_manager(StandInIMAPServer(make_messages(7, 300), latency=0))
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def interrupted_export(self, path, failing_uid):
+        """
+        Runs an export whose connection is lost while writing 'failing_uid'.
+        """
+        original_write = MboxWriter.write
+
+        def write(writer, uid, data, internal_date=None):
+            if uid == failing_uid:
+                raise ConnectionError("connection lost")
+            original_write(writer, uid, data, internal_date)
+
+        with mock.patch.object(MboxWriter, 'write', write):
+            with self.assertRaises(ConnectionError):
+                MailboxExporter(self.manager, 'inbox', path, batch_size=3).export()
+        with open(path + MailboxExporter.CHECKPOINT_SUFFIX) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def subjects(self, path):
+        return [message['Subject'] for message in mailbox.mbox(path)]
+
+    def test_unfinished_batch_is_discarded(self):
+        path = os.path.join(self.directory.name, 'inbox.mbox')
+        checkpoint = self.interrupted_export(path, failing_uid=5)
+        self.assertEqual((checkpoint['last_uid'], checkpoint['messages']), (3, 3))
+        self.assertEqual(os.path.getsize(path), checkpoint['offset'])
+
+    def test_resume_after_truncation(self):
+        path = os.path.join(self.directory.name, 'inbox.mbox')
+        checkpoint = self.interrupted_export(path, failing_uid=5)
+        # A crash in the middle of a batch leaves a partial message after the checkpoint offset.
+        with open(path, 'ab') as mbox_file:
+            mbox_file.write(b'From MAILER-DAEMON Thu Jan  1 00:00:00 2024\nSubject: partial\n\nTrunc')
+        self.assertGreater(os.path.getsize(path), checkpoint['offset'])
+
+        stats = MailboxExporter(self.manager, 'inbox', path, batch_size=3).export()
+        self.assertEqual(stats['messages'], 4)
+        self.assertEqual(self.subjects(path), [f"Message {number}" for number in range(1, 8)])
+
+        stats = MailboxExporter(self.manager, 'inbox', path, batch_size=3).export()
+        self.assertEqual(stats['messages'], 0)
+        self.assertEqual(len(self.subjects(path)), 7)
+
+    def test_resume_gzip_after_truncation(self):
+        path = os.path.join(self.directory.name, 'inbox.mbox.gz')
+        self.interrupted_export(path, failing_uid=4)
+        with open(path, 'ab') as mbox_file:
+            mbox_file.write(b'\x1f\x8b\x08\x00 broken gzip member')
+
+        MailboxExporter(self.manager, 'inbox', path, batch_size=3).export()
+        with gzip.open(path) as mbox_file:
+            content = mbox_file.read()
+        self.assertEqual(content.count(b'\nFrom MAILER-DAEMON ') + content.startswith(b'From MAILER-DAEMON '), 7)
+        for number in range(1, 8):
+            self.assertEqual(content.count(f"Subject: Message {number}\n".encode('ascii')), 1)
+
+
+class MailboxExporterOverwriteTest(unittest.TestCase):
+    """
+    Tests that an export never destroys an archive it did not start.
+    """
+
+    def setUp(self):
+        self.manager = make_manager(StandInIMAPServer(make_messages(3, 300), latency=0))
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        output = contextlib.redirect_stdout(io.StringIO())
+        output.__enter__()
+        self.addCleanup(output.__exit__, None, None, None)
+
+    def existing_file(self, name, content=b'From someone\nSubject: keep me\n\nbody\n'):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as existing:
+            existing.write(content)
+        return path
+
+    def test_existing_mbox_without_checkpoint_is_refused(self):
+        for name in ('inbox.mbox', 'inbox.mbox.gz'):
+            path = self.existing_file(name)
+            with self.assertRaises(FileExistsError):
+                MailboxExporter(self.manager, 'inbox', path).export()
+            with open(path, 'rb') as existing:
+                self.assertEqual(existing.read(), b'From someone\nSubject: keep me\n\nbody\n')
+
+    def test_existing_maildir_without_checkpoint_is_refused(self):
+        path = os.path.join(self.directory.name, 'inbox')
+        os.makedirs(os.path.join(path, 'cur'))
+        with self.assertRaises(FileExistsError):
+            MailboxExporter(self.manager, 'inbox', path).export()
+        self.assertEqual(os.listdir(path), ['cur'])
+
+    def test_empty_file_and_explicit_overwrite_are_allowed(self):
+        path = self.existing_file('empty.mbox', b'')
+        self.assertEqual(MailboxExporter(self.manager, 'inbox', path).export()['messages'], 3)
+        path = self.existing_file('inbox.mbox')
+        self.assertEqual(MailboxExporter(self.manager, 'inbox', path, overwrite=True).export()['messages'], 3)
+        self.assertEqual(len(mailbox.mbox(path)), 3)
+
+    def test_archive_shorter_than_checkpoint_is_refused(self):
+        path = self.existing_file('inbox.mbox')
+        exporter = MailboxExporter(self.manager, 'inbox', path)
+        exporter.save_checkpoint({'uid_validity': 1, 'last_uid': 2, 'offset': 10_000, 'messages': 2})
+        with self.assertRaises(ValueError):
+            exporter.export()
+        self.assertEqual(os.path.getsize(path), 36)
+
+
+class ExportPathTest(unittest.TestCase):
+    """
+    Tests that 'export mailbox' only writes inside the export directory.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.export_dir = os.path.join(self.directory.name, 'exports')
+        manager = make_manager(StandInIMAPServer(make_messages(2, 300), latency=0))
+        self.processor = MailProcessor(manager, self.export_dir)
+
+    def interpret(self, command):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.processor.interpret(command)
+
+    def test_file_name_is_resolved_inside_export_directory(self):
+        self.assertTrue(self.interpret("export mailbox inbox inbox.mbox").startswith("Exported 2 emails"))
+        self.assertEqual(sorted(os.listdir(self.export_dir)), ['inbox.mbox', 'inbox.mbox.checkpoint'])
+
+    def test_paths_outside_export_directory_are_refused(self):
+        outside = os.path.join(self.directory.name, 'outside.mbox')
+        for path in (outside, '../outside.mbox', 'sub/inbox.mbox', '..'):
+            self.assertTrue(self.interpret(f"export mailbox inbox {path}").startswith("Error:"), path)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import socket
+import threading
+import unittest
+
+from cur.common.framing import encode_response, read_response
+from cur.server.core.server_start import EmailServer
+
+
+class ResponseFramingTest(unittest.TestCase):
+    """
+    Tests that responses are framed with their length and read whole.
+    """
+
+    def setUp(self):
+        self.server_socket, self.client_socket = socket.socketpair()
+        self.addCleanup(self.client_socket.close)
+        self.addCleanup(self.server_socket.close)
+        self.client_socket.settimeout(5)
+
+    def test_encode(self):
+        self.assertEqual(encode_response("hello"), b"5\nhello")
+        self.assertEqual(encode_response("é"), b"2\n\xc3\xa9")
+
+    def test_consecutive_responses_stay_apart(self):
+        self.server_socket.sendall(encode_response("first") + encode_response("") + encode_response("third"))
+        buffer = bytearray()
+        self.assertEqual(read_response(self.client_socket, buffer), "first")
+        self.assertEqual(read_response(self.client_socket, buffer), "")
+        self.assertEqual(read_response(self.client_socket, buffer), "third")
+        self.assertEqual(buffer, b"")
+
+    def test_closed_connection(self):
+        self.server_socket.sendall(b"10\nshort")
+        self.server_socket.shutdown(socket.SHUT_WR)
+        with self.assertRaises(ConnectionError):
+            read_response(self.client_socket, bytearray())
+
+    def test_malformed_header(self):
+        self.server_socket.sendall(b"not a length\n")
+        with self.assertRaises(ConnectionError):
+            read_response(self.client_socket, bytearray())
+
+    def test_long_response_over_connection(self):
+        server = EmailServer('127.0.0.1', 0, 'gmail', 'user@example.com', 'password', warm_up=False)
+        thread = threading.Thread(target=server.handle_client, args=(self.server_socket, ('127.0.0.1', 1)))
+        thread.start()
+        self.client_socket.sendall(b"BATCH 2000\n" + b"server stats\n" * 2000)
+        buffer = bytearray()
+        response = read_response(self.client_socket, buffer)
+        self.assertGreater(len(response), 65536)
+        self.assertEqual(len(json.loads(response)), 2000)
+        self.client_socket.sendall(b"server stats")
+        self.assertIn("Timeouts:", read_response(self.client_socket, buffer))
+        self.client_socket.shutdown(socket.SHUT_WR)
+        thread.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
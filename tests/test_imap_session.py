@@ -0,0 +1,35 @@
+import unittest
+
+from cur.benchmarks.pop3_vs_imap import PlainIMAPSession, make_messages
+from tests.stand_in import StandInFolderServer
+
+
+class CapabilityRefreshTest(unittest.TestCase):
+    """
+    Tests that IMAPSession.login replaces the capabilities announced before login.
+    """
+
+    def login(self, server):
+        session = PlainIMAPSession('127.0.0.1', server.port)
+        self.addCleanup(session.logout)
+        self.assertFalse(session.supports('IDLE'))
+        session.login('user@example.com', 'password')
+        return session
+
+    def test_capabilities_requested_after_login(self):
+        session = self.login(StandInFolderServer(make_messages(1, 100), uidplus=True, idle=True))
+        self.assertTrue(session.supports('IDLE'))
+        self.assertIn('UIDPLUS', session.capabilities)
+
+    def test_capabilities_taken_from_login_response_code(self):
+        session = self.login(StandInFolderServer(make_messages(1, 100), idle=True, login_code=True))
+        self.assertTrue(session.supports('IDLE'))
+        self.assertNotIn('CAPABILITY', session.untagged_responses)
+
+    def test_capabilities_unchanged_without_new_ones(self):
+        session = self.login(StandInFolderServer(make_messages(1, 100)))
+        self.assertEqual(session.capabilities, ('IMAP4REV1',))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import unittest
+
+from cur.benchmarks.pop3_vs_imap import make_messages
+from tests.stand_in import StandInFolderServer, make_manager
+
+
+class MoveEmailsTest(unittest.TestCase):
+    """
+    Tests that MailManager only removes emails from the inbox after they were copied.
+    """
+
+    def move(self, server, moves):
+        manager = make_manager(server)
+        with contextlib.redirect_stdout(io.StringIO()), manager.open_imap_session() as session:
+            session.select('inbox')
+            manager._move_uids(session, moves)
+
+    def test_move_to_existing_folder(self):
+        server = StandInFolderServer(make_messages(5, 100), folders=('Work',))
+        self.move(server, {'Work': [1, 2, 3]})
+        self.assertEqual(server.folders['Work'], [1, 2, 3])
+        self.assertEqual(sorted(server.messages), [4, 5])
+
+    def test_missing_folder_is_created(self):
+        server = StandInFolderServer(make_messages(5, 100))
+        self.move(server, {'Work': [2], 'Personal': [4, 5]})
+        self.assertEqual(server.folders, {'Work': [2], 'Personal': [4, 5]})
+        self.assertEqual(sorted(server.messages), [1, 3])
+
+    def test_copy_retried_after_trycreate(self):
+        server = StandInFolderServer(make_messages(3, 100), listed=('Work',))
+        self.move(server, {'Work': [1]})
+        self.assertEqual(server.folders['Work'], [1])
+        self.assertEqual(sorted(server.messages), [2, 3])
+
+    def test_nothing_deleted_if_folder_cannot_be_created(self):
+        server = StandInFolderServer(make_messages(3, 100), create_fails=True)
+        self.move(server, {'Work': [1, 2]})
+        self.assertEqual((server.deleted, sorted(server.messages)), (set(), [1, 2, 3]))
+
+    def test_nothing_deleted_if_copy_fails(self):
+        server = StandInFolderServer(make_messages(3, 100), folders=('Work',), copy_fails=True)
+        self.move(server, {'Work': [1, 2]})
+        self.assertEqual((server.deleted, sorted(server.messages)), (set(), [1, 2, 3]))
+
+    def test_failed_folder_does_not_affect_others(self):
+        server = StandInFolderServer(make_messages(4, 100), folders=('Work',), listed=('Ghost',),
+                                     create_fails=True)
+        self.move(server, {'Ghost': [1], 'Work': [2, 3]})
+        self.assertEqual(server.folders['Work'], [2, 3])
+        self.assertEqual(sorted(server.messages), [1, 4])
+
+    def test_uidplus_expunges_only_moved_emails(self):
+        server = StandInFolderServer(make_messages(4, 100), folders=('Work',), uidplus=True)
+        server.deleted.add(4)
+        self.move(server, {'Work': [1, 2]})
+        self.assertEqual(sorted(server.messages), [3, 4])
+        self.assertEqual(server.deleted, {4})
+
+
+if __name__ == "__main__":
+    unittest.main()
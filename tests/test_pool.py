@@ -0,0 +1,95 @@
+import socket
+import threading
+import time
+import unittest
+
+from cur.server.modules.pools.pool import ClientConnection, ConnectionPoller, HandlerPool, InFlightLimiter
+
+
+class HandlerPoolTest(unittest.TestCase):
+    """
+    Tests for HandlerPool admission and expiry of queued tasks.
+    """
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def block(self, queued_seconds):
+        self.release.wait(5)
+
+    def test_tasks_run_with_their_arguments(self):
+        pool = HandlerPool(workers=2, backlog=2)
+        done = threading.Event()
+        results = []
+        self.assertTrue(pool.submit(lambda queued_seconds, value: (results.append(value), done.set()), 42))
+        self.assertTrue(done.wait(5))
+        self.assertEqual(results, [42])
+
+    def test_rejects_when_workers_busy_and_queue_full(self):
+        pool = HandlerPool(workers=1, backlog=1)
+        self.assertTrue(pool.submit(self.block))
+        self.assertTrue(pool.submit(self.block))
+        self.assertFalse(pool.submit(self.block))
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_idle_workers_count_as_capacity(self):
+        pool = HandlerPool(workers=3, backlog=0)
+        self.assertTrue(all(pool.submit(self.block) for _ in range(3)))
+        self.assertFalse(pool.submit(self.block))
+
+    def test_queued_tasks_expire_on_time(self):
+        pool = HandlerPool(workers=1, backlog=1, max_wait=0.2)
+        expired = threading.Event()
+        ran = []
+        pool.submit(self.block)
+        start = time.monotonic()
+        pool.submit(lambda queued_seconds: ran.append(True), on_expired=expired.set)
+        self.assertTrue(expired.wait(5))
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.release.set()
+        time.sleep(0.1)
+        self.assertEqual((ran, pool.stats()['expired']), ([], 1))
+
+
+class InFlightLimiterTest(unittest.TestCase):
+    """
+    Tests for InFlightLimiter.
+    """
+
+    def test_limit_per_client(self):
+        limiter = InFlightLimiter(limit=2)
+        self.assertTrue(limiter.acquire('a'))
+        self.assertTrue(limiter.acquire('a'))
+        self.assertFalse(limiter.acquire('a'))
+        self.assertTrue(limiter.acquire('b'))
+        limiter.release('a')
+        self.assertTrue(limiter.acquire('a'))
+        self.assertEqual((limiter.in_flight(), limiter.rejected), (3, 1))
+
+
+class ConnectionPollerTest(unittest.TestCase):
+    """
+    Tests for ConnectionPoller.
+    """
+
+    def test_readable_and_idle_connections(self):
+        readable, idle = [], []
+        poller = ConnectionPoller(readable.append, idle_timeout=0.3, on_idle=idle.append)
+        busy_server, busy_client = socket.socketpair()
+        idle_server, idle_client = socket.socketpair()
+        self.addCleanup(lambda: [sock.close() for sock in (busy_server, busy_client, idle_server, idle_client)])
+        busy, silent = ClientConnection(busy_server, ('127.0.0.1', 1)), ClientConnection(idle_server)
+        poller.watch(busy)
+        poller.watch(silent)
+        busy_client.sendall(b'server stats')
+        deadline = time.monotonic() + 5
+        while not (readable and idle) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual((readable, idle), ([busy], [silent]))
+        self.assertEqual(poller.watched(), 0)
+        self.assertEqual(busy.client, '127.0.0.1')
+
+
+if __name__ == "__main__":
+    unittest.main()
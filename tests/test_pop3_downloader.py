@@ -0,0 +1,105 @@
+import contextlib
+import io
+import mailbox
+import os
+import tempfile
+import unittest
+
+from cur.benchmarks.pop3_vs_imap import BenchmarkPop3Downloader, StandInIMAPServer, StandInPOP3Server, make_messages
+from cur.server.modules.builders.builder import MailProcessor
+from cur.server.modules.providers.provider import MailServiceProvider
+from tests.stand_in import make_manager
+
+
+class Pop3DownloaderTest(unittest.TestCase):
+    """
+    Tests that Pop3Downloader skips recorded UIDLs, pipelines commands and keeps foreign archives intact.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'inbox.mbox')
+        output = contextlib.redirect_stdout(io.StringIO())
+        output.__enter__()
+        self.addCleanup(output.__exit__, None, None, None)
+
+    def download(self, server, delete=False, batch_size=200):
+        provider = MailServiceProvider('127.0.0.1', 25, '127.0.0.1', '127.0.0.1')
+        downloader = BenchmarkPop3Downloader(provider, 'user@example.com', 'password', self.path, delete,
+                                             batch_size=batch_size)
+        downloader.port = server.port
+        return downloader.download()
+
+    def subjects(self):
+        return [message['Subject'] for message in mailbox.mbox(self.path)]
+
+    def test_recorded_uidls_are_skipped(self):
+        server = StandInPOP3Server(make_messages(5, 200), latency=0)
+        self.assertEqual(self.download(server, batch_size=2)['messages'], 5)
+        server.messages.update(enumerate(make_messages(7, 200)[5:], start=6))
+
+        stats = self.download(server, batch_size=2)
+        self.assertEqual((stats['messages'], stats['skipped']), (2, 5))
+        self.assertEqual(self.subjects(), [f"Message {number}" for number in range(1, 8)])
+
+    def test_recorded_messages_are_deleted(self):
+        server = StandInPOP3Server(make_messages(3, 200), latency=0)
+        self.assertEqual(self.download(server)['deleted'], 0)
+        stats = self.download(server, delete=True)
+        self.assertEqual((stats['messages'], stats['deleted']), (0, 3))
+
+    def test_pipelining_saves_round_trips(self):
+        messages = make_messages(20, 200)
+        pipelined = self.download(StandInPOP3Server(messages, latency=0.02, pipelining=True))
+        os.remove(self.path)
+        os.remove(self.path + BenchmarkPop3Downloader.STATE_SUFFIX)
+        sequential = self.download(StandInPOP3Server(messages, latency=0.02, pipelining=False))
+
+        self.assertTrue(pipelined['pipelining'])
+        self.assertFalse(sequential['pipelining'])
+        # Every RETR waits for its own round trip without pipelining.
+        self.assertGreaterEqual(sequential['seconds'], 20 * 0.02)
+        self.assertLess(pipelined['seconds'], sequential['seconds'] / 2)
+
+    def test_archive_without_state_file_is_refused(self):
+        with open(self.path, 'wb') as existing:
+            existing.write(b'From someone\nSubject: keep me\n\nbody\n')
+        server = StandInPOP3Server(make_messages(2, 200), latency=0)
+        with self.assertRaises(FileExistsError):
+            self.download(server)
+        self.assertEqual(self.subjects(), ['keep me'])
+
+
+class Pop3DownloadCommandTest(unittest.TestCase):
+    """
+    Tests that 'pop3 download' stays inside the export directory and never replaces an export.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.export_dir = os.path.join(self.directory.name, 'exports')
+        manager = make_manager(StandInIMAPServer(make_messages(3, 200), latency=0))
+        self.processor = MailProcessor(manager, self.export_dir)
+
+    def interpret(self, command):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.processor.interpret(command)
+
+    def test_download_does_not_wipe_export(self):
+        self.assertTrue(self.interpret("export mailbox inbox x.mbox").startswith("Exported 3 emails"))
+        path = os.path.join(self.export_dir, 'x.mbox')
+        size = os.path.getsize(path)
+        self.assertEqual(self.interpret("pop3 download x.mbox"), "POP3 download failed.")
+        self.assertEqual(os.path.getsize(path), size)
+        self.assertEqual(len(mailbox.mbox(path)), 3)
+
+    def test_paths_outside_export_directory_are_refused(self):
+        for path in (os.path.join(self.directory.name, 'x.mbox'), '../x.mbox', 'sub/x.mbox'):
+            self.assertTrue(self.interpret(f"pop3 download {path}").startswith("Error:"), path)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+
+from cur.server.core.server_start import EmailServer
+from cur.server.modules.profilers.profiler import CallProfiler, SamplingProfiler
+
+
+def busy(seconds):
+    """
+    Keeps the CPU busy for 'seconds'.
+    """
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+    return seconds
+
+
+class CallProfilerTest(unittest.TestCase):
+    """
+    Tests that CallProfiler runs at most one command at a time under cProfile.
+    """
+
+    def test_concurrent_command_runs_unprofiled(self):
+        profiler = CallProfiler()
+        profiler.start()
+        started, release = threading.Event(), threading.Event()
+
+        def held():
+            started.set()
+            release.wait(5)
+            return 'held'
+
+        thread = threading.Thread(target=profiler.profile, args=(held,))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        self.assertEqual(profiler.profile(busy, 0.01), 0.01)
+        release.set()
+        thread.join()
+
+        profiler.stop()
+        self.assertEqual((profiler.commands, profiler.skipped), (1, 1))
+        report = profiler.report()
+        self.assertIn("1 command(s), 1 ran unprofiled", report)
+        self.assertIn("held", report)
+        self.assertNotIn("busy", report)
+
+    def test_inactive_profiler_does_not_profile(self):
+        profiler = CallProfiler()
+        self.assertEqual(profiler.profile(busy, 0), 0)
+        self.assertEqual(profiler.report(), "cProfile: no commands were profiled.")
+
+    def test_write_pstats(self):
+        profiler = CallProfiler()
+        profiler.start()
+        profiler.profile(busy, 0.01)
+        profiler.stop()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'commands.prof')
+            profiler.write(path)
+            functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn('busy', functions)
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    """
+    Tests that SamplingProfiler only samples threads running commands.
+    """
+
+    def test_only_command_threads_are_sampled(self):
+        profiler = SamplingProfiler(interval=0.001)
+        stop_idle = threading.Event()
+        idle = threading.Thread(target=lambda: busy_until(stop_idle))
+        idle.start()
+        profiler.start()
+        try:
+            profiler.profile(busy, 0.2)
+        finally:
+            profiler.stop()
+            stop_idle.set()
+            idle.join()
+
+        functions = {frame for stack in profiler._stacks for frame in stack}
+        self.assertIn('test_profiler.py:busy', functions)
+        self.assertNotIn('test_profiler.py:busy_until', functions)
+        self.assertGreater(profiler.samples, 0)
+
+
+def busy_until(event):
+    """
+    Keeps the CPU busy until 'event' is set, outside of any command.
+    """
+    while not event.is_set():
+        pass
+
+
+class ProfileCommandTest(unittest.TestCase):
+    """
+    Tests the 'profile' and 'memsnap' commands, which write files only inside the profile directory.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.profile_dir = os.path.join(self.directory.name, 'profiles')
+        self.server = EmailServer('127.0.0.1', 0, 'gmail', 'user@example.com', 'password',
+                                  warm_up=False, profile_dir=self.profile_dir)
+
+    def test_cprofile_written_to_profile_directory(self):
+        self.assertEqual(self.server.process_command("profile start cprofile"), "Profiler started (cprofile).")
+        self.server.process_command("server stats")
+        report = self.server.process_command("profile stop commands.prof")
+        self.assertIn("Profile written to", report)
+        self.assertEqual(os.listdir(self.profile_dir), ['commands.prof'])
+
+    def test_paths_outside_profile_directory_are_refused(self):
+        for name in ('../outside.prof', os.path.join(self.directory.name, 'outside.prof'), '..', 'sub/x.prof'):
+            self.server.process_command("profile start")
+            self.assertTrue(self.server.process_command(f"profile stop {name}").startswith("Error:"), name)
+            self.server.process_command("profile stop")
+            self.assertTrue(self.server.process_command(f"memsnap 5 {name}").startswith("Error:"), name)
+        self.server.process_command("memsnap stop")
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_writing_disabled(self):
+        server = EmailServer('127.0.0.1', 0, 'gmail', 'user@example.com', 'password',
+                             warm_up=False, profile_dir=None)
+        self.assertTrue(server.process_command("memsnap 5 snapshot.txt").startswith("Error:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from cur.benchmarks.pop3_vs_imap import StandInIMAPServer, make_messages
+from cur.server.modules.organizers.sharded_fetch import ShardedFetcher, format_uid_sets
+from tests.stand_in import make_manager
+
+
+class ParseFetchResponseTest(unittest.TestCase):
+    """
+    Tests for ShardedFetcher.parse_fetch_response on data shaped like imaplib's.
+    """
+
+    def test_literal_followed_by_closing_paren(self):
+        data = [(b'1 (UID 11 BODY[] {5}', b'Hello'), b')',
+                (b'2 (UID 12 BODY[] {3}', b'Bye'), b')']
+        self.assertEqual(ShardedFetcher.parse_fetch_response(data),
+                         [(11, b'1 (UID 11 BODY[] {5})', b'Hello'),
+                          (12, b'2 (UID 12 BODY[] {3})', b'Bye')])
+
+    def test_items_after_literal_are_appended_to_meta(self):
+        data = [(b'1 (UID 11 BODY[HEADER.FIELDS (FROM)] {9}', b'From: a\r\n'), b' RFC822.SIZE 42)']
+        [(uid, meta, literal)] = ShardedFetcher.parse_fetch_response(data)
+        self.assertEqual(uid, 11)
+        self.assertTrue(meta.endswith(b' RFC822.SIZE 42)'))
+        self.assertEqual(literal, b'From: a\r\n')
+
+    def test_responses_without_literal(self):
+        data = [b'1 (UID 11 FLAGS (\\Seen))', b'2 (FLAGS () UID 12)']
+        self.assertEqual([(uid, literal) for uid, _, literal in ShardedFetcher.parse_fetch_response(data)],
+                         [(11, None), (12, None)])
+
+    def test_mixed_and_empty_items(self):
+        data = [None, (b'1 (UID 11 BODY[] {1}', b'x'), b')', b'2 (UID 12 FLAGS ())', None]
+        self.assertEqual([uid for uid, _, _ in ShardedFetcher.parse_fetch_response(data)], [11, 12])
+
+    def test_records_without_uid_are_skipped(self):
+        self.assertEqual(ShardedFetcher.parse_fetch_response([b'1 (FLAGS (\\Seen))']), [])
+        self.assertEqual(ShardedFetcher.parse_fetch_response([]), [])
+
+
+class FormatUidSetsTest(unittest.TestCase):
+    """
+    Tests for format_uid_sets.
+    """
+
+    def test_ranges_and_single_uids(self):
+        self.assertEqual(list(format_uid_sets([1, 2, 3, 5, 8, 10, 11, 12])), ['1:3,5,8,10:12'])
+
+    def test_unsorted_string_uids(self):
+        self.assertEqual(list(format_uid_sets(['7', '5', '6', '1'])), ['1,5:7'])
+
+    def test_chunks(self):
+        self.assertEqual(list(format_uid_sets(range(1, 8), chunk_size=3)), ['1:3', '4:6', '7'])
+
+    def test_empty(self):
+        self.assertEqual(list(format_uid_sets([])), [])
+
+
+class ShardedFetchTest(unittest.TestCase):
+    """
+    Tests for ShardedFetcher.fetch against the stand-in IMAP server.
+    """
+
+    def setUp(self):
+        self.messages = make_messages(25, 200)
+        self.manager = make_manager(StandInIMAPServer(self.messages, latency=0))
+
+    def test_ordered_fetch_over_several_connections(self):
+        progress = []
+        fetcher = ShardedFetcher(self.manager, 'inbox', connections=3, chunk_size=4, ordered=True,
+                                 progress=lambda *report: progress.append(report))
+        records = list(fetcher.fetch())
+        self.assertEqual([uid for uid, _, _ in records], list(range(1, 26)))
+        self.assertEqual([literal for _, _, literal in records], self.messages)
+        # Every shard reports its own total, and the last report of each shard is complete.
+        last = {shard: (fetched, total) for shard, fetched, total in progress}
+        self.assertEqual(sum(total for _, total in last.values()), 25)
+        self.assertTrue(all(fetched == total for fetched, total in last.values()))
+
+    def test_unordered_fetch_of_selected_uids(self):
+        fetcher = ShardedFetcher(self.manager, 'inbox', connections=2, chunk_size=3)
+        records = list(fetcher.fetch(uids=[2, 3, 4, 10, 20, 21]))
+        self.assertEqual(sorted(uid for uid, _, _ in records), [2, 3, 4, 10, 20, 21])
+
+
+if __name__ == "__main__":
+    unittest.main()
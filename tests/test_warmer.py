@@ -0,0 +1,82 @@
+import contextlib
+import io
+import threading
+import time
+import unittest
+
+from cur.server.modules.connections.warmer import ConnectionWarmer
+
+
+class ConnectionWarmerTest(unittest.TestCase):
+    """
+    Tests that ConnectionWarmer hands out ready sessions once and never makes a command wait.
+    """
+
+    def setUp(self):
+        self.opened = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.closed = []
+        output = contextlib.redirect_stdout(io.StringIO())
+        output.__enter__()
+        self.addCleanup(output.__exit__, None, None, None)
+        self.addCleanup(self.release.set)
+
+    def open_session(self):
+        self.opened.set()
+        self.release.wait(5)
+        return object()
+
+    def start(self, open_session=None, session_ttl=60):
+        targets = {'imap': (('127.0.0.1', 143), open_session or self.open_session, self.closed.append)}
+        return ConnectionWarmer(targets, session_ttl).start()
+
+    def test_session_is_handed_out_once(self):
+        warmer = self.start()
+        self.assertTrue(warmer.wait(5))
+        session = warmer.take('imap')
+        self.assertIsNotNone(session)
+        self.assertIsNone(warmer.take('imap'))
+        self.assertIsNone(warmer.take('smtp'))
+        self.assertIn('imap session', warmer.timings)
+
+    def test_take_does_not_wait_for_warm_up(self):
+        self.release.clear()
+        warmer = self.start()
+        self.assertTrue(self.opened.wait(5))
+        start = time.monotonic()
+        self.assertIsNone(warmer.take('imap'))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        # The session finished later is kept for the next command.
+        self.release.set()
+        self.assertTrue(warmer.wait(5))
+        self.assertIsNotNone(warmer.take('imap'))
+
+    def test_failed_warm_up(self):
+        def fail():
+            raise OSError("connection refused")
+
+        warmer = self.start(fail)
+        self.assertTrue(warmer.wait(5))
+        self.assertIsNone(warmer.take('imap'))
+        self.assertEqual(warmer.errors, {'imap': "connection refused"})
+        self.assertIn("imap failed: connection refused", warmer.report())
+
+    def test_expired_session_is_closed(self):
+        warmer = self.start(session_ttl=0.05)
+        self.assertTrue(warmer.wait(5))
+        time.sleep(0.1)
+        self.assertIsNone(warmer.take('imap'))
+        self.assertEqual(len(self.closed), 1)
+
+    def test_close_closes_sessions_not_taken(self):
+        warmer = self.start()
+        self.assertTrue(warmer.wait(5))
+        warmer.close()
+        self.assertEqual(len(self.closed), 1)
+        self.assertIsNone(warmer.take('imap'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import contextlib
+import io
+import threading
+import unittest
+
+from cur.benchmarks.pop3_vs_imap import BenchmarkMailManager, make_messages
+from cur.server.modules.organizers.watcher import MailboxWatcher
+from tests.stand_in import StandInFolderServer, make_manager
+
+
+class RecordingMailManager(BenchmarkMailManager):
+    """
+    A BenchmarkMailManager that records the UIDs passed for classification instead of moving emails.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.classified = []
+        self.arrived = threading.Event()
+
+    def classify_uids(self, server, uids):
+        self.classified.extend(int(uid) for uid in uids)
+        self.arrived.set()
+
+
+class MailboxWatcherTest(unittest.TestCase):
+    """
+    Tests that MailboxWatcher classifies emails arriving while it idles or polls.
+    """
+
+    def watch(self, server, **kwargs):
+        manager = make_manager(server, RecordingMailManager)
+        watcher = MailboxWatcher(manager, **kwargs)
+        watcher.STOP_CHECK_INTERVAL = 0.05
+        output = contextlib.redirect_stdout(io.StringIO())
+        output.__enter__()
+        self.addCleanup(output.__exit__, None, None, None)
+        watcher.start()
+        self.addCleanup(watcher.join, 5)
+        self.addCleanup(watcher.stop)
+        return manager, watcher
+
+    def test_new_email_reported_while_idling(self):
+        server = StandInFolderServer(make_messages(2, 100), idle=True)
+        manager, watcher = self.watch(server, idle_refresh=30, poll_interval=30)
+        self.assertTrue(server.idling.wait(5))
+        uid = server.deliver(make_messages(1, 100)[0])
+        self.assertTrue(manager.arrived.wait(5))
+        self.assertEqual(manager.classified, [uid])
+        self.assertEqual(watcher.last_uid, uid)
+
+    def test_idle_reissued_after_refresh_interval(self):
+        server = StandInFolderServer(make_messages(2, 100), idle=True)
+        manager, _ = self.watch(server, idle_refresh=0.1, poll_interval=30)
+        self.assertTrue(server.idling.wait(5))
+        server.idling.clear()
+        self.assertTrue(server.idling.wait(5))
+        self.assertEqual(manager.classified, [])
+
+    def test_new_email_found_by_noop_without_idle(self):
+        server = StandInFolderServer(make_messages(2, 100))
+        manager, _ = self.watch(server, poll_interval=0.05)
+        self.assertTrue(server.selected.wait(5))
+        uid = server.deliver(make_messages(1, 100)[0])
+        self.assertTrue(manager.arrived.wait(5))
+        self.assertEqual(manager.classified, [uid])
+        self.assertFalse(server.idling.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()